@@ -1,6 +1,11 @@
+from decimal import Decimal
+
 from django.contrib import admin
 from django.contrib.auth.models import User
-from core.models import Wallet, WalletTransaction, Booking
+from django.urls import reverse
+from django.utils.html import format_html
+from core import ledger
+from core.models import Wallet, WalletTransaction, WalletSnapshot, Booking, Driver, PricingRuleSet, ExportJob
 
 @admin.action(description="Suspend selected users")
 def suspend_user(modeladmin, request, queryset):
@@ -20,14 +25,14 @@ class WalletAdmin(admin.ModelAdmin):
 
 	@admin.action(description="Add ₹1000 to selected wallets")
 	def add_balance(self, request, queryset):
-		for wallet in queryset:
-			wallet.balance += 1000  # Example: add 1000 to selected wallets
-			wallet.save()
+		credited = ledger.bulk_credit(queryset, Decimal('1000'), 'Admin credit of ₹1000')
+		self.message_user(request, f"Added ₹1000 to {credited} wallets.")
 
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
 admin.site.register(Wallet, WalletAdmin)
 admin.site.register(WalletTransaction)
+admin.site.register(WalletSnapshot)
 
 
 
@@ -40,6 +45,63 @@ class BookingAdmin(admin.ModelAdmin):
 
 admin.site.register(Booking, BookingAdmin)
 
+
+class DriverAdmin(admin.ModelAdmin):
+	list_display = ('name', 'vehicle_type', 'vehicle_number', 'is_available', 'location_updated_at')
+	list_filter = ('vehicle_type', 'is_available')
+	search_fields = ('name', 'vehicle_number')
+	raw_id_fields = ('user',)
+
+
+admin.site.register(Driver, DriverAdmin)
+
+
+class PricingRuleSetAdmin(admin.ModelAdmin):
+	list_display = ('version', 'is_active', 'note', 'created_at')
+	list_filter = ('is_active',)
+
+	# A published version never changes; publish a new version instead
+	def get_readonly_fields(self, request, obj=None):
+		if obj is not None:
+			return ('version', 'vehicle_types', 'promocodes')
+		return ()
+
+
+admin.site.register(PricingRuleSet, PricingRuleSetAdmin)
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+	list_display = ('id', 'dataset', 'format', 'compression', 'start_date', 'end_date', 'status', 'rows_written', 'download', 'created_at')
+	list_filter = ('status', 'dataset')
+	actions = ['retry']
+	progress_fields = ('status', 'requested_by', 'file_name', 'last_pk', 'rows_written', 'bytes_written', 'error', 'finished_at')
+
+	# Jobs are run by the run_export_jobs worker; only queue new ones here
+	def get_readonly_fields(self, request, obj=None):
+		if obj is not None:
+			return ('dataset', 'format', 'compression', 'start_date', 'end_date') + self.progress_fields
+		return self.progress_fields
+
+	def save_model(self, request, obj, form, change):
+		if not change:
+			obj.requested_by = request.user
+		super().save_model(request, obj, form, change)
+
+	@admin.display(description='File')
+	def download(self, obj):
+		if obj.status != 'Completed':
+			return ''
+		return format_html('<a href="{}">Download</a>', reverse('download_export', args=[obj.pk]))
+
+	@admin.action(description="Retry selected failed jobs")
+	def retry(self, request, queryset):
+		# Failed jobs keep their progress and resume where they stopped
+		retried = queryset.filter(status='Failed').update(status='Pending', finished_at=None)
+		self.message_user(request, f"Queued {retried} jobs again.")
+
+
+admin.site.register(ExportJob, ExportJobAdmin)
+
 # Customize admin site headers
 admin.site.site_header = 'RideON Administration'
 admin.site.site_title = 'RideON Admin'
@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from core import pricing
+        from core.dispatch import dispatcher
+        from core.location_ingest import location_buffer
+        from core.models import Driver, PricingRuleSet
+        from core.pricing_rules import rule_store
+
+        pricing.set_rules_source(rule_store.current)
+        dispatcher.set_latest_positions(location_buffer.latest_positions)
+        post_save.connect(rule_store.invalidate, sender=PricingRuleSet, dispatch_uid='pricing_rules_saved')
+        post_delete.connect(rule_store.invalidate, sender=PricingRuleSet, dispatch_uid='pricing_rules_deleted')
+        post_save.connect(dispatcher.driver_saved, sender=Driver, dispatch_uid='dispatch_driver_saved')
+        post_delete.connect(dispatcher.driver_deleted, sender=Driver, dispatch_uid='dispatch_driver_deleted')
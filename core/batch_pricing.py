@@ -0,0 +1,142 @@
+"""
+Batch fare quoting for RideON
+Prices many routes in one call. With NumPy installed, distances and fares
+are computed as arrays; fares use exact int64 fixed-point arithmetic so they
+match core.pricing.quote() to the rupee.
+"""
+
+from datetime import datetime
+
+from core import pricing
+from core.geo import trip_distance_km
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Fixed-point scales: distances in units of 10 m, band rates in hundredths,
+# so a fare before multipliers is expressed in 1/10000 rupee
+_DISTANCE_SCALE = 100
+_FARE_SCALE = 10000
+
+
+def _percent(multiplier):
+    # Exact: compile_rules only accepts multipliers in hundredths
+    return int(multiplier * 100) if multiplier is not None else 100
+
+
+def trip_distances_km(lat1, lon1, lat2, lon2):
+    """
+    Vectorized core.geo.trip_distance_km over coordinate arrays
+    """
+    if not NUMPY_AVAILABLE:
+        return [trip_distance_km(*coords) for coords in zip(lat1, lon1, lat2, lon2)]
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    distance = 6371.0 * (2 * np.arcsin(np.sqrt(a)))
+    # Clamped before rounding, in the same order as core.geo.clamp_trip_distance
+    rounded = np.where(np.isnan(distance), 10.0, np.round(distance, 2))
+    rounded = np.where(distance > 2000, 50.0, rounded)
+    return np.where(distance < 0.1, 0.5, rounded)
+
+
+def _vector_fares(distances, hour_multiplier, discount, rules):
+    """
+    Fares for every vehicle type over an array of distances.
+    Returns {vehicle_type: int64 array}.
+    """
+    cents = np.rint(np.asarray(distances, dtype=np.float64) * _DISTANCE_SCALE).astype(np.int64)
+    scale = _FARE_SCALE * 100 * 100 * 100
+    hour = _percent(hour_multiplier)
+    keep = 100 - int(discount)
+    fares = {}
+    for vehicle_type in rules.vehicle_type_names:
+        rate = rules.rates[vehicle_type]
+        base = rate.base * _FARE_SCALE
+        per_km = rate.per_km
+        band_15 = per_km * 1500 * 95
+        band_50 = per_km * 3500 * 85
+        total = np.select(
+            [cents <= 200, cents <= 500, cents <= 1500, cents <= 5000],
+            [
+                np.maximum(rate.base * 15000, base + per_km * cents * 100),
+                base + per_km * cents * 100,
+                base + per_km * cents * 95,
+                base + band_15 + per_km * (cents - 1500) * 85,
+            ],
+            default=base + band_15 + band_50 + per_km * (cents - 5000) * 75,
+        )
+        total = total * hour * _percent(rate.multiplier) * keep
+        price = (total + scale // 2) // scale
+        fares[vehicle_type] = np.clip(price, pricing.MIN_FARE, pricing.MAX_FARE)
+    return fares
+
+
+def _eligibility(distances, rules):
+    distances = np.asarray(distances, dtype=np.float64)
+    eligible = {}
+    for vehicle_type in rules.vehicle_type_names:
+        rate = rules.rates[vehicle_type]
+        offered = np.ones(distances.shape, dtype=bool)
+        if rate.exclude_between:
+            low, high = rate.exclude_between
+            offered &= ~((distances >= low) & (distances < high))
+        if rate.max_distance is not None:
+            offered &= ~(distances >= rate.max_distance)
+        eligible[vehicle_type] = offered
+    return eligible
+
+
+def quote_batch(distances, when=None, discount=0):
+    """
+    Price every route distance in one call.
+    Returns a list of {'distance': km, 'prices': {vehicle_type: price}} with
+    only the vehicle types offered for that distance, as in quote().
+    """
+    if when is None:
+        when = datetime.now()
+    # One rule snapshot for the whole batch, even if a new version lands mid-call
+    rules = pricing.current_rules()
+    hour_multiplier = pricing.time_multiplier(when.hour)
+    if not NUMPY_AVAILABLE or int(discount) != discount:
+        return [
+            {
+                'distance': distance,
+                'prices': {v['type']: v['price'] for v in pricing.quote(distance, when, discount=discount, rules=rules)},
+            }
+            for distance in distances
+        ]
+    distances = np.asarray(distances, dtype=np.float64)
+    # The fixed-point path is exact for distances in whole units of 10 m;
+    # anything finer is priced by quote() like a single route would be
+    exact = np.isfinite(distances) & (np.rint(distances * _DISTANCE_SCALE) / _DISTANCE_SCALE == distances)
+    vector_distances = np.where(exact, distances, 0.0)
+    fares = _vector_fares(vector_distances, hour_multiplier, discount, rules)
+    eligible = _eligibility(vector_distances, rules)
+    prices = np.stack([fares[name] for name in rules.vehicle_type_names], axis=1).tolist()
+    offered = np.stack([eligible[name] for name in rules.vehicle_type_names], axis=1).tolist()
+    results = []
+    for distance, is_exact, row_prices, row_offered in zip(distances.tolist(), exact.tolist(), prices, offered):
+        if is_exact:
+            row = {name: price for name, price, ok in zip(rules.vehicle_type_names, row_prices, row_offered) if ok}
+        else:
+            row = {v['type']: v['price'] for v in pricing.quote(distance, when, discount=discount, rules=rules)}
+        results.append({'distance': distance, 'prices': row})
+    return results
+
+
+def quote_routes(coords, when=None, discount=0):
+    """
+    Price a list of ((lat1, lon1), (lat2, lon2)) routes; a route with a
+    missing endpoint is priced at pricing.FALLBACK_DISTANCE
+    """
+    known = [i for i, (start, end) in enumerate(coords) if None not in start and None not in end]
+    distances = [pricing.FALLBACK_DISTANCE] * len(coords)
+    if known:
+        columns = list(zip(*(coords[i][0] + coords[i][1] for i in known)))
+        for i, distance in zip(known, list(trip_distances_km(*columns))):
+            distances[i] = float(distance)
+    return quote_batch(distances, when, discount)
@@ -0,0 +1,215 @@
+"""
+Driver dispatch for RideON
+Keeps an in-memory spatial index of available drivers per vehicle type and
+claims the nearest one with a conditional UPDATE so two bookings can never
+be given the same driver.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Driver
+from core.spatial import SpatialIndex
+
+_dispatch_settings = getattr(settings, 'DISPATCH', {})
+CELL_SIZE = _dispatch_settings.get('CELL_SIZE', 0.01)
+MAX_RADIUS_KM = _dispatch_settings.get('MAX_RADIUS_KM', 25)
+RESYNC_INTERVAL = _dispatch_settings.get('RESYNC_INTERVAL', 60)
+MAX_CLAIM_ATTEMPTS = _dispatch_settings.get('MAX_CLAIM_ATTEMPTS', 5)
+
+
+class DispatchIndex:
+    """
+    Available drivers by vehicle type. Located drivers are kept in a
+    SpatialIndex per type; drivers without a location are served
+    first-in first-out.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE, max_radius_km=MAX_RADIUS_KM):
+        self.cell_size = cell_size
+        self.max_radius_km = max_radius_km
+        self._lock = threading.RLock()
+        self._located = {}
+        self._unlocated = {}
+        self._drivers = {}
+
+    def add(self, driver_id, vehicle_type, lat=None, lon=None):
+        with self._lock:
+            if self._drivers.get(driver_id, (None,))[0] != vehicle_type or lat is None or lon is None:
+                self.remove(driver_id)
+            if lat is None or lon is None:
+                self._unlocated.setdefault(vehicle_type, {})[driver_id] = None
+                self._drivers[driver_id] = (vehicle_type, False)
+            else:
+                located = self._located.get(vehicle_type)
+                if located is None:
+                    located = self._located[vehicle_type] = SpatialIndex(self.cell_size)
+                # Moves within the same vehicle type are an in-place update
+                self._unlocated.get(vehicle_type, {}).pop(driver_id, None)
+                located.update(driver_id, lat, lon)
+                self._drivers[driver_id] = (vehicle_type, True)
+
+    def move(self, driver_id, lat, lon):
+        """
+        Update the position of a driver already in the index; busy drivers
+        are not indexed and are ignored. Returns whether the driver was moved.
+        """
+        with self._lock:
+            entry = self._drivers.get(driver_id)
+            if entry is None:
+                return False
+            self.add(driver_id, entry[0], lat, lon)
+            return True
+
+    def remove(self, driver_id):
+        with self._lock:
+            entry = self._drivers.pop(driver_id, None)
+            if entry is None:
+                return
+            vehicle_type, located = entry
+            if located:
+                self._located[vehicle_type].remove(driver_id)
+            else:
+                self._unlocated[vehicle_type].pop(driver_id, None)
+
+    def replace(self, drivers, latest_positions=None):
+        """
+        Rebuild from (driver_id, vehicle_type, lat, lon, located_at) rows.
+        latest_positions returns {driver_id: (located_at, lat, lon)} of pings
+        that may not be in the database yet; one newer than its row wins.
+        """
+        index = DispatchIndex(self.cell_size, self.max_radius_km)
+        located_at = {}
+        for driver_id, vehicle_type, lat, lon, at in drivers:
+            index.add(driver_id, vehicle_type, lat, lon)
+            located_at[driver_id] = at
+        with self._lock:
+            # Read under the lock so a ping recorded after this moves the new index
+            for driver_id, (at, lat, lon) in (latest_positions() if latest_positions else {}).items():
+                if driver_id in located_at and (located_at[driver_id] is None or at > located_at[driver_id]):
+                    index.move(driver_id, lat, lon)
+            self._located, self._unlocated, self._drivers = index._located, index._unlocated, index._drivers
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._drivers
+
+    def position(self, driver_id):
+        entry = self._drivers.get(driver_id)
+        if entry is None or not entry[1]:
+            return None
+        return self._located[entry[0]].position(driver_id)
+
+    def nearby(self, vehicle_type, lat, lon, k=1):
+        """
+        Up to k (driver_id, distance_km) pairs within max_radius_km, nearest first
+        """
+        with self._lock:
+            located = self._located.get(vehicle_type)
+            if located is None:
+                return []
+            return located.nearest(lat, lon, k, self.max_radius_km)
+
+    def nearest(self, vehicle_type, lat=None, lon=None):
+        """
+        Id of the closest available driver within max_radius_km of the pickup,
+        else the longest-waiting driver without a location, else None
+        """
+        with self._lock:
+            if lat is not None and lon is not None:
+                found = self.nearby(vehicle_type, lat, lon)
+                if found:
+                    return found[0][0]
+            unlocated = self._unlocated.get(vehicle_type)
+            if unlocated:
+                return next(iter(unlocated))
+            return None
+
+
+class Dispatcher:
+    """Assigns drivers from a DispatchIndex kept in step with the Driver table"""
+
+    def __init__(self, index=None, resync_interval=RESYNC_INTERVAL):
+        self.index = index or DispatchIndex()
+        self.resync_interval = resync_interval
+        self._synced_at = None
+        self._sync_lock = threading.Lock()
+        self._latest_positions = None
+
+    def set_latest_positions(self, source):
+        """
+        Register a callable returning buffered driver positions (see CoreConfig.ready)
+        """
+        self._latest_positions = source
+
+    def sync(self, force=False):
+        """
+        Reload available drivers from the database; other processes claim
+        and release drivers too, so the index is resynced periodically
+        """
+        synced_at = self._synced_at
+        if not force and synced_at is not None and time.monotonic() - synced_at < self.resync_interval:
+            return
+        with self._sync_lock:
+            if not force and self._synced_at is not None and self._synced_at != synced_at:
+                return
+            rows = Driver.objects.filter(is_available=True).values_list(
+                'id', 'vehicle_type', 'latitude', 'longitude', 'location_updated_at',
+            )
+            self.index.replace(rows.iterator(chunk_size=5000), self._latest_positions)
+            self._synced_at = time.monotonic()
+
+    def assign(self, vehicle_type, lat=None, lon=None):
+        """
+        Claim the nearest available driver of the vehicle type.
+        Returns the Driver, now unavailable, or None.
+        """
+        self.sync()
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            driver_id = self.index.nearest(vehicle_type, lat, lon)
+            if driver_id is None:
+                return None
+            self.index.remove(driver_id)
+            # Only one caller can flip is_available; a stale index entry just loses the race
+            if Driver.objects.filter(pk=driver_id, is_available=True).update(is_available=False):
+                return Driver.objects.get(pk=driver_id)
+        return None
+
+    def nearby(self, vehicle_type, lat, lon, k=5):
+        """
+        The k nearest available drivers as (driver_id, distance_km) pairs
+        """
+        self.sync()
+        return self.index.nearby(vehicle_type, lat, lon, k)
+
+    def release(self, driver, lat=None, lon=None):
+        """
+        Make a driver available again, optionally at a new location
+        """
+        fields = {'is_available': True}
+        if lat is not None and lon is not None:
+            fields.update(latitude=lat, longitude=lon, location_updated_at=timezone.now())
+            driver.latitude, driver.longitude = lat, lon
+        Driver.objects.filter(pk=driver.pk).update(**fields)
+        driver.is_available = True
+        self.index.add(driver.pk, driver.vehicle_type, driver.latitude, driver.longitude)
+
+    def driver_saved(self, instance, **kwargs):
+        """
+        Signal receivers keeping the index in step with Driver saves and deletes
+        """
+        if instance.is_available:
+            self.index.add(instance.pk, instance.vehicle_type, instance.latitude, instance.longitude)
+        else:
+            self.index.remove(instance.pk)
+
+    def driver_deleted(self, instance, **kwargs):
+        self.index.remove(instance.pk)
+
+
+dispatcher = Dispatcher()
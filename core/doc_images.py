@@ -0,0 +1,103 @@
+"""
+Screenshot derivatives for the documentation DOCX
+Screenshots are embedded 6 inches wide, so pixels past 150 dpi only add size.
+Derivatives are downscaled, recompressed, cached under the digest of their
+source, and built in parallel. Without Pillow the originals are embedded.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_documentation_settings = getattr(settings, 'DOCUMENTATION', {})
+IMAGE_CACHE_DIR = _documentation_settings.get(
+    'IMAGE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'documentation_cache', 'images'),
+)
+EMBED_WIDTH_INCHES = 6
+DPI = _documentation_settings.get('IMAGE_DPI', 150)
+# 'png' quantizes to 256 colours, which keeps UI text sharp; 'jpeg' is smaller still
+IMAGE_FORMAT = _documentation_settings.get('IMAGE_FORMAT', 'png')
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg'}
+
+
+def variant():
+    """
+    Describes how derivatives are made; part of the documentation content version
+    """
+    if Image is None:
+        return 'original'
+    return f'{IMAGE_FORMAT}-{EMBED_WIDTH_INCHES * DPI}px'
+
+
+def source_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def derivative_path(digest):
+    return os.path.join(IMAGE_CACHE_DIR, f'{digest}-{variant()}.{EXTENSIONS[IMAGE_FORMAT]}')
+
+
+def make_derivative(source_path):
+    """
+    Path of the width-capped, recompressed copy of source_path, creating it
+    if needed; the source itself when Pillow is missing
+    """
+    if Image is None:
+        return source_path
+    path = derivative_path(source_digest(source_path))
+    if os.path.exists(path):
+        return path
+    max_width = EMBED_WIDTH_INCHES * DPI
+    with Image.open(source_path) as source:
+        image = source.convert('RGB')
+    if image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=IMAGE_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if IMAGE_FORMAT == 'jpeg':
+                image.save(f, 'JPEG', quality=85, optimize=True, progressive=True, dpi=(DPI, DPI))
+            else:
+                image.quantize(256).save(f, 'PNG', optimize=True, dpi=(DPI, DPI))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def prepare_screenshots(directory, names, workers=None):
+    """
+    {name: path to embed} for every screenshot in `names` that exists,
+    derivatives built in a thread pool (Pillow releases the GIL while
+    resizing and encoding). A screenshot that cannot be processed falls
+    back to its original.
+    """
+    sources = {name: os.path.join(directory, name) for name in set(names)}
+    sources = {name: path for name, path in sources.items() if os.path.exists(path)}
+
+    def prepare(path):
+        try:
+            return make_derivative(path)
+        except (OSError, ValueError):
+            logger.exception('Could not prepare screenshot %s', path)
+            return path
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return dict(zip(sources, pool.map(prepare, sources.values())))
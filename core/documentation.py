@@ -4,9 +4,12 @@ Creates comprehensive documentation with screenshots and exports to Word format
 """
 
 import os
+import re
 import base64
 from datetime import datetime
 from io import BytesIO
+
+from core import doc_images
 try:
     from docx import Document
     from docx.shared import Inches
@@ -20,7 +23,53 @@ except ImportError:
     Inches = None
     RGBColor = None
 
+SCREENSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Screenshot')
+
+# Screenshot file for each documented screen
+SCREENSHOTS = {
+    'home_page': 'Screenshot (130).png',
+    'user_registration': 'Screenshot (131).png',
+    'user_login': 'Screenshot (132).png',
+    'booking_interface': 'Screenshot (133).png',
+    'vehicle_selection': 'Screenshot (134).png',
+    'trip_details': 'Screenshot (135).png',
+    'payment_processing': 'Screenshot (136).png',
+    'booking_history': 'Screenshot (137).png',
+    'user_preferences': 'Screenshot (138).png',
+    'wallet_management': 'Screenshot (139).png',
+    'admin_dashboard': 'Screenshot (140).png',
+    'trip_management': 'Screenshot (141).png',
+    'user_management': 'Screenshot (142).png',
+    'driver_management': 'Screenshot (143).png',
+    'system_monitoring': 'Screenshot (144).png',
+    'documentation_page': 'Screenshot (145).png',
+    'preferences_detail': 'Screenshot (146).png',
+    'additional_view': 'Screenshot (147).png'
+}
+
+def iter_paragraphs(content):
+    """Yield the blank-line separated paragraphs of a section's content one at a time"""
+    start = 0
+    for match in re.finditer(r'\n[ \t]*\n', content):
+        paragraph = content[start:match.start()].strip()
+        if paragraph:
+            yield paragraph
+        start = match.end()
+    paragraph = content[start:].strip()
+    if paragraph:
+        yield paragraph
+
 class RideONDocumentationGenerator:
+    # Sections of the document in order, with the method that builds each
+    SECTIONS = (
+        ('table_of_contents', '_get_table_of_contents'),
+        ('introduction', '_get_introduction'),
+        ('screenshots_user', '_get_user_screenshots'),
+        ('screenshots_admin', '_get_admin_screenshots'),
+        ('future_scope', '_get_future_scope'),
+        ('references', '_get_references'),
+    )
+
     def __init__(self):
         self.doc_data = {
             'title': 'RideON - Ride Booking Management System',
@@ -32,34 +81,16 @@ class RideONDocumentationGenerator:
         }
         
         # Map screenshots to sections
-        self.screenshot_mapping = {
-            'home_page': 'Screenshot (130).png',
-            'user_registration': 'Screenshot (131).png', 
-            'user_login': 'Screenshot (132).png',
-            'booking_interface': 'Screenshot (133).png',
-            'vehicle_selection': 'Screenshot (134).png',
-            'trip_details': 'Screenshot (135).png',
-            'payment_processing': 'Screenshot (136).png',
-            'booking_history': 'Screenshot (137).png',
-            'user_preferences': 'Screenshot (138).png',
-            'wallet_management': 'Screenshot (139).png',
-            'admin_dashboard': 'Screenshot (140).png',
-            'trip_management': 'Screenshot (141).png',
-            'user_management': 'Screenshot (142).png',
-            'driver_management': 'Screenshot (143).png',
-            'system_monitoring': 'Screenshot (144).png',
-            'documentation_page': 'Screenshot (145).png',
-            'preferences_detail': 'Screenshot (146).png',
-            'additional_view': 'Screenshot (147).png'
-        }
+        self.screenshot_mapping = dict(SCREENSHOTS)
+        # Downscaled copies to embed, filled in by create_word_document
+        self.screenshot_paths = {}
     
     def _add_screenshot_to_document(self, doc, screenshot_key, description):
         """Add a screenshot with description to the document"""
-        photos_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'photos')
         
         if screenshot_key in self.screenshot_mapping:
             screenshot_file = self.screenshot_mapping[screenshot_key]
-            screenshot_path = os.path.join(photos_dir, screenshot_file)
+            screenshot_path = self.screenshot_paths.get(screenshot_file) or os.path.join(SCREENSHOT_DIR, screenshot_file)
             
             if os.path.exists(screenshot_path):
                 # Add description
@@ -80,7 +111,7 @@ class RideONDocumentationGenerator:
                     # Add image with appropriate size
                     if Inches:
                         run = image_para.add_run()
-                        run.add_picture(screenshot_path, width=Inches(6))  # 6 inches width
+                        run.add_picture(screenshot_path, width=Inches(doc_images.EMBED_WIDTH_INCHES))
                     else:
                         # Fallback if Inches is not available
                         image_para.add_run().add_picture(screenshot_path)
@@ -110,16 +141,18 @@ class RideONDocumentationGenerator:
         # Add spacing after image
         doc.add_paragraph()
     
+    def iter_sections(self):
+        """Yield (key, section) pairs in document order, building each section only when it is reached"""
+        for key, method in self.SECTIONS:
+            yield key, getattr(self, method)()
+
+    def get_section(self, key):
+        """Build a single section by key"""
+        return getattr(self, dict(self.SECTIONS)[key])()
+
     def generate_documentation_content(self):
         """Generate complete documentation content"""
-        return {
-            'table_of_contents': self._get_table_of_contents(),
-            'introduction': self._get_introduction(),
-            'screenshots_user': self._get_user_screenshots(),
-            'screenshots_admin': self._get_admin_screenshots(),
-            'future_scope': self._get_future_scope(),
-            'references': self._get_references()
-        }
+        return dict(self.iter_sections())
     
     def _get_table_of_contents(self):
         return {
@@ -2186,10 +2219,12 @@ This roadmap represents our commitment to continuous innovation and improvement.
         }
 
     def create_word_document(self, content_dict):
-        """Generate Word document from documentation content with proper academic formatting"""
+        """Generate Word document from documentation content with proper academic formatting.
+        content_dict may also be an iterable of (key, section) pairs such as iter_sections()"""
         if not DOCX_AVAILABLE or Document is None:
             return None, "python-docx package not installed. Install with: pip install python-docx"
         
+        self.screenshot_paths = doc_images.prepare_screenshots(SCREENSHOT_DIR, self.screenshot_mapping.values())
         doc = Document()
         
         # Title page
@@ -2212,11 +2247,11 @@ This roadmap represents our commitment to continuous innovation and improvement.
         if WD_ALIGN_PARAGRAPH:
             info_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
         
-        version_run = info_para.add_run(f"Version {self.doc_data['version']}\\n")
+        version_run = info_para.add_run(f"Version {self.doc_data['version']}\n")
         version_run.font.name = 'Times New Roman'
         version_run.bold = True
         
-        date_run = info_para.add_run(f"Generated on {self.doc_data['date']}\\n")
+        date_run = info_para.add_run(f"Generated on {self.doc_data['date']}\n")
         date_run.font.name = 'Times New Roman'
         
         author_run = info_para.add_run(f"By {self.doc_data['author']}")
@@ -2234,13 +2269,13 @@ This roadmap represents our commitment to continuous innovation and improvement.
         doc.add_page_break()
         
         # Add all sections with proper formatting
-        for section_key, section_data in content_dict.items():
+        sections = content_dict.items() if isinstance(content_dict, dict) else content_dict
+        for section_key, section_data in sections:
             # Section heading
             section_heading = doc.add_heading(section_data['title'], level=1)
             
             # Process content
-            content = section_data['content'].strip()
-            paragraphs = content.split('\\n\\n')
+            paragraphs = iter_paragraphs(section_data['content'])
             
             for para in paragraphs:
                 if para.strip():
@@ -2296,7 +2331,7 @@ This roadmap represents our commitment to continuous innovation and improvement.
                                 placeholder_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
                     elif para.startswith('•'):
                         # Bullet list - justified
-                        lines = para.split('\\n')
+                        lines = para.split('\n')
                         for line in lines:
                             if line.strip().startswith('•'):
                                 bullet_para = doc.add_paragraph(line.strip()[1:].strip(), style='List Bullet')
@@ -2329,9 +2364,8 @@ This roadmap represents our commitment to continuous innovation and improvement.
 def generate_documentation_file():
     """Main function to generate documentation"""
     generator = RideONDocumentationGenerator()
-    content = generator.generate_documentation_content()
     
-    doc, error = generator.create_word_document(content)
+    doc, error = generator.create_word_document(generator.iter_sections())
     if error or doc is None:
         return None, error or "Failed to create document"
     
@@ -0,0 +1,176 @@
+"""
+Cached documentation download for RideON
+The DOCX is built once per content version, a digest of documentation.py,
+the screenshots it embeds and how they are downscaled, and kept on disk.
+When the inputs change the last build is served while the new one is built
+in a background thread; the build before the newest is kept so downloads
+already given its path can still open it.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from core import doc_images, documentation
+
+logger = logging.getLogger(__name__)
+
+_documentation_settings = getattr(settings, 'DOCUMENTATION', {})
+CACHE_DIR = _documentation_settings.get('CACHE_DIR', os.path.join(settings.BASE_DIR, 'documentation_cache'))
+KEEP_BUILDS = 2
+
+_lock = threading.Lock()
+_building = {}
+_source_digest = (None, None)
+
+
+class DocumentationError(Exception):
+    pass
+
+
+def source_digest():
+    """
+    sha256 of documentation.py, rehashed only when its mtime or size changes
+    """
+    global _source_digest
+    path = documentation.__file__
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached_key, digest = _source_digest
+    if cached_key != key:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        _source_digest = (key, digest)
+    return digest
+
+
+def content_version():
+    """
+    Digest of everything the document is built from
+    """
+    digest = hashlib.sha256(source_digest().encode())
+    digest.update(doc_images.variant().encode())
+    for name in sorted(set(documentation.SCREENSHOTS.values())):
+        try:
+            stat = os.stat(os.path.join(documentation.SCREENSHOT_DIR, name))
+            digest.update(f'{name}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode())
+        except OSError:
+            digest.update(f'{name}:missing\n'.encode())
+    return digest.hexdigest()[:32]
+
+
+def document_path(version):
+    return os.path.join(CACHE_DIR, f'documentation_{version}.docx')
+
+
+def _builds():
+    """
+    Paths of the builds on disk, newest first; files removed while listing are skipped
+    """
+    builds = []
+    for path in glob.glob(os.path.join(CACHE_DIR, 'documentation_*.docx')):
+        try:
+            builds.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    return [path for _, path in sorted(builds, reverse=True)]
+
+
+def latest_document():
+    """
+    (path, version) of the most recent build on disk, or None
+    """
+    builds = _builds()
+    if not builds:
+        return None
+    return builds[0], os.path.basename(builds[0])[len('documentation_'):-len('.docx')]
+
+
+def build(version=None):
+    """
+    Generate the DOCX for the current inputs and store it; builds older
+    than the previous one are removed
+    """
+    version = version or content_version()
+    buffer, error = documentation.generate_documentation_file()
+    if error or buffer is None:
+        raise DocumentationError(error or 'Unknown error')
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = document_path(version)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    for old in [build for build in _builds() if build != path][KEEP_BUILDS - 1:]:
+        try:
+            os.remove(old)
+        except OSError:
+            # Already gone, or still open for a download on platforms that lock open files
+            pass
+    return path
+
+
+def build_in_background(version):
+    """
+    Start building `version` unless a build of it is already running;
+    returns the build thread
+    """
+    with _lock:
+        thread = _building.get(version)
+        if thread is not None:
+            return thread
+
+        def run():
+            try:
+                build(version)
+            except Exception:
+                logger.exception('Could not build documentation version %s', version)
+            finally:
+                with _lock:
+                    _building.pop(version, None)
+
+        thread = _building[version] = threading.Thread(target=run, name='documentation-build', daemon=True)
+        thread.start()
+        return thread
+
+
+def get_document():
+    """
+    (path, version) of the document to serve. Only the very first build
+    happens in the request; after that a stale build is served while the
+    current version builds in the background.
+    """
+    version = content_version()
+    path = document_path(version)
+    if os.path.exists(path):
+        return path, version
+    latest = latest_document()
+    if latest is not None:
+        build_in_background(version)
+        return latest
+    return build(version), version
+
+
+def open_document(path, version):
+    """
+    Open the (path, version) returned by get_document(). If that stale build
+    was removed in the meantime, wait for the current version instead.
+    Returns (file, version).
+    """
+    try:
+        return open(path, 'rb'), version
+    except FileNotFoundError:
+        version = content_version()
+        path = document_path(version)
+        if not os.path.exists(path):
+            build_in_background(version).join()
+        return open(path, 'rb'), version
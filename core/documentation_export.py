@@ -0,0 +1,123 @@
+"""
+HTML and Markdown documentation for RideON
+Sections are rendered one at a time from the generator and cached per section
+until documentation.py changes, so reading the docs never builds the DOCX.
+"""
+
+import re
+from collections import namedtuple
+from html import escape
+from itertools import groupby
+
+from core import documentation, documentation_cache
+
+RenderedSection = namedtuple('RenderedSection', ['key', 'title', 'text'])
+
+# Sections laid out as preformatted text rather than paragraphs
+PREFORMATTED = {'table_of_contents'}
+SCREENSHOT_PREFIX = '[Screenshot Description:'
+
+_cache = {}
+
+
+def _screenshot_description(paragraph):
+    return paragraph[len(SCREENSHOT_PREFIX):].rstrip(']').strip()
+
+
+def _inline_html(text):
+    return re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', escape(text))
+
+
+def render_html(key, section):
+    parts = [f'<section class="doc-section" id="{escape(key)}">', f'<h2>{escape(section["title"])}</h2>']
+    if key in PREFORMATTED:
+        parts.append(f'<pre>{escape(section["content"].strip())}</pre>')
+        paragraphs = ()
+    else:
+        paragraphs = documentation.iter_paragraphs(section['content'])
+    for paragraph in paragraphs:
+        if paragraph.startswith('##'):
+            parts.append(f'<h3>{_inline_html(paragraph.lstrip("#").strip())}</h3>')
+        elif paragraph.startswith(SCREENSHOT_PREFIX):
+            parts.append(
+                f'<figure class="doc-screenshot"><figcaption>Figure: '
+                f'{escape(_screenshot_description(paragraph))}</figcaption></figure>'
+            )
+        else:
+            # Runs of bullet lines become lists; other lines keep their line breaks
+            lines = [line.strip() for line in paragraph.split('\n')]
+            for is_bullet, run in groupby(lines, key=lambda line: line.startswith('•')):
+                if is_bullet:
+                    parts.append('<ul>' + ''.join(f'<li>{_inline_html(line[1:].strip())}</li>' for line in run) + '</ul>')
+                else:
+                    parts.append('<p>' + '<br>'.join(_inline_html(line) for line in run) + '</p>')
+    parts.append('</section>')
+    return '\n'.join(parts)
+
+
+def render_markdown(key, section):
+    parts = [f'## {section["title"]}']
+    if key in PREFORMATTED:
+        parts.append(f'```\n{section["content"].strip()}\n```')
+        paragraphs = ()
+    else:
+        paragraphs = documentation.iter_paragraphs(section['content'])
+    for paragraph in paragraphs:
+        if paragraph.startswith('##'):
+            parts.append(f'### {paragraph.lstrip("#").strip()}')
+        elif paragraph.startswith(SCREENSHOT_PREFIX):
+            parts.append(f'*Figure: {_screenshot_description(paragraph)}*')
+        else:
+            lines = [line.strip() for line in paragraph.split('\n')]
+            # Bullets become list items; other lines keep their hard line breaks
+            parts.append('\n'.join(
+                f'- {line[1:].strip()}' if line.startswith('•') else line + ('  ' if i < len(lines) - 1 else '')
+                for i, line in enumerate(lines)
+            ))
+    return '\n\n'.join(parts) + '\n'
+
+
+RENDERERS = {'html': render_html, 'markdown': render_markdown}
+
+
+def iter_rendered(fmt):
+    """
+    Yield a RenderedSection per section in document order. Cached sections
+    are reused while documentation.py is unchanged; the generator only
+    builds the sections that are missing.
+    """
+    render = RENDERERS[fmt]
+    digest = documentation_cache.source_digest()
+    generator = None
+    for key, _ in documentation.RideONDocumentationGenerator.SECTIONS:
+        cached = _cache.get((fmt, key))
+        if cached is None or cached[0] != digest:
+            generator = generator or documentation.RideONDocumentationGenerator()
+            section = generator.get_section(key)
+            cached = _cache[(fmt, key)] = (digest, RenderedSection(key, section['title'], render(key, section)))
+        yield cached[1]
+
+
+def stream_html():
+    """
+    A standalone HTML page, yielded section by section
+    """
+    title = escape('RideON - Ride Booking Management System')
+    yield (
+        f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n'
+        '<style>body{font-family:"Times New Roman",serif;max-width:860px;margin:2rem auto;padding:0 1rem;'
+        'text-align:justify;line-height:1.5}figure{font-style:italic;font-weight:bold;text-align:center}</style>\n'
+        f'</head>\n<body>\n<h1>{title}</h1>\n'
+    )
+    for section in iter_rendered('html'):
+        yield section.text + '\n'
+    yield '</body>\n</html>\n'
+
+
+def stream_markdown():
+    """
+    The documentation as Markdown, yielded section by section
+    """
+    yield '# RideON - Ride Booking Management System\n\n'
+    for section in iter_rendered('markdown'):
+        yield section.text + '\n'
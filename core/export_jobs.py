@@ -0,0 +1,151 @@
+"""
+Bulk export jobs for RideON
+The run_export_jobs worker appends one compressed member per chunk of rows to
+the job's file. gzip and zstd readers both accept concatenated members, so a
+crashed job truncates the file to its last recorded size and carries on after
+last_pk.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+try:
+    import zstandard
+except ImportError:  # zstd exports are optional
+    zstandard = None
+
+from core import exports
+from core.models import Booking, ExportJob, WalletTransaction
+
+_export_settings = getattr(settings, 'EXPORTS', {})
+EXPORT_ROOT = _export_settings.get('ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+JOB_CHUNK_SIZE = _export_settings.get('JOB_CHUNK_SIZE', 10000)
+STALE_AFTER = _export_settings.get('STALE_AFTER', 300)
+
+WALLET_TRANSACTION_COLUMNS = (
+    ('Transaction ID', 'id'),
+    ('Wallet ID', 'wallet_id'),
+    ('User', 'wallet__user__username'),
+    ('Amount', 'amount'),
+    ('Type', 'transaction_type'),
+    ('Description', 'description'),
+    ('Created At', 'created_at'),
+)
+DATASETS = {
+    'bookings': (Booking, exports.ADMIN_BOOKING_COLUMNS),
+    'wallet_transactions': (WalletTransaction, WALLET_TRANSACTION_COLUMNS),
+}
+EXTENSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+
+
+class ExportError(Exception):
+    pass
+
+
+def compress(data, compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ExportError('zstd exports need the zstandard package')
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def encode_rows(rows, columns, fmt, header=False):
+    """
+    Rows as UTF-8 CSV or JSON Lines, optionally preceded by the CSV header
+    """
+    if fmt == 'jsonl':
+        keys = [name.lower().replace(' ', '_') for name, _ in columns]
+        lines = [json.dumps(dict(zip(keys, row)), default=_json_value) + '\n' for row in rows]
+        return ''.join(lines).encode()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow([name for name, _ in columns])
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def job_path(job):
+    return os.path.join(EXPORT_ROOT, job.file_name)
+
+
+def claim_next_job():
+    """
+    Mark the oldest pending job, or a running job whose worker stopped
+    updating it STALE_AFTER seconds ago, as running; returns it or None
+    """
+    stale = timezone.now() - timedelta(seconds=STALE_AFTER)
+    candidates = ExportJob.objects.filter(
+        Q(status='Pending') | Q(status='Running', updated_at__lt=stale)
+    ).order_by('created_at', 'pk')
+    for job in candidates[:10]:
+        # Another worker may have claimed the job since it was read
+        claimed = ExportJob.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at).update(
+            status='Running', updated_at=timezone.now(),
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job, chunk_size=JOB_CHUNK_SIZE, progress=None):
+    """
+    Write the job's rows in primary-key order, chunk_size rows per compressed
+    member, recording progress after every member.
+    `progress(job)` is called after every chunk.
+    """
+    if job.compression == 'zstd' and zstandard is None:
+        raise ExportError('zstd exports need the zstandard package')
+    model, columns = DATASETS[job.dataset]
+    if not job.file_name:
+        job.file_name = f'{job.dataset}_{job.start_date}_{job.end_date}_{job.pk}.{job.format}.{EXTENSIONS[job.compression]}'
+        job.save(update_fields=['file_name', 'updated_at'])
+    os.makedirs(EXPORT_ROOT, exist_ok=True)
+    path = job_path(job)
+    if not os.path.exists(path) or os.path.getsize(path) < job.bytes_written:
+        # The partial file is gone; start over
+        job.last_pk = job.rows_written = job.bytes_written = 0
+        open(path, 'wb').close()
+
+    rows = exports.created_between(model.objects.all(), job.start_date, job.end_date)
+    rows = rows.order_by('pk').values_list('pk', *[field for _, field in columns])
+    with open(path, 'r+b') as output:
+        # Anything past bytes_written belongs to a chunk that was never recorded
+        output.truncate(job.bytes_written)
+        output.seek(job.bytes_written)
+        while True:
+            chunk = list(rows.filter(pk__gt=job.last_pk)[:chunk_size])
+            header = job.format == 'csv' and job.bytes_written == 0
+            if not chunk and not header:
+                break
+            data = encode_rows([row[1:] for row in chunk], columns, job.format, header=header)
+            output.write(compress(data, job.compression))
+            output.flush()
+            os.fsync(output.fileno())
+            if chunk:
+                job.last_pk = chunk[-1][0]
+                job.rows_written += len(chunk)
+            job.bytes_written = output.tell()
+            job.save(update_fields=['last_pk', 'rows_written', 'bytes_written', 'updated_at'])
+            if progress:
+                progress(job)
+
+    job.status = 'Completed'
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
@@ -0,0 +1,185 @@
+"""
+Offline gazetteer for RideON
+In-memory place index built from GazetteerPlace rows, used as the first
+geocoding tier before any network lookup
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Count, Max
+
+from core.models import GazetteerPlace
+
+# Always available, even before a gazetteer dump has been loaded.
+# Populations rank the cities ahead of the generic 'airport'/'station' entries.
+BUILTIN_PLACES = [
+    ('mumbai', 19.0760, 72.8777, 12442373),
+    ('delhi', 28.7041, 77.1025, 11034555),
+    ('bangalore', 12.9716, 77.5946, 8443675),
+    ('chennai', 13.0827, 80.2707, 4646732),
+    ('kolkata', 22.5726, 88.3639, 4496694),
+    ('hyderabad', 17.3850, 78.4867, 6731790),
+    ('pune', 18.5204, 73.8567, 3124458),
+    ('airport', 19.0896, 72.8656, 0),
+    ('station', 19.0330, 72.8347, 0),
+]
+
+REFRESH_INTERVAL = getattr(settings, 'GAZETTEER_REFRESH_INTERVAL', 300)
+MAX_PHRASE_WORDS = 4
+FUZZY_THRESHOLD = 0.6
+
+
+def normalize_name(name):
+    """
+    Lower-case a place name and collapse punctuation and whitespace
+    """
+    if not name:
+        return ''
+    cleaned = ''.join(ch if ch.isalnum() else ' ' for ch in name.lower())
+    return ' '.join(cleaned.split())[:200]
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class GazetteerIndex:
+    """Exact, prefix and trigram lookups over the gazetteer"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (places, sorted names, trigram index) swapped as one tuple so
+        # readers never see a half-built index
+        self._snapshot = ({}, [], {})
+        self._signature = None
+        self._checked_at = 0.0
+        self._rebuilding = None
+
+    def _signature_from_db(self):
+        try:
+            return tuple(GazetteerPlace.objects.aggregate(count=Count('id'), last=Max('id')).values())
+        except DatabaseError:
+            return self._signature
+
+    def _build(self, signature):
+        places = {name: (lat, lon, population) for name, lat, lon, population in BUILTIN_PLACES}
+        try:
+            rows = GazetteerPlace.objects.values_list('normalized_name', 'latitude', 'longitude', 'population')
+            for name, lat, lon, population in rows.iterator(chunk_size=5000):
+                current = places.get(name)
+                if current is None or population > current[2]:
+                    places[name] = (lat, lon, population)
+        except DatabaseError:
+            pass
+        names = sorted(places)
+        grams = defaultdict(list)
+        for name in names:
+            for gram in trigrams(name):
+                grams[gram].append(name)
+        self._snapshot = (places, names, dict(grams))
+        self._signature = signature
+
+    def _rebuild(self, signature):
+        try:
+            self._build(signature)
+        finally:
+            self._rebuilding = None
+            connection.close()
+
+    def refresh(self, force=False):
+        """
+        Rebuild the index when the gazetteer table has changed. Only the
+        first build, or a forced one, happens in the caller; later changes
+        are picked up by a background rebuild while the current snapshot
+        keeps serving lookups.
+        """
+        now = time.monotonic()
+        if not force and self._snapshot[0] and now - self._checked_at < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            signature = self._signature_from_db()
+            if force or not self._snapshot[0]:
+                self._build(signature)
+            elif signature != self._signature and self._rebuilding is None:
+                self._rebuilding = threading.Thread(
+                    target=self._rebuild, args=(signature,), name='gazetteer-rebuild', daemon=True,
+                )
+                self._rebuilding.start()
+
+    def lookup(self, place):
+        """
+        Exact match on the normalized name; returns (lat, lon) or None
+        """
+        self.refresh()
+        entry = self._snapshot[0].get(normalize_name(place))
+        return entry[:2] if entry else None
+
+    def search(self, prefix, limit=10):
+        """
+        Return up to `limit` (name, lat, lon) entries starting with prefix,
+        most populous first
+        """
+        self.refresh()
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        places, names, _ = self._snapshot
+        start = bisect_left(names, prefix)
+        matches = []
+        for name in names[start:]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+            if len(matches) >= limit * 20:
+                break
+        matches.sort(key=lambda name: -places[name][2])
+        return [(name,) + places[name][:2] for name in matches[:limit]]
+
+    def contains(self, place):
+        """
+        Find the most populous gazetteer name appearing as a phrase inside
+        free text such as 'Andheri West, Mumbai'
+        """
+        self.refresh()
+        places = self._snapshot[0]
+        words = normalize_name(place).split()
+        best = None
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for i in range(len(words) - size + 1):
+                entry = places.get(' '.join(words[i:i + size]))
+                if entry and (best is None or entry[2] > best[2]):
+                    best = entry
+            if best is not None:
+                return best[:2]
+        return None
+
+    def fuzzy(self, place, threshold=FUZZY_THRESHOLD):
+        """
+        Best trigram-similarity match above threshold; returns (lat, lon) or None
+        """
+        self.refresh()
+        query = normalize_name(place)
+        if not query:
+            return None
+        query_grams = trigrams(query)
+        places, _, index = self._snapshot
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for name in index.get(gram, ()):
+                shared[name] += 1
+        best_name, best_score = None, threshold
+        for name, count in shared.items():
+            score = count / (len(query_grams) + len(trigrams(name)) - count)
+            if score >= best_score:
+                best_name, best_score = name, score
+        return places[best_name][:2] if best_name else None
+
+
+gazetteer = GazetteerIndex()
@@ -0,0 +1,82 @@
+"""
+Geographic helpers for RideON
+"""
+
+from math import asin, cos, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometres between two points
+    """
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return EARTH_RADIUS_KM * c
+
+
+def clamp_trip_distance(distance):
+    """
+    Clamp a raw distance in km to the values used for pricing,
+    rounded to 10 m
+    """
+    if distance < 0.1:
+        return 0.5
+    elif distance > 2000:
+        return 50.0
+    elif not (distance == distance):
+        return 10.0
+    return round(distance, 2)
+
+
+def trip_distance_km(lat1, lon1, lat2, lon2):
+    """
+    Straight-line trip distance used for pricing
+    """
+    try:
+        return clamp_trip_distance(haversine_km(lat1, lon1, lat2, lon2))
+    except Exception:
+        return 10.0
+
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lon, precision=7):
+    """
+    Encode a point as a geohash string; precision 7 is a cell of roughly 150 m
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_GEOHASH_BASE32[value])
+            bit = 0
+            value = 0
+    return ''.join(chars)
@@ -0,0 +1,251 @@
+"""
+Geocoding helpers for RideON
+Resolves place names to coordinates through the offline gazetteer, then an
+in-process LRU cache, a shared database-backed cache and, on a miss, the
+Nominatim API
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from core.cache_utils import LRUCache
+from core.gazetteer import gazetteer
+from core.models import GeocodeCacheEntry
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+USER_AGENT = 'RideON-App/1.0'
+
+_cache_settings = getattr(settings, 'GEOCODE_CACHE', {})
+CACHE_TTL = _cache_settings.get('TTL', 30 * 24 * 60 * 60)
+NEGATIVE_CACHE_TTL = _cache_settings.get('NEGATIVE_TTL', 24 * 60 * 60)
+REQUEST_TIMEOUT = _cache_settings.get('REQUEST_TIMEOUT', 10)
+# Expired GeocodeCacheEntry rows are deleted once every PURGE_EVERY writes
+PURGE_EVERY = _cache_settings.get('PURGE_EVERY', 1000)
+LOOKUP_DEADLINE = getattr(settings, 'GEOCODE_DEADLINE', REQUEST_TIMEOUT)
+LOOKUP_WORKERS = getattr(settings, 'GEOCODE_WORKERS', 8)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_place(place):
+    """
+    Normalize free-text place input into a cache key
+    """
+    if not place:
+        return ''
+    return _WHITESPACE_RE.sub(' ', place.strip().lower())[:255]
+
+
+class GeocodeCache:
+    """Two-level geocode cache: process-local LRU in front of GeocodeCacheEntry rows"""
+
+    def __init__(self, max_entries=4096, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL,
+                 purge_every=PURGE_EVERY):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.purge_every = purge_every
+        self.db_hits = 0
+        self.db_misses = 0
+        self.writes = 0
+
+    def get(self, key):
+        """
+        Return (lat, lon) for a known place, None for a cached miss,
+        or LRUCache.MISSING when the place has never been looked up
+        """
+        value = self.memory.get(key)
+        if value is not LRUCache.MISSING:
+            return value
+        now = timezone.now()
+        try:
+            entry = GeocodeCacheEntry.objects.filter(query=key).first()
+            if entry is not None and entry.expires_at <= now:
+                entry.delete()
+                entry = None
+        except DatabaseError:
+            entry = None
+        if entry is None:
+            self.db_misses += 1
+            return LRUCache.MISSING
+        self.db_hits += 1
+        value = (entry.latitude, entry.longitude) if entry.found else None
+        remaining = (entry.expires_at - timezone.now()).total_seconds()
+        self.memory.set(key, value, ttl=max(remaining, 1))
+        return value
+
+    def set(self, key, coords):
+        """
+        Store a lookup result; coords=None records a negative entry
+        """
+        ttl = self.ttl if coords is not None else self.negative_ttl
+        self.memory.set(key, coords, ttl=ttl)
+        lat, lon = coords if coords is not None else (None, None)
+        try:
+            GeocodeCacheEntry.objects.update_or_create(
+                query=key,
+                defaults={
+                    'latitude': lat,
+                    'longitude': lon,
+                    'found': coords is not None,
+                    'expires_at': timezone.now() + timedelta(seconds=ttl),
+                },
+            )
+        except DatabaseError:
+            pass
+        self.writes += 1
+        if self.purge_every and self.writes % self.purge_every == 0:
+            self.purge_expired()
+
+    def purge_expired(self):
+        """
+        Delete expired rows, including places that are never looked up again;
+        returns the number of rows deleted
+        """
+        try:
+            deleted, _ = GeocodeCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        except DatabaseError:
+            return 0
+        return deleted
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats['db_hits'] = self.db_hits
+        stats['db_misses'] = self.db_misses
+        return stats
+
+
+geocode_cache = GeocodeCache(max_entries=_cache_settings.get('MAX_ENTRIES', 4096))
+
+# Shared keep-alive session and worker pool for Nominatim requests.
+# Workers only do network I/O, except for caching lookups that finish after
+# the caller's deadline.
+_session = requests.Session()
+_session.headers['User-Agent'] = USER_AGENT
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=LOOKUP_WORKERS))
+_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix='geocode')
+
+
+def _nominatim_lookup(place, timeout=REQUEST_TIMEOUT):
+    """
+    Query Nominatim; returns (lat, lon) or None when the place is unknown.
+    Network and decoding errors propagate so that they are not cached.
+    """
+    resp = _session.get(
+        NOMINATIM_URL,
+        params={'format': 'json', 'q': place, 'limit': 1},
+        timeout=timeout,
+    )
+    data = resp.json()
+    if data:
+        return float(data[0]['lat']), float(data[0]['lon'])
+    return None
+
+
+def _fallback_coords(place):
+    coords = gazetteer.contains(place) or gazetteer.fuzzy(place)
+    return coords if coords else (None, None)
+
+
+def _local_coords(place):
+    """
+    Resolve a place without the network: (lat, lon), None for a cached miss,
+    or LRUCache.MISSING when Nominatim has to be asked
+    """
+    coords = gazetteer.lookup(place)
+    if coords is not None:
+        return coords
+    return geocode_cache.get(normalize_place(place))
+
+
+def get_coords(place):
+    """
+    Resolve a place name to (lat, lon), or (None, None) if it cannot be found
+    """
+    if not normalize_place(place):
+        return None, None
+    coords = _local_coords(place)
+    if coords is LRUCache.MISSING:
+        try:
+            coords = _nominatim_lookup(place)
+        except Exception:
+            # Transient failure: fall back without poisoning the cache
+            return _fallback_coords(place)
+        geocode_cache.set(normalize_place(place), coords)
+    if coords is not None:
+        return coords
+    return _fallback_coords(place)
+
+
+def _cache_late_result(key, caller):
+    """
+    Done-callback storing a lookup that finished after get_coords_many()
+    stopped waiting, so the next request does not ask Nominatim again
+    """
+    def store(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            geocode_cache.set(key, future.result())
+        finally:
+            # Worker threads would otherwise keep a connection open; the callback
+            # runs on the caller instead if the lookup finished just in time
+            if threading.get_ident() != caller:
+                connection.close()
+    return store
+
+
+def get_coords_many(places, deadline=LOOKUP_DEADLINE):
+    """
+    Resolve several places at once, returning a list of (lat, lon) in input order.
+    Cache misses are looked up concurrently, once per cache key, and share one
+    overall deadline; lookups still running when it expires use the offline
+    fallback and are cached when they finish.
+    """
+    results = [(None, None)] * len(places)
+    # cache key -> (place as first written, result positions)
+    pending = {}
+    for i, place in enumerate(places):
+        key = normalize_place(place)
+        if not key:
+            continue
+        if key in pending:
+            pending[key][1].append(i)
+            continue
+        coords = _local_coords(place)
+        if coords is LRUCache.MISSING:
+            pending[key] = (place, [i])
+        else:
+            results[i] = coords if coords is not None else _fallback_coords(place)
+    if not pending:
+        return results
+
+    expires_at = time.monotonic() + deadline
+    futures = {
+        _executor.submit(_nominatim_lookup, place, deadline): key
+        for key, (place, _) in pending.items()
+    }
+    wait(futures, timeout=max(expires_at - time.monotonic(), 0))
+    for future, key in futures.items():
+        place, positions = pending[key]
+        coords = None
+        if future.done():
+            if future.exception() is None:
+                coords = future.result()
+                geocode_cache.set(key, coords)
+        elif not future.cancel():
+            future.add_done_callback(_cache_late_result(key, threading.get_ident()))
+        if coords is None:
+            coords = _fallback_coords(place)
+        for i in positions:
+            results[i] = coords
+    return results
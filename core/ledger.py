@@ -0,0 +1,202 @@
+"""
+Wallet ledger for RideON
+Every balance change is a single conditional UPDATE with an F() expression,
+recorded as a WalletTransaction in the same database transaction.
+Credits are stored as positive amounts and debits as negative ones.
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Booking, Wallet, WalletSnapshot, WalletTransaction
+
+
+CENT = Decimal('0.01')
+BULK_CHUNK_SIZE = 2000
+WALLET_CHUNK_SIZE = 2000
+
+Mismatch = namedtuple('Mismatch', ['wallet_id', 'balance', 'ledger_balance'])
+Reconciliation = namedtuple('Reconciliation', [
+    'start_transaction_id', 'end_transaction_id', 'transactions', 'wallets', 'mismatches', 'snapshots',
+])
+
+
+class LedgerError(Exception):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class AlreadyPaid(LedgerError):
+    pass
+
+
+def clean_amount(amount):
+    amount = Decimal(str(amount))
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError('Amount must be greater than 0')
+    return amount.quantize(CENT)
+
+
+def credit(wallet, amount, description=''):
+    """
+    Add amount to the wallet; returns the WalletTransaction
+    """
+    amount = clean_amount(amount)
+    with transaction.atomic():
+        Wallet.objects.filter(pk=wallet.pk).update(balance=F('balance') + amount)
+        entry = WalletTransaction.objects.create(
+            wallet=wallet, amount=amount, transaction_type='credit', description=description,
+        )
+    wallet.refresh_from_db(fields=['balance'])
+    return entry
+
+
+def debit(wallet, amount, description=''):
+    """
+    Take amount from the wallet, raising InsufficientFunds rather than
+    letting the balance go negative; returns the WalletTransaction
+    """
+    amount = clean_amount(amount)
+    with transaction.atomic():
+        # The balance guard and the subtraction are one statement, so two
+        # concurrent debits cannot both spend the same rupees
+        updated = Wallet.objects.filter(pk=wallet.pk, balance__gte=amount).update(balance=F('balance') - amount)
+        if not updated:
+            raise InsufficientFunds(f'Insufficient wallet balance for ₹{amount}')
+        entry = WalletTransaction.objects.create(
+            wallet=wallet, amount=-amount, transaction_type='debit', description=description,
+        )
+    wallet.refresh_from_db(fields=['balance'])
+    return entry
+
+
+def pay_for_booking(wallet, booking):
+    """
+    Debit the trip price and mark the booking paid, both or neither
+    """
+    with transaction.atomic():
+        if not Booking.objects.filter(pk=booking.pk, status='Completed').update(status='Paid'):
+            raise AlreadyPaid(f'Booking #{booking.pk} is not awaiting payment')
+        entry = debit(wallet, booking.price, f'Trip payment for booking #{booking.pk}')
+    booking.status = 'Paid'
+    return entry
+
+
+def bulk_credit(wallets, amount, description='', chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """
+    Credit every wallet in a queryset, one UPDATE and one bulk_create per
+    chunk of wallets, each chunk in its own transaction.
+    `progress(done, total)` is called after every chunk.
+    Returns the number of wallets credited.
+    """
+    amount = clean_amount(amount)
+    wallet_ids = wallets.order_by('pk').values_list('pk', flat=True)
+    total = wallet_ids.count() if progress else None
+    done = 0
+    last_pk = 0
+    while True:
+        # Keyset pagination keeps every chunk query on the primary key index
+        chunk = list(wallet_ids.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            Wallet.objects.filter(pk__in=chunk).update(balance=F('balance') + amount)
+            WalletTransaction.objects.bulk_create([
+                WalletTransaction(wallet_id=wallet_id, amount=amount, transaction_type='credit', description=description)
+                for wallet_id in chunk
+            ])
+        done += len(chunk)
+        last_pk = chunk[-1]
+        if progress:
+            progress(done, total)
+    return done
+
+
+def _latest_snapshot(wallet_ref, end):
+    return WalletSnapshot.objects.filter(
+        wallet=OuterRef(wallet_ref), last_transaction_id__lte=end,
+    ).order_by('-last_transaction_id')
+
+
+def reconcile(wallet_chunk_size=WALLET_CHUNK_SIZE, write_snapshots=True, full=False, progress=None):
+    """
+    Check every Wallet.balance against its ledger.
+
+    Each wallet's ledger balance is its own latest WalletSnapshot plus the
+    transactions after that snapshot, summed by the database one chunk of
+    wallets at a time. Snapshots are written for every wallet with new
+    transactions, so a run that dies part way leaves every wallet with a
+    consistent starting point. `full` ignores snapshots and replays the
+    whole ledger.
+    """
+    end = WalletTransaction.objects.aggregate(end=Max('id'))['end'] or 0
+    after_end = Subquery(
+        WalletTransaction.objects.filter(wallet=OuterRef('pk'), id__gt=end)
+        .values('wallet').annotate(total=Sum('amount')).values('total')
+    )
+    if full:
+        snapshot_id = since = Value(None, output_field=BigIntegerField())
+        snapshot_balance = Value(None, output_field=DecimalField())
+    else:
+        # Only the latest snapshot of each wallet is read, through the (wallet, -last_transaction_id) index
+        snapshot_id = Subquery(_latest_snapshot('pk', end).values('last_transaction_id')[:1])
+        snapshot_balance = Subquery(_latest_snapshot('pk', end).values('balance')[:1])
+        since = Subquery(_latest_snapshot('wallet_id', end).values('last_transaction_id')[:1])
+    wallets = (
+        Wallet.objects.order_by('pk')
+        .annotate(after=after_end, snapshot_id=snapshot_id, snapshot_balance=snapshot_balance)
+        .values_list('pk', 'balance', 'after', 'snapshot_id', 'snapshot_balance')
+    )
+
+    start = None
+    transactions = 0
+    checked = 0
+    mismatches = []
+    written = 0
+    last_pk = 0
+    while True:
+        # Balance minus anything written after `end`, read in one statement
+        # so concurrent payments do not show up as mismatches
+        chunk = list(wallets.filter(pk__gt=last_pk)[:wallet_chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        low = min(row[3] or 0 for row in chunk)
+        start = low if start is None else min(start, low)
+
+        # Each wallet's transactions after its own snapshot, up to `end`
+        deltas = {}
+        rows = (
+            WalletTransaction.objects.filter(wallet_id__in=[row[0] for row in chunk], id__gt=low, id__lte=end)
+            .annotate(since=Coalesce(since, 0, output_field=BigIntegerField()))
+            .filter(id__gt=F('since'))
+            .values('wallet_id')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            deltas[row['wallet_id']] = row['total']
+            transactions += row['count']
+
+        snapshots = []
+        for wallet_id, balance, after, _, base in chunk:
+            ledger_balance = ((base or Decimal('0')) + deltas.get(wallet_id, Decimal('0'))).quantize(CENT)
+            balance -= after or 0
+            if balance != ledger_balance:
+                mismatches.append(Mismatch(wallet_id, balance, ledger_balance))
+            if write_snapshots and wallet_id in deltas:
+                snapshots.append(WalletSnapshot(wallet_id=wallet_id, balance=ledger_balance, last_transaction_id=end))
+        if snapshots:
+            WalletSnapshot.objects.bulk_create(snapshots)
+            written += len(snapshots)
+        checked += len(chunk)
+        if progress:
+            progress('wallets', checked, None)
+    return Reconciliation(start or 0, end, transactions, checked, mismatches, written)
@@ -0,0 +1,167 @@
+"""
+Driver location ingestion for RideON
+Pings update the dispatch index immediately and are coalesced in memory to
+the latest position per driver; a background thread writes them with one
+bulk_update per flush interval, at most one row per driver.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from core.dispatch import dispatcher
+from core.models import Driver
+
+logger = logging.getLogger(__name__)
+
+_ingest_settings = getattr(settings, 'LOCATION_INGEST', {})
+FLUSH_INTERVAL = _ingest_settings.get('FLUSH_INTERVAL', 5)
+MAX_PENDING = _ingest_settings.get('MAX_PENDING', 50000)
+BATCH_SIZE = _ingest_settings.get('BATCH_SIZE', 500)
+
+
+class LocationBuffer:
+    """Latest (lat, lon, timestamp) per driver waiting to be written"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, batch_size=BATCH_SIZE, background=True):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.background = background
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        # driver_id -> (timestamp, lat, lon) of the newest accepted ping, flushed or not
+        self._latest = {}
+        self._flushed_at = time.monotonic()
+        self._flusher = None
+        self._stopped = threading.Event()
+        self.received = 0
+        self.stale = 0
+        self.rows_written = 0
+        self.flushes = 0
+
+    def add(self, driver_id, lat, lon, timestamp=None):
+        return self.add_many([(driver_id, lat, lon, timestamp)])
+
+    def add_many(self, pings):
+        """
+        Buffer (driver_id, lat, lon, timestamp) pings; a ping older than the
+        last one seen for its driver is dropped. Timestamps in the future are
+        taken as now, so a fast device clock cannot shadow later pings.
+        Returns the number accepted.
+        """
+        if self.background and self._flusher is None:
+            self.start()
+        now = timezone.now()
+        accepted = 0
+        with self._lock:
+            for driver_id, lat, lon, timestamp in pings:
+                timestamp = min(timestamp, now) if timestamp else now
+                self.received += 1
+                latest = self._latest.get(driver_id)
+                if latest is not None and timestamp < latest[0]:
+                    self.stale += 1
+                    continue
+                self._latest[driver_id] = (timestamp, lat, lon)
+                self._pending[driver_id] = (lat, lon, timestamp)
+                dispatcher.index.move(driver_id, lat, lon)
+                accepted += 1
+            due = (
+                len(self._pending) >= self.max_pending
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            )
+        if due:
+            self.flush()
+        return accepted
+
+    def start(self):
+        """
+        Start the thread that flushes every flush_interval, even when no
+        further pings arrive
+        """
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._stopped.clear()
+            self._flusher = threading.Thread(target=self._run, name='location-flush', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """
+        Stop the flusher thread and write what is still buffered
+        """
+        self._stopped.set()
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.join()
+        return self.flush()
+
+    def latest_positions(self):
+        """
+        {driver_id: (timestamp, lat, lon)} of the newest ping per driver.
+        Read without the buffer lock: Dispatcher.sync calls this while
+        holding the index lock, which add_many takes inside the buffer lock.
+        """
+        return self._latest.copy()
+
+    def flush(self):
+        """
+        Write buffered positions with one bulk_update; returns rows written
+        """
+        # Concurrent callers skip the flush rather than queue behind it
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushed_at = time.monotonic()
+            if not pending:
+                return 0
+            drivers = [
+                Driver(pk=driver_id, latitude=lat, longitude=lon, location_updated_at=timestamp)
+                for driver_id, (lat, lon, timestamp) in pending.items()
+            ]
+            try:
+                Driver.objects.bulk_update(
+                    drivers, ['latitude', 'longitude', 'location_updated_at'], batch_size=self.batch_size,
+                )
+            except DatabaseError:
+                # Put the positions back unless newer pings arrived meanwhile
+                with self._lock:
+                    for driver_id, position in pending.items():
+                        self._pending.setdefault(driver_id, position)
+                logger.exception('Could not flush %s driver locations', len(pending))
+                return 0
+            self.flushes += 1
+            self.rows_written += len(drivers)
+            return len(drivers)
+        finally:
+            self._flush_lock.release()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'received': self.received,
+            'stale': self.stale,
+            'rows_written': self.rows_written,
+            'flushes': self.flushes,
+        }
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.stop)
@@ -0,0 +1,103 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import pricing
+from core.dispatch import DispatchIndex
+from core.geo import haversine_km
+
+# Drivers are scattered over a box roughly the size of a large city
+CITY_CENTER = (12.97, 77.59)
+CITY_SPAN = 0.5
+
+
+def random_point(rng):
+    return (
+        CITY_CENTER[0] + rng.uniform(-CITY_SPAN / 2, CITY_SPAN / 2),
+        CITY_CENTER[1] + rng.uniform(-CITY_SPAN / 2, CITY_SPAN / 2),
+    )
+
+
+def linear_nearest(drivers, vehicle_type, lat, lon):
+    """
+    Baseline: scan every available driver of the type
+    """
+    best_id, best_km = None, None
+    for driver_id, driver_type, driver_lat, driver_lon in drivers:
+        if driver_type != vehicle_type:
+            continue
+        distance = haversine_km(lat, lon, driver_lat, driver_lon)
+        if best_km is None or distance < best_km:
+            best_id, best_km = driver_id, distance
+    return best_id
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nearest-driver dispatch over synthetic driver fleets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', default='10000,50000,100000', help='Comma-separated fleet sizes')
+        parser.add_argument('--queries', type=int, default=5000)
+        parser.add_argument('--baseline-queries', type=int, default=50, help='Queries for the linear-scan baseline')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            fleet_sizes = [int(n) for n in options['drivers'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError('--drivers must be comma-separated integers')
+        queries = options['queries']
+        vehicle_types = pricing.DEFAULT_RULES.vehicle_type_names
+        rng = random.Random(options['seed'])
+
+        results = []
+        for size in fleet_sizes:
+            drivers = [(i, vehicle_types[i % len(vehicle_types)], *random_point(rng)) for i in range(size)]
+            pickups = [(vehicle_types[rng.randrange(len(vehicle_types))], *random_point(rng)) for _ in range(queries)]
+
+            index = DispatchIndex()
+            start = time.perf_counter()
+            index.replace((*driver, None) for driver in drivers)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for pickup in pickups:
+                index.nearest(*pickup)
+            nearest = time.perf_counter() - start
+
+            # Claim and release: the driver leaves the index and returns at the drop-off
+            start = time.perf_counter()
+            for pickup in pickups:
+                driver_id = index.nearest(*pickup)
+                if driver_id is not None:
+                    index.remove(driver_id)
+                    index.add(driver_id, pickup[0], *random_point(rng))
+            claim = time.perf_counter() - start
+
+            baseline_queries = min(options['baseline_queries'], queries)
+            start = time.perf_counter()
+            for pickup in pickups[:baseline_queries]:
+                linear_nearest(drivers, *pickup)
+            baseline = (time.perf_counter() - start) / max(baseline_queries, 1)
+
+            results.append({
+                'drivers': size,
+                'build_seconds': round(build, 4),
+                'nearest_us': round(nearest / queries * 1e6, 2),
+                'claim_release_us': round(claim / queries * 1e6, 2),
+                'linear_scan_us': round(baseline * 1e6, 2),
+                'speedup': round(baseline / (nearest / queries), 1),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps({'queries': queries, 'results': results}, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['drivers']:>7} drivers: build {result['build_seconds']:.3f}s  "
+                f"nearest {result['nearest_us']:8.2f} us  claim+release {result['claim_release_us']:8.2f} us  "
+                f"linear scan {result['linear_scan_us']:10.2f} us  ({result['speedup']}x)"
+            )
@@ -0,0 +1,173 @@
+import json
+import platform
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import geo, pricing
+
+# The legacy code only knew the built-in rate table
+LEGACY_VEHICLE_TYPES = [
+    {'type': v['type'], 'base': v['base'], 'per_km': v['per_km']}
+    for v in pricing.VEHICLE_TYPES
+]
+
+
+def legacy_fare(vehicle_data, distance, discount=0):
+    """
+    The fare function as it was nested inside home_view, kept verbatim as the
+    baseline for benchmarks and golden comparisons
+    """
+    base_fare = Decimal(str(vehicle_data['base']))
+    per_km_rate = Decimal(str(vehicle_data['per_km']))
+    distance_decimal = Decimal(str(distance))
+    distance_charge = per_km_rate * distance_decimal
+    if distance <= 2:
+        fare = max(base_fare * Decimal('1.5'), base_fare + distance_charge)
+    elif distance <= 5:
+        fare = base_fare + distance_charge
+    elif distance <= 15:
+        fare = base_fare + (distance_charge * Decimal('0.95'))
+    elif distance <= 50:
+        base_distance = Decimal('15')
+        excess_distance = distance_decimal - base_distance
+        fare = base_fare + (per_km_rate * base_distance * Decimal('0.95')) + (per_km_rate * excess_distance * Decimal('0.85'))
+    else:
+        base_distance = Decimal('15')
+        medium_distance = Decimal('35')
+        excess_distance = distance_decimal - Decimal('50')
+        fare = (base_fare +
+                (per_km_rate * base_distance * Decimal('0.95')) +
+                (per_km_rate * medium_distance * Decimal('0.85')) +
+                (per_km_rate * excess_distance * Decimal('0.75')))
+    current_hour = datetime.now().hour
+    if 7 <= current_hour <= 10 or 17 <= current_hour <= 20:
+        fare = fare * Decimal('1.15')
+    elif 22 <= current_hour or current_hour <= 5:
+        fare = fare * Decimal('1.10')
+    if vehicle_data['type'] in ['SUV', 'Mini']:
+        fare = fare * Decimal('1.05')
+    elif vehicle_data['type'] in ['Saver Scooter']:
+        fare = fare * Decimal('0.95')
+    if discount:
+        fare = fare * (Decimal('1') - Decimal(discount)/Decimal('100'))
+    fare = fare.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return max(1, min(int(fare), 99999))
+
+
+def legacy_quote(distance, discount=0):
+    return [legacy_fare(v, distance, discount) for v in LEGACY_VEHICLE_TYPES]
+
+
+def engine_quote(distance, discount=0, rules=pricing.DEFAULT_RULES):
+    now = datetime.now()
+    return [v['price'] for v in pricing.quote(distance, now, rules.vehicle_type_names, discount, rules)]
+
+
+def rules_with_vehicle_count(count):
+    """
+    The built-in rules cut down or padded with copies of the built-in
+    vehicle types to exactly `count` types
+    """
+    vehicles = []
+    for i in range(count):
+        vehicle = dict(pricing.VEHICLE_TYPES[i % len(pricing.VEHICLE_TYPES)])
+        if i >= len(pricing.VEHICLE_TYPES):
+            vehicle['type'] = f"{vehicle['type']} {i // len(pricing.VEHICLE_TYPES) + 1}"
+        vehicles.append(vehicle)
+    return pricing.compile_rules(vehicles, pricing.PROMOCODES)
+
+
+def _time(func, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the pricing path (fares, haversine, vehicle filtering, promocodes) '
+        'and compare core.pricing.quote against the legacy home_view fare code'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument(
+            '--vehicle-counts', default='1,7,50',
+            help='Comma-separated numbers of vehicle types to quote at',
+        )
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        try:
+            vehicle_counts = [int(n) for n in options['vehicle_counts'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError('--vehicle-counts must be comma-separated integers')
+        if iterations < 1 or not vehicle_counts or min(vehicle_counts) < 1:
+            raise CommandError('--iterations and --vehicle-counts must be positive')
+
+        distances = [0.5 + (i % 400) * 0.37 for i in range(iterations)]
+
+        # Prices must agree before timings mean anything
+        for distance in distances[:400]:
+            for discount in (0, 10, 50):
+                if legacy_quote(distance, discount) != engine_quote(distance, discount):
+                    raise CommandError(f'Price mismatch at {distance} km, {discount}% discount')
+
+        results = []
+
+        def record(name, seconds, vehicle_types=None):
+            results.append({
+                'name': name,
+                'vehicle_types': vehicle_types,
+                'iterations': iterations,
+                'seconds': round(seconds, 6),
+                'us_per_op': round(seconds / iterations * 1e6, 3),
+                'ops_per_second': round(iterations / seconds, 1),
+            })
+
+        quote_args = [(distance, 10) for distance in distances]
+        record('legacy_quote', _time(legacy_quote, quote_args), len(LEGACY_VEHICLE_TYPES))
+        record('engine_quote', _time(engine_quote, quote_args), len(LEGACY_VEHICLE_TYPES))
+        for count in vehicle_counts:
+            rules = rules_with_vehicle_count(count)
+            record('quote', _time(engine_quote, [(distance, 10, rules) for distance in distances]), count)
+
+        coords = [
+            (12.9 + (i % 97) * 0.01, 77.5 + (i % 89) * 0.01, 13.0 + (i % 83) * 0.02, 77.6 + (i % 79) * 0.02)
+            for i in range(iterations)
+        ]
+        record('haversine', _time(geo.trip_distance_km, coords))
+        rules = pricing.DEFAULT_RULES
+        record('vehicle_filter', _time(pricing.eligible_vehicle_types, [(distance, rules) for distance in distances]))
+        codes = ('save50', 'ride10', 'freeride', 'unknown')
+        promo_args = [(Decimal(int(distance * 20)), codes[i % len(codes)], rules) for i, distance in enumerate(distances)]
+        record('promocode', _time(pricing.redeem_promocode, promo_args))
+
+        legacy, engine = results[0], results[1]
+        report = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'rules_version': pricing.DEFAULT_RULES.version,
+            'speedup': round(legacy['seconds'] / engine['seconds'], 3),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for result in results:
+            types = f"  ({result['vehicle_types']} vehicle types)" if result['vehicle_types'] else ''
+            self.stdout.write(
+                f"{result['name']:>14}: {result['us_per_op']:8.2f} us/op  "
+                f"{result['ops_per_second']:10.0f} ops/s{types}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {report['speedup']:.2f}x"))
@@ -0,0 +1,99 @@
+import heapq
+import json
+import random
+import time
+from math import cos, radians, sqrt
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.spatial import KM_PER_DEGREE, SpatialIndex
+from core.management.commands.benchmark_dispatch import CITY_SPAN, random_point
+
+# A ping moves a driver by up to ~100 m
+STEP = 0.001
+
+
+def brute_force_nearest(points, lat, lon, k):
+    lon_scale = KM_PER_DEGREE * cos(radians(lat))
+    return heapq.nsmallest(k, (
+        (sqrt(((p_lat - lat) * KM_PER_DEGREE) ** 2 + ((p_lon - lon) * lon_scale) ** 2), key)
+        for key, (p_lat, p_lon) in points.items()
+    ))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark core.spatial.SpatialIndex position updates and k-nearest queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', default='10000,50000,100000', help='Comma-separated index sizes')
+        parser.add_argument('--updates', type=int, default=200000)
+        parser.add_argument('--queries', type=int, default=5000)
+        parser.add_argument('--k', default='1,5,10', help='Comma-separated k values for nearest queries')
+        parser.add_argument('--cell-size', type=float, default=0.01)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(n) for n in options['points'].split(',') if n.strip()]
+            k_values = [int(k) for k in options['k'].split(',') if k.strip()]
+        except ValueError:
+            raise CommandError('--points and --k must be comma-separated integers')
+        rng = random.Random(options['seed'])
+        updates, queries = options['updates'], options['queries']
+
+        results = []
+        for size in sizes:
+            points = {i: random_point(rng) for i in range(size)}
+            index = SpatialIndex(options['cell_size'])
+            start = time.perf_counter()
+            for key, (lat, lon) in points.items():
+                index.update(key, lat, lon)
+            build = time.perf_counter() - start
+
+            moves = []
+            for _ in range(updates):
+                key = rng.randrange(size)
+                lat, lon = points[key]
+                lat, lon = lat + rng.uniform(-STEP, STEP), lon + rng.uniform(-STEP, STEP)
+                points[key] = (lat, lon)
+                moves.append((key, lat, lon))
+            start = time.perf_counter()
+            for key, lat, lon in moves:
+                index.update(key, lat, lon)
+            update_seconds = time.perf_counter() - start
+
+            pickups = [random_point(rng) for _ in range(queries)]
+            result = {
+                'points': size,
+                'build_seconds': round(build, 4),
+                'updates_per_second': round(updates / update_seconds),
+                'nearest': {},
+            }
+            for k in k_values:
+                start = time.perf_counter()
+                for lat, lon in pickups:
+                    index.nearest(lat, lon, k)
+                elapsed = time.perf_counter() - start
+                # The grid must agree with a brute-force scan
+                for lat, lon in pickups[:20]:
+                    expected = [round(d, 9) for d, _ in brute_force_nearest(points, lat, lon, k)]
+                    if [round(d, 9) for _, d in index.nearest(lat, lon, k)] != expected:
+                        raise CommandError(f'k-nearest mismatch at ({lat}, {lon}), k={k}')
+                result['nearest'][k] = {
+                    'us_per_query': round(elapsed / queries * 1e6, 2),
+                    'queries_per_second': round(queries / elapsed),
+                }
+            results.append(result)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'city_span_degrees': CITY_SPAN, 'results': results}, indent=2))
+            return
+        for result in results:
+            nearest = '  '.join(
+                f"k={k}: {r['us_per_query']:.1f} us" for k, r in result['nearest'].items()
+            )
+            self.stdout.write(
+                f"{result['points']:>7} points: build {result['build_seconds']:.3f}s  "
+                f"{result['updates_per_second']:>9} updates/s  {nearest}"
+            )
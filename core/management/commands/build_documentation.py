@@ -0,0 +1,28 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import documentation_cache
+
+
+class Command(BaseCommand):
+    help = 'Build the documentation DOCX for the current content version ahead of the first download'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild even if this version is already cached')
+
+    def handle(self, *args, **options):
+        version = documentation_cache.content_version()
+        path = documentation_cache.document_path(version)
+        if not options['force'] and os.path.exists(path):
+            self.stdout.write(f'Documentation version {version} is already built: {path}')
+            return
+        start = time.perf_counter()
+        try:
+            path = documentation_cache.build(version)
+        except documentation_cache.DocumentationError as e:
+            raise CommandError(f'Could not build documentation: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Built documentation version {version} in {time.perf_counter() - start:.2f}s: {path}'
+        ))
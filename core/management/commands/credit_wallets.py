@@ -0,0 +1,46 @@
+from decimal import InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ledger
+from core.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Credit many wallets at once (promo campaigns), writing a ledger entry per wallet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('amount', help='Amount in rupees to add to each wallet')
+        parser.add_argument('--description', default='Promotional credit')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--all', action='store_true', help='Credit every wallet')
+        target.add_argument('--usernames', help='Comma-separated usernames to credit')
+        parser.add_argument('--active-only', action='store_true', help='Skip suspended users')
+        parser.add_argument('--chunk-size', type=int, default=ledger.BULK_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many wallets would be credited')
+
+    def handle(self, *args, **options):
+        try:
+            amount = ledger.clean_amount(options['amount'])
+        except (InvalidOperation, ValueError):
+            raise CommandError('Amount must be a number greater than 0')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        wallets = Wallet.objects.all()
+        if options['usernames']:
+            wallets = wallets.filter(user__username__in=[u.strip() for u in options['usernames'].split(',') if u.strip()])
+        if options['active_only']:
+            wallets = wallets.filter(user__is_active=True)
+
+        if options['dry_run']:
+            self.stdout.write(f'Would credit ₹{amount} to {wallets.count()} wallets')
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} wallets credited')
+
+        credited = ledger.bulk_credit(
+            wallets, amount, options['description'], chunk_size=options['chunk_size'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Credited ₹{amount} to {credited} wallets'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import statements
+
+
+class Command(BaseCommand):
+    help = 'Render monthly PDF statements of paid trips and wallet transactions for every rider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', nargs='?', help='YYYY-MM; defaults to last month')
+        parser.add_argument('--output-dir', help=f'Defaults to {statements.OUTPUT_ROOT}')
+        parser.add_argument('--workers', type=int, help='Rendering processes; defaults to one per core, 1 renders in-process')
+        parser.add_argument('--chunk-size', type=int, default=statements.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                year, month = (int(part) for part in options['month'].split('-'))
+                if not 1 <= month <= 12:
+                    raise ValueError
+            except ValueError:
+                raise CommandError('Month must be YYYY-MM')
+        else:
+            today = timezone.localdate()
+            year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        if (options['workers'] is not None and options['workers'] < 1) or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive')
+        verbose = options['verbosity'] > 1
+
+        def progress(done):
+            if verbose and done % 100 == 0:
+                self.stdout.write(f'  {done} statements')
+
+        run = statements.generate_statements(
+            year, month, options['output_dir'], options['workers'], options['chunk_size'], progress,
+        )
+        rate = run.statements / run.elapsed if run.elapsed else 0
+        summary = (
+            f'{run.statements} statements for {year}-{month:02d} '
+            f'({run.bookings} trips, {run.transactions} transactions, {run.bytes_written / 2**20:.1f} MB) '
+            f'in {run.elapsed:.2f}s, {rate:.1f} statements/sec'
+        )
+        if run.peak_rss is not None:
+            summary += f'; peak memory {run.peak_rss / 2**20:.0f} MB'
+        if run.worker_peak_rss is not None:
+            summary += f' (largest worker {run.worker_peak_rss / 2**20:.0f} MB)'
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,120 @@
+import csv
+import gzip
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.gazetteer import gazetteer, normalize_name
+from core.models import GazetteerPlace
+
+# Column positions in a GeoNames "geoname" dump (allCountries.txt, IN.txt, cities500.txt, ...)
+GEONAMES_NAME = 1
+GEONAMES_ASCII_NAME = 2
+GEONAMES_ALTERNATE_NAMES = 3
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_COUNTRY_CODE = 8
+GEONAMES_POPULATION = 14
+
+
+class Command(BaseCommand):
+    help = 'Load a place list (CSV or GeoNames dump) into the offline gazetteer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with name,latitude,longitude[,population,country_code] columns, or a GeoNames dump (.txt/.tsv, optionally .gz)')
+        parser.add_argument('--format', choices=['auto', 'csv', 'geonames'], default='auto')
+        parser.add_argument('--replace', action='store_true', help='Delete existing gazetteer rows first')
+        parser.add_argument('--min-population', type=int, default=0)
+        parser.add_argument('--alternate-names', action='store_true', help='Also index GeoNames alternate names')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format']
+        if fmt == 'auto':
+            base = path[:-3] if path.endswith('.gz') else path
+            fmt = 'geonames' if base.endswith(('.txt', '.tsv')) else 'csv'
+        try:
+            raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        with raw, io.TextIOWrapper(raw, encoding='utf-8', newline='') as handle:
+            rows = self._read_geonames(handle, options) if fmt == 'geonames' else self._read_csv(handle)
+            loaded = self._load(rows, options)
+
+        gazetteer.refresh(force=True)
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} gazetteer entries from {path}'))
+
+    def _read_csv(self, handle):
+        reader = csv.DictReader(handle)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        lat_field = fields.get('latitude') or fields.get('lat')
+        lon_field = fields.get('longitude') or fields.get('lon') or fields.get('lng')
+        if 'name' not in fields or not lat_field or not lon_field:
+            raise CommandError('CSV must have name, latitude and longitude columns')
+        population_field = fields.get('population')
+        country_field = fields.get('country_code') or fields.get('country')
+        for row in reader:
+            try:
+                yield (
+                    row[fields['name']],
+                    float(row[lat_field]),
+                    float(row[lon_field]),
+                    int(row[population_field] or 0) if population_field else 0,
+                    (row[country_field] or '')[:2].upper() if country_field else '',
+                )
+            except (TypeError, ValueError):
+                continue
+
+    def _read_geonames(self, handle, options):
+        for line in handle:
+            cols = line.rstrip('\r\n').split('\t')
+            if len(cols) <= GEONAMES_POPULATION:
+                continue
+            try:
+                lat = float(cols[GEONAMES_LATITUDE])
+                lon = float(cols[GEONAMES_LONGITUDE])
+                population = int(cols[GEONAMES_POPULATION] or 0)
+            except ValueError:
+                continue
+            country = cols[GEONAMES_COUNTRY_CODE]
+            names = {cols[GEONAMES_NAME], cols[GEONAMES_ASCII_NAME]}
+            if options['alternate_names'] and cols[GEONAMES_ALTERNATE_NAMES]:
+                names.update(cols[GEONAMES_ALTERNATE_NAMES].split(','))
+            for name in names:
+                if name:
+                    yield name, lat, lon, population, country
+
+    def _load(self, rows, options):
+        batch_size = options['batch_size']
+        min_population = options['min_population']
+        processed = 0
+        batch = []
+        with transaction.atomic():
+            if options['replace']:
+                GazetteerPlace.objects.all().delete()
+            existing = GazetteerPlace.objects.count()
+            for name, lat, lon, population, country in rows:
+                normalized = normalize_name(name)
+                if not normalized or population < min_population:
+                    continue
+                # ASCII/alternate spellings that collapse onto the same entry
+                # hit gazetteer_place_unique and are skipped by the database
+                batch.append(GazetteerPlace(
+                    name=name[:200],
+                    normalized_name=normalized,
+                    country_code=country,
+                    population=population,
+                    latitude=round(lat, 4),
+                    longitude=round(lon, 4),
+                ))
+                if len(batch) >= batch_size:
+                    GazetteerPlace.objects.bulk_create(batch, ignore_conflicts=True)
+                    processed += len(batch)
+                    batch = []
+                    self.stdout.write(f'  {processed} entries processed...')
+            if batch:
+                GazetteerPlace.objects.bulk_create(batch, ignore_conflicts=True)
+            return GazetteerPlace.objects.count() - existing
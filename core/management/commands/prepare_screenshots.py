@@ -0,0 +1,30 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import doc_images, documentation
+
+
+class Command(BaseCommand):
+    help = 'Build the downscaled screenshot copies embedded in the documentation DOCX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Parallel image workers; defaults to one per core')
+
+    def handle(self, *args, **options):
+        if doc_images.Image is None:
+            raise CommandError('Pillow is not installed; the documentation embeds the original screenshots')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        start = time.perf_counter()
+        prepared = doc_images.prepare_screenshots(
+            documentation.SCREENSHOT_DIR, documentation.SCREENSHOTS.values(), options['workers'],
+        )
+        elapsed = time.perf_counter() - start
+        original = sum(os.path.getsize(os.path.join(documentation.SCREENSHOT_DIR, name)) for name in prepared)
+        derived = sum(os.path.getsize(path) for path in prepared.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Prepared {len(prepared)} screenshots ({doc_images.variant()}) in {elapsed:.2f}s: '
+            f'{original / 2**20:.1f} MB -> {derived / 2**20:.1f} MB'
+        ))
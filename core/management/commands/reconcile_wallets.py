@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = 'Check wallet balances against the transaction ledger and write balance snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Replay the whole ledger instead of starting from the last snapshots')
+        parser.add_argument('--no-snapshots', action='store_true', help='Only check; do not write snapshots')
+        parser.add_argument('--wallet-chunk-size', type=int, default=ledger.WALLET_CHUNK_SIZE)
+        parser.add_argument('--show', type=int, default=20, help='Number of mismatched wallets to list')
+        parser.add_argument('--fail-on-mismatch', action='store_true', help='Exit with an error when any balance is off')
+
+    def handle(self, *args, **options):
+        if options['wallet_chunk_size'] < 1:
+            raise CommandError('--wallet-chunk-size must be positive')
+        verbose = options['verbosity'] > 1
+
+        def progress(stage, done, total):
+            if verbose:
+                self.stdout.write(f'  {stage}: {done}' + (f'/{total}' if total else ''))
+
+        start = time.perf_counter()
+        result = ledger.reconcile(
+            wallet_chunk_size=options['wallet_chunk_size'],
+            write_snapshots=not options['no_snapshots'],
+            full=options['full'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f'Replayed {result.transactions} transactions '
+            f'(#{result.start_transaction_id + 1}-#{result.end_transaction_id}) '
+            f'across {result.wallets} wallets in {elapsed:.2f}s '
+            f'({result.transactions / elapsed * 60 if elapsed else 0:,.0f} transactions/min); '
+            f'{result.snapshots} snapshots written'
+        )
+        for mismatch in result.mismatches[:options['show']]:
+            self.stdout.write(self.style.WARNING(
+                f'  wallet {mismatch.wallet_id}: balance ₹{mismatch.balance}, ledger ₹{mismatch.ledger_balance}'
+            ))
+        if result.mismatches:
+            message = f'{len(result.mismatches)} wallets do not match their ledger'
+            if options['fail_on_mismatch']:
+                raise CommandError(message)
+            self.stdout.write(self.style.ERROR(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('All wallet balances match the ledger'))
@@ -0,0 +1,52 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import export_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued export jobs, resuming any whose worker stopped part way'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no jobs are waiting instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between checks for new jobs')
+        parser.add_argument('--chunk-size', type=int, default=export_jobs.JOB_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be positive')
+        verbose = options['verbosity'] > 1
+
+        def progress(job):
+            if verbose:
+                self.stdout.write(f'  job {job.pk}: {job.rows_written} rows, {job.bytes_written} bytes')
+
+        while True:
+            job = export_jobs.claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+            resumed = f' from row {job.rows_written}' if job.rows_written else ''
+            self.stdout.write(f'Exporting job {job.pk} ({job}){resumed}')
+            start = time.perf_counter()
+            try:
+                export_jobs.run_job(job, options['chunk_size'], progress)
+            except Exception as e:
+                logger.exception('Export job %s failed', job.pk)
+                job.status = 'Failed'
+                job.error = repr(e)
+                job.finished_at = timezone.now()
+                job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+                self.stdout.write(self.style.ERROR(f'Job {job.pk} failed: {e!r}'))
+                continue
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f'Job {job.pk}: {job.rows_written} rows, {job.bytes_written} bytes in {elapsed:.2f}s -> {job.file_name}'
+            ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_gazetteerplace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(unique=True)),
+                ('vehicle_types', models.JSONField(help_text='List of {"type", "base", "per_km", optional "multiplier", "exclude_between", "max_distance"}')),
+                ('promocodes', models.JSONField(blank=True, default=dict, help_text='Promocode to percentage discount')),
+                ('is_active', models.BooleanField(default=True)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-version'],
+            },
+        ),
+    ]
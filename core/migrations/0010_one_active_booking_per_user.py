@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Least to most advanced; only bookings that never started may be cancelled
+ACTIVE_BOOKING_STATUSES = ['Pending', 'Confirmed', 'Driver Assigned', 'In Progress', 'Completed']
+CANCELLABLE_STATUSES = {'Pending', 'Confirmed'}
+
+
+def cancel_duplicate_active_bookings(apps, schema_editor):
+    """
+    Keep each user's most advanced active booking and cancel the duplicates
+    that never started, so the constraint can be added. Two started bookings
+    (a trip under way or an unpaid 'Completed' fare) are left to be resolved
+    by hand and stop the migration.
+    """
+    Booking = apps.get_model('core', 'Booking')
+    active = Booking.objects.filter(status__in=ACTIVE_BOOKING_STATUSES)
+    users = (
+        active.values('user_id').annotate(count=models.Count('id')).filter(count__gt=1).values_list('user_id', flat=True)
+    )
+    cancel = []
+    conflicts = []
+    for user_id in users:
+        bookings = sorted(
+            active.filter(user_id=user_id).values_list('pk', 'status'),
+            key=lambda booking: (ACTIVE_BOOKING_STATUSES.index(booking[1]), booking[0]),
+        )
+        for pk, status in bookings[:-1]:
+            if status in CANCELLABLE_STATUSES:
+                cancel.append(pk)
+            else:
+                conflicts.append(f'user {user_id}: booking {pk} ({status}) and booking {bookings[-1][0]} ({bookings[-1][1]})')
+    if conflicts:
+        raise RuntimeError(
+            'Users with more than one started booking must be resolved by hand before '
+            'one_active_booking_per_user can be added:\n  ' + '\n  '.join(conflicts)
+        )
+    Booking.objects.filter(pk__in=cancel).update(status='Cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_driver_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_active_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['Pending', 'Confirmed', 'Driver Assigned', 'In Progress', 'Completed'])), fields=('user',), name='one_active_booking_per_user'),
+        ),
+    ]
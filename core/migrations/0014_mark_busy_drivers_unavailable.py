@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def mark_busy_drivers_unavailable(apps, schema_editor):
+    # 0008 added is_available with default True, which also made drivers
+    # already on a trip look free to the dispatcher
+    Booking = apps.get_model('core', 'Booking')
+    Driver = apps.get_model('core', 'Driver')
+    busy = Booking.objects.filter(
+        status__in=['Driver Assigned', 'In Progress'], driver__isnull=False,
+    ).values('driver_id')
+    Driver.objects.filter(pk__in=busy).update(is_available=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_busy_drivers_unavailable, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+def delete_duplicate_places(apps, schema_editor):
+    GazetteerPlace = apps.get_model('core', 'GazetteerPlace')
+    older = GazetteerPlace.objects.filter(
+        normalized_name=models.OuterRef('normalized_name'),
+        latitude=models.OuterRef('latitude'),
+        longitude=models.OuterRef('longitude'),
+        pk__lt=models.OuterRef('pk'),
+    )
+    GazetteerPlace.objects.filter(models.Exists(older)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_mark_busy_drivers_unavailable'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_places, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='gazetteerplace',
+            constraint=models.UniqueConstraint(fields=('normalized_name', 'latitude', 'longitude'), name='gazetteer_place_unique'),
+        ),
+    ]
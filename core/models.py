@@ -1,11 +1,21 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.contrib.auth.models import User
 class Driver(models.Model):
 	name = models.CharField(max_length=100)
 	phone = models.CharField(max_length=20)
-	vehicle_type = models.CharField(max_length=50)
+	vehicle_type = models.CharField(max_length=50, db_index=True)
 	vehicle_number = models.CharField(max_length=20)
 	rating = models.FloatField(default=4.5)
 	photo_url = models.URLField(blank=True, null=True)
+	user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='driver_profile')
+	is_available = models.BooleanField(default=True, db_index=True)
+	latitude = models.FloatField(null=True, blank=True)
+	longitude = models.FloatField(null=True, blank=True)
+	location_updated_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [models.Index(fields=['vehicle_type', 'is_available'])]
 
 	def __str__(self):
 		return f"{self.name} ({self.vehicle_type})"
@@ -32,6 +42,22 @@ class WalletTransaction(models.Model):
 	def __str__(self):
 		return f"{self.wallet.user.username} {self.transaction_type} {self.amount}" 
 
+# Ledger total of a wallet as of a WalletTransaction id, written by reconcile_wallets
+class WalletSnapshot(models.Model):
+	wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='snapshots')
+	balance = models.DecimalField(max_digits=12, decimal_places=2)
+	last_transaction_id = models.BigIntegerField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [models.Index(fields=['wallet', '-last_transaction_id'])]
+
+	def __str__(self):
+		return f"{self.wallet.user.username} ₹{self.balance} @ #{self.last_transaction_id}"
+
+# A user may hold only one booking in these statuses; 'Completed' stays active until paid
+ACTIVE_BOOKING_STATUSES = ['Pending', 'Confirmed', 'Driver Assigned', 'In Progress', 'Completed']
+
 class Booking(models.Model):
 	user = models.ForeignKey(User, on_delete=models.CASCADE)
 	vehicle_type = models.CharField(max_length=20)
@@ -44,7 +70,105 @@ class Booking(models.Model):
 	vehicle_number = models.CharField(max_length=20, blank=True, null=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(
+				fields=['user'],
+				condition=models.Q(status__in=ACTIVE_BOOKING_STATUSES),
+				name='one_active_booking_per_user',
+			),
+		]
+		# Booking history pages walk this index newest first
+		indexes = [
+			models.Index(fields=['user', '-created_at', '-id'], name='booking_user_history_idx'),
+		]
+
 	def __str__(self):
 		return f"{self.user.username} - {self.vehicle_type} ({self.status})"
 
 
+
+class GeocodeCacheEntry(models.Model):
+	query = models.CharField(max_length=255, unique=True)
+	latitude = models.FloatField(null=True, blank=True)
+	longitude = models.FloatField(null=True, blank=True)
+	found = models.BooleanField(default=True)
+	expires_at = models.DateTimeField(db_index=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.query} ({'found' if self.found else 'not found'})"
+
+class GazetteerPlace(models.Model):
+	name = models.CharField(max_length=200)
+	normalized_name = models.CharField(max_length=200, db_index=True)
+	country_code = models.CharField(max_length=2, blank=True)
+	population = models.BigIntegerField(default=0)
+	latitude = models.FloatField()
+	longitude = models.FloatField()
+
+	class Meta:
+		# load_gazetteer stores coordinates rounded to 4 places and relies on
+		# this to skip spellings that collapse onto the same entry
+		constraints = [
+			models.UniqueConstraint(fields=['normalized_name', 'latitude', 'longitude'], name='gazetteer_place_unique'),
+		]
+
+	def __str__(self):
+		return f"{self.name} ({self.country_code})" if self.country_code else self.name
+
+class PricingRuleSet(models.Model):
+	version = models.PositiveIntegerField(unique=True)
+	vehicle_types = models.JSONField(help_text='List of {"type", "base", "per_km", optional "multiplier", "exclude_between", "max_distance"}')
+	promocodes = models.JSONField(default=dict, blank=True, help_text='Promocode to percentage discount')
+	is_active = models.BooleanField(default=True)
+	note = models.CharField(max_length=200, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['-version']
+
+	def clean(self):
+		from core.pricing import compile_rules
+		try:
+			compile_rules(self.vehicle_types, self.promocodes, self.version)
+		except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as e:
+			raise ValidationError(f"Invalid pricing rules: {e!r}")
+
+	def __str__(self):
+		return f"Pricing rules v{self.version}" + (f" ({self.note})" if self.note else "")
+
+# Bulk export of one dataset over a date range, written by the run_export_jobs worker.
+# last_pk and bytes_written mark the last chunk known to be on disk, so a
+# crashed job resumes from there.
+class ExportJob(models.Model):
+	DATASET_CHOICES = (('bookings', 'Bookings'), ('wallet_transactions', 'Wallet transactions'))
+	FORMAT_CHOICES = (('csv', 'CSV'), ('jsonl', 'JSON Lines'))
+	COMPRESSION_CHOICES = (('gzip', 'gzip'), ('zstd', 'Zstandard'))
+	STATUS_CHOICES = (('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed'))
+
+	dataset = models.CharField(max_length=30, choices=DATASET_CHOICES)
+	format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+	compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='gzip')
+	start_date = models.DateField()
+	end_date = models.DateField()
+	requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending', db_index=True)
+	file_name = models.CharField(max_length=255, blank=True)
+	last_pk = models.BigIntegerField(default=0)
+	rows_written = models.BigIntegerField(default=0)
+	bytes_written = models.BigIntegerField(default=0)
+	error = models.TextField(blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['-created_at']
+
+	def clean(self):
+		if self.start_date and self.end_date and self.start_date > self.end_date:
+			raise ValidationError('Start date must not be after end date')
+
+	def __str__(self):
+		return f"{self.get_dataset_display()} {self.start_date} to {self.end_date} ({self.status})"
@@ -0,0 +1,305 @@
+"""
+Fare engine for RideON
+Rate tables are compiled to Decimal constants once per rule version;
+quote() is the single pure entry point used by the booking and promocode
+views. The active rules come from core.pricing_rules once the app is loaded.
+"""
+
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from types import MappingProxyType
+
+# Default rule set, used until a PricingRuleSet is saved.
+# 'multiplier' scales the whole fare; a type is not offered when
+# exclude_between[0] <= distance < exclude_between[1] or distance >= max_distance.
+VEHICLE_TYPES = (
+    {'type': 'Scooter', 'base': 15, 'per_km': 5, 'max_distance': 100},
+    {'type': 'Saver Scooter', 'base': 12, 'per_km': 4, 'multiplier': '0.95', 'max_distance': 100},
+    {'type': 'Bike', 'base': 20, 'per_km': 6},
+    {'type': 'Rickshaw', 'base': 25, 'per_km': 8},
+    {'type': 'Mini', 'base': 50, 'per_km': 12, 'multiplier': '1.05'},
+    {'type': 'SUV', 'base': 120, 'per_km': 20, 'multiplier': '1.05', 'exclude_between': [5, 15]},
+    {'type': 'Auto', 'base': 30, 'per_km': 9},
+)
+
+# Percentage discounts
+PROMOCODES = {
+    'freefirst': 100,
+    'save50': 50,
+    'ride10': 10,
+    'car20': 20,
+}
+# Flat discount promocode, capped at FREERIDE_MAX_DISCOUNT
+FREERIDE_PROMOCODE = 'freeride'
+FREERIDE_MAX_DISCOUNT = Decimal('50')
+
+# Distance assumed when no route has been entered yet
+DEFAULT_DISTANCE = 10.0
+# Distance used when either end of the route cannot be geocoded
+FALLBACK_DISTANCE = 15.0
+
+PEAK_MULTIPLIER = Decimal('1.15')
+NIGHT_MULTIPLIER = Decimal('1.10')
+
+MIN_FARE = 1
+MAX_FARE = 99999
+
+_ONE = Decimal('1')
+_HUNDRED = Decimal('100')
+_SHORT_TRIP_MULTIPLIER = Decimal('1.5')
+_BAND_15_RATE = Decimal('0.95')
+_BAND_50_RATE = Decimal('0.85')
+_LONG_RATE = Decimal('0.75')
+_BAND_15_KM = Decimal('15')
+_BAND_50_KM = Decimal('50')
+_BAND_35_KM = Decimal('35')
+
+VehicleRate = namedtuple('VehicleRate', [
+    'type', 'base', 'per_km',
+    'base_fare', 'per_km_rate', 'short_trip_minimum',
+    'band_15_charge', 'band_50_charge', 'multiplier',
+    'exclude_between', 'max_distance',
+])
+
+PricingRules = namedtuple('PricingRules', [
+    'version', 'rates', 'vehicle_type_names', 'promocodes',
+    'breakpoints', 'eligible_by_band',
+])
+
+
+def _whole_rupees(vehicle, key):
+    value = Decimal(str(vehicle[key]))
+    if not value.is_finite() or value != value.to_integral_value():
+        raise ValueError(f"{vehicle['type']}: {key} must be a whole number of rupees, got {vehicle[key]!r}")
+    return value
+
+
+def _compile_rate(vehicle):
+    # Whole-rupee rates and multipliers in hundredths keep batch pricing's
+    # fixed-point arithmetic exact
+    base_fare = _whole_rupees(vehicle, 'base')
+    per_km_rate = _whole_rupees(vehicle, 'per_km')
+    multiplier = vehicle.get('multiplier')
+    if multiplier is not None:
+        multiplier = Decimal(str(multiplier))
+        if not multiplier.is_finite() or multiplier * _HUNDRED != (multiplier * _HUNDRED).to_integral_value():
+            raise ValueError(f"{vehicle['type']}: multiplier must have at most 2 decimal places, got {vehicle['multiplier']!r}")
+    exclude_between = vehicle.get('exclude_between')
+    return VehicleRate(
+        type=vehicle['type'],
+        base=int(base_fare),
+        per_km=int(per_km_rate),
+        base_fare=base_fare,
+        per_km_rate=per_km_rate,
+        short_trip_minimum=base_fare * _SHORT_TRIP_MULTIPLIER,
+        band_15_charge=per_km_rate * _BAND_15_KM * _BAND_15_RATE,
+        band_50_charge=per_km_rate * _BAND_35_KM * _BAND_50_RATE,
+        multiplier=multiplier,
+        exclude_between=tuple(exclude_between) if exclude_between else None,
+        max_distance=vehicle.get('max_distance'),
+    )
+
+
+def is_offered(rate, distance):
+    if rate.exclude_between and rate.exclude_between[0] <= distance < rate.exclude_between[1]:
+        return False
+    if rate.max_distance is not None and distance >= rate.max_distance:
+        return False
+    return True
+
+
+def compile_rules(vehicle_types, promocodes, version=0):
+    """
+    Build an immutable PricingRules snapshot from rule-store data.
+    Raises ValueError/KeyError/TypeError/ArithmeticError on malformed input.
+    """
+    rates = {}
+    for vehicle in vehicle_types:
+        rate = _compile_rate(vehicle)
+        rates[rate.type] = rate
+    names = tuple(rates)
+    # Every rule boundary starts a new distance band with a fixed set of vehicle types
+    breakpoints = sorted({
+        bound
+        for rate in rates.values()
+        for bound in (rate.exclude_between or ()) + ((rate.max_distance,) if rate.max_distance is not None else ())
+    })
+    representatives = [min(breakpoints, default=0) - 1] + breakpoints
+    eligible_by_band = tuple(
+        tuple(name for name in names if is_offered(rates[name], distance))
+        for distance in representatives
+    )
+    return PricingRules(
+        version=version,
+        rates=MappingProxyType(rates),
+        vehicle_type_names=names,
+        promocodes=MappingProxyType({code.strip().lower(): int(value) for code, value in promocodes.items()}),
+        breakpoints=tuple(breakpoints),
+        eligible_by_band=eligible_by_band,
+    )
+
+
+DEFAULT_RULES = compile_rules(VEHICLE_TYPES, PROMOCODES)
+
+_rules_source = None
+
+
+def set_rules_source(source):
+    """
+    Register a callable returning the active PricingRules (see CoreConfig.ready)
+    """
+    global _rules_source
+    _rules_source = source
+
+
+def current_rules():
+    if _rules_source is None:
+        return DEFAULT_RULES
+    return _rules_source()
+
+
+def eligible_vehicle_types(distance, rules=None):
+    """
+    Vehicle types offered for a trip of the given length
+    """
+    rules = rules or current_rules()
+    if not (distance == distance):
+        return rules.vehicle_type_names
+    return rules.eligible_by_band[bisect_right(rules.breakpoints, distance)]
+
+
+def pricing_slot(hour):
+    """
+    Time-of-day pricing slot: 'peak' 7-10 and 17-20, 'night' 22-5, else 'standard'
+    """
+    if 7 <= hour <= 10 or 17 <= hour <= 20:
+        return 'peak'
+    if 22 <= hour or hour <= 5:
+        return 'night'
+    return 'standard'
+
+
+def slot_ends_at(when):
+    """
+    Start of the first hour after `when` that falls in a different pricing slot
+    """
+    slot = pricing_slot(when.hour)
+    end = when.replace(minute=0, second=0, microsecond=0)
+    for _ in range(24):
+        end += timedelta(hours=1)
+        if pricing_slot(end.hour) != slot:
+            break
+    return end
+
+
+_SLOT_MULTIPLIERS = {'peak': PEAK_MULTIPLIER, 'night': NIGHT_MULTIPLIER, 'standard': None}
+
+
+def time_multiplier(hour):
+    """
+    Surge multiplier for the hour of day, None outside peak and night hours
+    """
+    return _SLOT_MULTIPLIERS[pricing_slot(hour)]
+
+
+def _discount_factor(discount):
+    return _ONE - Decimal(discount) / _HUNDRED
+
+
+def _fare(rate, distance, distance_decimal, hour_multiplier, discount_factor):
+    if distance <= 2:
+        total = max(rate.short_trip_minimum, rate.base_fare + rate.per_km_rate * distance_decimal)
+    elif distance <= 5:
+        total = rate.base_fare + rate.per_km_rate * distance_decimal
+    elif distance <= 15:
+        total = rate.base_fare + (rate.per_km_rate * distance_decimal * _BAND_15_RATE)
+    elif distance <= 50:
+        total = rate.base_fare + rate.band_15_charge + (rate.per_km_rate * (distance_decimal - _BAND_15_KM) * _BAND_50_RATE)
+    else:
+        total = (rate.base_fare + rate.band_15_charge + rate.band_50_charge +
+                 (rate.per_km_rate * (distance_decimal - _BAND_50_KM) * _LONG_RATE))
+    if hour_multiplier is not None:
+        total = total * hour_multiplier
+    if rate.multiplier is not None:
+        total = total * rate.multiplier
+    if discount_factor is not None:
+        total = total * discount_factor
+    total = total.quantize(_ONE, rounding=ROUND_HALF_UP)
+    return max(MIN_FARE, min(int(total), MAX_FARE))
+
+
+def fare(rate, distance, hour_multiplier=None, discount_factor=None):
+    """
+    Fare in whole rupees for one vehicle rate over `distance` km
+    """
+    return _fare(rate, distance, Decimal(str(distance)), hour_multiplier, discount_factor)
+
+
+def quote(distance, when=None, vehicle_types=None, discount=0, rules=None):
+    """
+    Price a trip for each vehicle type.
+
+    `when` defaults to now and selects the time-of-day surcharge;
+    `vehicle_types` defaults to the types offered for the distance;
+    `discount` is a percentage; `rules` defaults to the active rule set.
+    Returns the vehicle dicts rendered by home.html.
+    """
+    rules = rules or current_rules()
+    if when is None:
+        when = datetime.now()
+    if vehicle_types is None:
+        vehicle_types = eligible_vehicle_types(distance, rules)
+    hour_multiplier = time_multiplier(when.hour)
+    discount_factor = _discount_factor(discount) if discount else None
+    distance_decimal = Decimal(str(distance))
+    shown_distance = round(distance, 1)
+    vehicles = []
+    for vehicle_type in vehicle_types:
+        rate = rules.rates[vehicle_type]
+        price = _fare(rate, distance, distance_decimal, hour_multiplier, discount_factor)
+        vehicles.append({
+            'type': rate.type,
+            'price': price,
+            'base_fare': rate.base,
+            'per_km_rate': rate.per_km,
+            'distance': shown_distance,
+            'fare_breakdown': {
+                'base': rate.base,
+                'distance_charge': round((price - rate.base) * 0.8, 1),
+                'surcharges': round((price - rate.base) * 0.2, 1)
+            }
+        })
+    return vehicles
+
+
+def discount_for(promocode, rules=None):
+    """
+    Percentage discount for a promocode, 0 if unknown
+    """
+    rules = rules or current_rules()
+    return rules.promocodes.get((promocode or '').strip().lower(), 0)
+
+
+def apply_discount(price, discount, rounding=ROUND_HALF_UP):
+    """
+    Apply a percentage discount to a Decimal price, rounded to whole rupees
+    """
+    return (price * _discount_factor(discount)).quantize(_ONE, rounding=rounding)
+
+
+def redeem_promocode(price, promocode, rules=None):
+    """
+    Apply a promocode to a Decimal price.
+    Returns (valid, discounted price, discount) where discount is the flat
+    amount for 'freeride' and the percentage otherwise.
+    """
+    if promocode == FREERIDE_PROMOCODE:
+        discount_amount = min(price, FREERIDE_MAX_DISCOUNT)
+        discounted_price = (price - discount_amount).quantize(_ONE, rounding=ROUND_HALF_UP)
+        return True, int(discounted_price), int(discount_amount)
+    discount_percent = discount_for(promocode, rules)
+    if discount_percent > 0:
+        return True, int(apply_discount(price, discount_percent)), int(discount_percent)
+    return False, int(price.quantize(_ONE, rounding=ROUND_HALF_UP)), 0
@@ -0,0 +1,70 @@
+"""
+Versioned pricing-rule store for RideON
+Serves the highest active PricingRuleSet as a compiled core.pricing snapshot,
+re-checking the database at most every PRICING_RULES_POLL_INTERVAL seconds.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from core import pricing
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = getattr(settings, 'PRICING_RULES_POLL_INTERVAL', 30)
+
+
+class PricingRuleStore:
+    """Compiled rule snapshot, swapped atomically when a new version is activated"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._rules = pricing.DEFAULT_RULES
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= self.poll_interval:
+            self.refresh()
+        return self._rules
+
+    def refresh(self):
+        # Only one thread polls; the others keep pricing with the current snapshot
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._rules = self._load()
+        except DatabaseError as e:
+            # Table missing (before migrate) or database unavailable
+            logger.warning('Could not load pricing rules (%s), keeping v%s', e, self._rules.version)
+        finally:
+            self._checked_at = time.monotonic()
+            self._lock.release()
+
+    def _load(self):
+        from core.models import PricingRuleSet
+
+        latest = PricingRuleSet.objects.filter(is_active=True).order_by('-version').first()
+        if latest is None:
+            return pricing.DEFAULT_RULES
+        if latest.version == self._rules.version:
+            return self._rules
+        try:
+            return pricing.compile_rules(latest.vehicle_types, latest.promocodes, latest.version)
+        except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError):
+            logger.exception('Pricing rules v%s are invalid, keeping v%s', latest.version, self._rules.version)
+            return self._rules
+
+    def invalidate(self, **kwargs):
+        """
+        Force a reload on the next quote; connected to PricingRuleSet saves
+        """
+        self._checked_at = None
+
+
+rule_store = PricingRuleStore()
@@ -0,0 +1,88 @@
+"""
+Route quoting for RideON
+Turns a pickup/destination pair into the priced vehicle list shown on the
+home page and returned by the quote API. Quotes are cached per geohash pair,
+pricing slot, discount and rule version until the slot ends.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from django.conf import settings
+
+from core import pricing
+from core.cache_utils import LRUCache
+from core.geo import geohash
+from core.geocoding import geocode_cache, get_coords_many
+from core.routing import route_service
+
+RouteQuote = namedtuple('RouteQuote', ['distance', 'vehicles', 'route'])
+
+_quote_settings = getattr(settings, 'QUOTE_CACHE', {})
+GEOHASH_PRECISION = _quote_settings.get('GEOHASH_PRECISION', 7)
+MAX_TTL = _quote_settings.get('MAX_TTL', 60 * 60)
+# Quotes priced from a straight line because the routing backend failed
+FALLBACK_TTL = _quote_settings.get('FALLBACK_TTL', 60)
+
+quote_cache = LRUCache(max_entries=_quote_settings.get('MAX_ENTRIES', 10000))
+
+
+def _price(distance, when, discount, rules, route=None, vehicle_types=None):
+    return RouteQuote(distance, pricing.quote(distance, when, vehicle_types, discount, rules), route)
+
+
+def quote_route(pickup, destination, discount=0, when=None):
+    """
+    Priced vehicles for a route, or for the default distance when either
+    end is missing. `route` is None unless both ends were geocoded.
+    Quotes for the current time are served from quote_cache when possible;
+    an explicit `when` always reprices.
+    """
+    cacheable = when is None
+    if when is None:
+        when = datetime.now()
+    slot = pricing.pricing_slot(when.hour)
+    rules = pricing.current_rules()
+
+    start = end = None
+    if pickup and destination:
+        start, end = get_coords_many([pickup, destination])
+        if start[0] is None or end[0] is None:
+            key = ('fallback', slot, discount, rules.version)
+        else:
+            key = (geohash(*start, GEOHASH_PRECISION), geohash(*end, GEOHASH_PRECISION), slot, discount, rules.version)
+    else:
+        key = ('default', slot, discount, rules.version)
+
+    if cacheable:
+        result = quote_cache.get(key)
+        if result is not LRUCache.MISSING:
+            return result
+
+    if key[0] == 'default':
+        result = _price(pricing.DEFAULT_DISTANCE, when, discount, rules, vehicle_types=rules.vehicle_type_names)
+    elif key[0] == 'fallback':
+        result = _price(pricing.FALLBACK_DISTANCE, when, discount, rules)
+    else:
+        route = route_service.route(start, end)
+        result = _price(route.distance_km, when, discount, rules, route=route)
+
+    if cacheable:
+        # Never serve a quote past the end of the slot it was priced in
+        ttl = min(MAX_TTL, (pricing.slot_ends_at(when) - when).total_seconds())
+        if result.route is not None and result.route.fallback:
+            # Retry the routing backend soon rather than keep straight-line fares
+            ttl = min(ttl, FALLBACK_TTL)
+        quote_cache.set(key, result, ttl=ttl)
+    return result
+
+
+def cache_stats():
+    """
+    Hit/miss counters for every cache on the quoting path
+    """
+    return {
+        'quotes': quote_cache.stats(),
+        'geocode': geocode_cache.stats(),
+        'routes': route_service.stats(),
+    }
@@ -0,0 +1,91 @@
+"""
+PDF receipts for RideON
+A paid booking's receipt never changes, so it is rendered once and stored
+under the digest of its contents; the digest doubles as the download ETag.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+_receipt_settings = getattr(settings, 'RECEIPTS', {})
+RECEIPT_ROOT = _receipt_settings.get('ROOT', os.path.join(settings.BASE_DIR, 'receipts'))
+# Bump when the layout changes so existing receipts are rendered again
+LAYOUT_VERSION = 1
+
+
+def receipt_lines(booking):
+    return [
+        f"Booking ID: {booking.pk}",
+        f"Vehicle: {booking.vehicle_type}",
+        f"Price: ₹{booking.price}",
+        f"From: {booking.pickup}",
+        f"To: {booking.destination}",
+    ]
+
+
+def receipt_digest(booking):
+    """
+    sha256 of everything printed on the receipt; computed without rendering
+    """
+    content = '\n'.join([f'layout {LAYOUT_VERSION}', *receipt_lines(booking)])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def receipt_path(digest):
+    return os.path.join(RECEIPT_ROOT, digest[:2], f'{digest}.pdf')
+
+
+def render_receipt(booking):
+    buffer = BytesIO()
+    # invariant drops the creation date and random document id, so equal
+    # receipts are byte-for-byte equal
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    p.setFont("Helvetica", 16)
+    p.drawString(100, 800, "RideON Receipt")
+    p.setFont("Helvetica", 12)
+    for i, line in enumerate(receipt_lines(booking)):
+        p.drawString(100, 750 - 20 * i, line)
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def ensure_receipt(booking):
+    """
+    Path and digest of the booking's stored receipt, rendering it first if needed
+    """
+    digest = receipt_digest(booking)
+    path = receipt_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent renders of the same receipt write identical bytes; the
+        # rename makes whichever finishes last visible in one step
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(render_receipt(booking))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return path, digest
+
+
+def prerender_receipt(booking):
+    """
+    Render a newly paid booking's receipt ahead of the first download;
+    a failure here only means the download renders it instead
+    """
+    try:
+        ensure_receipt(booking)
+    except OSError:
+        logger.exception('Could not prerender receipt for booking %s', booking.pk)
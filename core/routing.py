@@ -0,0 +1,100 @@
+"""
+Route distance service for RideON
+Computes road distances through a pluggable backend, cached by rounded
+coordinate pairs so repeat quotes price from one stored distance
+"""
+
+from collections import namedtuple
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.cache_utils import LRUCache
+from core.geo import clamp_trip_distance, trip_distance_km
+
+# fallback is True when the backend failed and the straight line was used instead
+Route = namedtuple('Route', ['distance_km', 'geometry', 'source', 'fallback'], defaults=(False,))
+
+_routing_settings = getattr(settings, 'ROUTING', {})
+BACKEND = _routing_settings.get('BACKEND', 'core.routing.StraightLineBackend')
+CACHE_PRECISION = _routing_settings.get('CACHE_PRECISION', 3)
+CACHE_TTL = _routing_settings.get('CACHE_TTL', 7 * 24 * 60 * 60)
+REQUEST_TIMEOUT = _routing_settings.get('REQUEST_TIMEOUT', 10)
+
+
+class StraightLineBackend:
+    """Offline backend: great-circle distance and a two-point line"""
+
+    name = 'straight_line'
+
+    def route(self, start, end):
+        return Route(trip_distance_km(*start, *end), [list(start), list(end)], self.name)
+
+
+class OpenRouteServiceBackend:
+    """Driving distance from the openrouteservice directions API"""
+
+    name = 'openrouteservice'
+    url = 'https://api.openrouteservice.org/v2/directions/driving-car'
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or _routing_settings.get('OPENROUTESERVICE_API_KEY')
+        self.session = requests.Session()
+
+    def route(self, start, end):
+        resp = self.session.get(
+            self.url,
+            params={
+                'api_key': self.api_key,
+                'start': f'{start[1]},{start[0]}',
+                'end': f'{end[1]},{end[0]}',
+            },
+            timeout=REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        feature = resp.json()['features'][0]
+        distance = feature['properties']['summary']['distance'] / 1000.0
+        geometry = [[lat, lon] for lon, lat in feature['geometry']['coordinates']]
+        return Route(clamp_trip_distance(distance), geometry, self.name)
+
+
+class RouteService:
+    """Caches backend routes keyed by coordinates rounded to CACHE_PRECISION"""
+
+    def __init__(self, backend, fallback=None, precision=CACHE_PRECISION, ttl=CACHE_TTL, max_entries=4096):
+        self.backend = backend
+        self.fallback = fallback or StraightLineBackend()
+        self.precision = precision
+        self.cache = LRUCache(max_entries=max_entries, default_ttl=ttl)
+        self.backend_errors = 0
+
+    def _key(self, start, end):
+        return tuple(round(float(c), self.precision) for c in (*start, *end))
+
+    def route(self, start, end):
+        """
+        Route between two (lat, lon) points; falls back to a straight line
+        when the backend fails, without caching the fallback; such routes
+        have fallback=True
+        """
+        key = self._key(start, end)
+        route = self.cache.get(key)
+        if route is not LRUCache.MISSING:
+            return route
+        try:
+            route = self.backend.route(start, end)
+        except Exception:
+            self.backend_errors += 1
+            return self.fallback.route(start, end)._replace(fallback=True)
+        self.cache.set(key, route)
+        return route
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['backend'] = getattr(self.backend, 'name', type(self.backend).__name__)
+        stats['backend_errors'] = self.backend_errors
+        return stats
+
+
+route_service = RouteService(import_string(BACKEND)(), max_entries=_routing_settings.get('MAX_ENTRIES', 4096))
@@ -0,0 +1,148 @@
+"""
+In-memory spatial index for RideON
+Points are bucketed into a uniform lat/lon grid, so moving a point costs a
+couple of dict operations and k-nearest queries only visit nearby cells.
+"""
+
+import heapq
+import threading
+from math import ceil, cos, floor, radians, sqrt
+
+KM_PER_DEGREE = 111.19
+
+
+class SpatialIndex:
+    """
+    Keys with a (lat, lon) position, updated incrementally.
+    Distances use an equirectangular projection around the query point,
+    which is accurate to well under 1% at dispatch radiuses.
+    """
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._points = {}
+        # Occupied cell range (min row, max row, min col, max col); only ever grows
+        self._bounds = None
+
+    def _cell(self, lat, lon):
+        return floor(lat / self.cell_size), floor(lon / self.cell_size)
+
+    def update(self, key, lat, lon):
+        """
+        Insert a key or move it to a new position
+        """
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard(key, previous[2])
+            self._points[key] = (lat, lon, cell)
+            self._cells.setdefault(cell, {})[key] = (lat, lon)
+            bounds = self._bounds
+            if bounds is None:
+                self._bounds = (cell[0], cell[0], cell[1], cell[1])
+            elif not (bounds[0] <= cell[0] <= bounds[1] and bounds[2] <= cell[1] <= bounds[3]):
+                self._bounds = (
+                    min(bounds[0], cell[0]), max(bounds[1], cell[0]),
+                    min(bounds[2], cell[1]), max(bounds[3], cell[1]),
+                )
+
+    def remove(self, key):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous[2])
+
+    def _discard(self, key, cell):
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def position(self, key):
+        point = self._points.get(key)
+        return point[:2] if point else None
+
+    def clear(self):
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            self._bounds = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def nearest(self, lat, lon, k=1, max_radius_km=None):
+        """
+        Up to k (key, distance_km) pairs closest to the point, nearest first,
+        optionally limited to max_radius_km
+        """
+        if k < 1:
+            return []
+        with self._lock:
+            if not self._points:
+                return []
+            return self._nearest(lat, lon, k, max_radius_km)
+
+    def _nearest(self, lat, lon, k, max_radius_km):
+        row, col = self._cell(lat, lon)
+        lon_scale = KM_PER_DEGREE * max(cos(radians(lat)), 0.01)
+        cell_lat_km = self.cell_size * KM_PER_DEGREE
+        cell_lon_km = self.cell_size * lon_scale
+        cell_km = min(cell_lat_km, cell_lon_km)
+        limit = float('inf') if max_radius_km is None else max_radius_km ** 2
+        # Far enough to reach every occupied cell; near the poles cells are
+        # narrow and the radius alone could mean thousands of empty rings
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        if max_radius_km is not None:
+            max_ring = min(max_ring, ceil(max_radius_km / cell_km))
+
+        # Max-heap of the best k as (-squared km, tiebreak, key)
+        best = []
+        counter = 0
+        for ring in range(max_ring + 1):
+            bound = limit if len(best) < k else -best[0][0]
+            # Every cell in this ring is at least (ring - 1) cells away
+            ring_km = (ring - 1) * cell_km
+            if ring_km > 0 and ring_km * ring_km > bound:
+                break
+            for cell in self._ring(row, col, ring):
+                points = self._cells.get(cell)
+                if not points:
+                    continue
+                dy = max(cell[0] * self.cell_size - lat, 0, lat - (cell[0] + 1) * self.cell_size) * KM_PER_DEGREE
+                dx = max(cell[1] * self.cell_size - lon, 0, lon - (cell[1] + 1) * self.cell_size) * lon_scale
+                if dx * dx + dy * dy > bound:
+                    continue
+                for key, (point_lat, point_lon) in points.items():
+                    dy = (point_lat - lat) * KM_PER_DEGREE
+                    dx = (point_lon - lon) * lon_scale
+                    distance = dx * dx + dy * dy
+                    if distance > bound:
+                        continue
+                    counter += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, counter, key))
+                    else:
+                        heapq.heapreplace(best, (-distance, counter, key))
+                    if len(best) == k:
+                        bound = -best[0][0]
+        return [(key, sqrt(-distance)) for distance, _, key in sorted(best, reverse=True)]
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
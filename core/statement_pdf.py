@@ -0,0 +1,112 @@
+"""
+Monthly statement PDFs for RideON
+Kept free of Django imports so process pool workers can render statements
+without setting Django up.
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+TOP = 800
+BOTTOM = 60
+LINE_HEIGHT = 16
+
+
+class StatementCanvas:
+    """Writes lines top to bottom, starting a new page when one fills up"""
+
+    def __init__(self, path, title):
+        self.canvas = canvas.Canvas(path, pagesize=A4, invariant=1)
+        self.title = title
+        self.page = 0
+        self.new_page()
+
+    def new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.canvas.setFont("Helvetica", 9)
+        self.canvas.drawRightString(545, 820, f"{self.title} - page {self.page}")
+        self.y = TOP
+
+    def line(self, text, font="Helvetica", size=10, indent=50):
+        if self.y < BOTTOM:
+            self.new_page()
+        self.canvas.setFont(font, size)
+        self.canvas.drawString(indent, self.y, text)
+        self.y -= LINE_HEIGHT
+
+    def row(self, text, amount):
+        if self.y < BOTTOM:
+            self.new_page()
+        self.canvas.setFont("Helvetica", 10)
+        self.canvas.drawString(50, self.y, text[:85])
+        self.canvas.drawRightString(545, self.y, f"₹{amount}")
+        self.y -= LINE_HEIGHT
+
+    def gap(self):
+        self.y -= LINE_HEIGHT / 2
+
+    def save(self):
+        self.canvas.save()
+
+
+def render_statement(path, username, period, bookings, transactions):
+    """
+    Write one user's statement to path and return its size in bytes.
+    bookings are (booking_id, date, vehicle, pickup, destination, price) and
+    transactions (date, type, description, amount), all already formatted
+    except the Decimal price and amount.
+    """
+    title = f"RideON statement for {username}, {period}"
+    pdf = StatementCanvas(path, title)
+    pdf.line("RideON Monthly Statement", font="Helvetica-Bold", size=16)
+    pdf.line(f"Rider: {username}")
+    pdf.line(f"Period: {period}")
+    pdf.gap()
+
+    pdf.line(f"Paid trips ({len(bookings)})", font="Helvetica-Bold", size=12)
+    trip_total = Decimal('0')
+    for booking_id, date, vehicle, pickup, destination, price in bookings:
+        pdf.row(f"{date}  #{booking_id}  {vehicle}  {pickup} -> {destination}", price)
+        trip_total += price
+    pdf.line(f"Total paid for trips: ₹{trip_total}", font="Helvetica-Bold")
+    pdf.gap()
+
+    pdf.line(f"Wallet transactions ({len(transactions)})", font="Helvetica-Bold", size=12)
+    credits = debits = Decimal('0')
+    for date, transaction_type, description, amount in transactions:
+        pdf.row(f"{date}  {transaction_type:<6}  {description}", amount)
+        if amount >= 0:
+            credits += amount
+        else:
+            debits -= amount
+    pdf.line(f"Credits: ₹{credits}    Debits: ₹{debits}    Net: ₹{credits - debits}", font="Helvetica-Bold")
+    pdf.save()
+    return os.path.getsize(path)
+
+
+def peak_rss():
+    """
+    Peak resident memory of this process in bytes, or None where unsupported
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def render_in_worker(*args):
+    """
+    render_statement() for process pool workers; also reports the worker's peak memory
+    """
+    return render_statement(*args), peak_rss()
@@ -0,0 +1,131 @@
+"""
+Monthly statements for RideON
+Paid bookings and wallet transactions for the month are streamed from the
+database sorted by user, grouped one user at a time, and rendered to PDF by a
+process pool with a bounded number of statements in flight.
+"""
+
+import calendar
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+from itertools import groupby
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import exports
+from core.models import Booking, WalletTransaction
+from core.statement_pdf import peak_rss, render_in_worker, render_statement
+
+_statement_settings = getattr(settings, 'STATEMENTS', {})
+OUTPUT_ROOT = _statement_settings.get('ROOT', os.path.join(settings.BASE_DIR, 'statements'))
+CHUNK_SIZE = _statement_settings.get('CHUNK_SIZE', 5000)
+
+StatementRun = namedtuple('StatementRun', [
+    'statements', 'bookings', 'transactions', 'bytes_written', 'elapsed', 'peak_rss', 'worker_peak_rss',
+])
+
+
+def _grouped(rows):
+    """
+    (user_id, username, [row, ...]) per user from rows sorted by user_id,
+    each row being (user_id, username, *fields)
+    """
+    for (user_id, username), group in groupby(rows, key=lambda row: row[:2]):
+        yield user_id, username, [row[2:] for row in group]
+
+
+def statement_batches(year, month, chunk_size=CHUNK_SIZE):
+    """
+    Yield (user_id, username, bookings, transactions) for every user with a
+    paid booking or a wallet transaction in the month; only one user's rows
+    are held in memory at a time
+    """
+    start = date(year, month, 1)
+    end = date(year, month, calendar.monthrange(year, month)[1])
+    bookings = _grouped(
+        exports.created_between(Booking.objects.filter(status='Paid'), start, end)
+        .order_by('user_id', 'created_at', 'id')
+        .values_list('user_id', 'user__username', 'id', 'created_at', 'vehicle_type', 'pickup', 'destination', 'price')
+        .iterator(chunk_size=chunk_size)
+    )
+    transactions = _grouped(
+        exports.created_between(WalletTransaction.objects.all(), start, end)
+        .order_by('wallet__user_id', 'created_at', 'id')
+        .values_list('wallet__user_id', 'wallet__user__username', 'created_at', 'transaction_type', 'description', 'amount')
+        .iterator(chunk_size=chunk_size)
+    )
+    # Merge the two user-ordered streams
+    booking_group = next(bookings, None)
+    transaction_group = next(transactions, None)
+    while booking_group or transaction_group:
+        user_ids = [group[0] for group in (booking_group, transaction_group) if group]
+        user_id = min(user_ids)
+        user_bookings, user_transactions = [], []
+        username = None
+        if booking_group and booking_group[0] == user_id:
+            username = booking_group[1]
+            user_bookings = [
+                (pk, f'{timezone.localtime(created_at):%Y-%m-%d}', vehicle, pickup, destination, price)
+                for pk, created_at, vehicle, pickup, destination, price in booking_group[2]
+            ]
+            booking_group = next(bookings, None)
+        if transaction_group and transaction_group[0] == user_id:
+            username = transaction_group[1]
+            user_transactions = [
+                (f'{timezone.localtime(created_at):%Y-%m-%d}', transaction_type, description, amount)
+                for created_at, transaction_type, description, amount in transaction_group[2]
+            ]
+            transaction_group = next(transactions, None)
+        yield user_id, username, user_bookings, user_transactions
+
+
+def generate_statements(year, month, output_dir=None, workers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Render every statement for the month into output_dir/YYYY-MM/.
+    workers=1 renders in this process; otherwise a pool of `workers`
+    processes (default: one per core) is used.
+    `progress(statements)` is called as statements finish.
+    Peak memory is reported in bytes for this process and the largest worker.
+    """
+    output_dir = os.path.join(output_dir or OUTPUT_ROOT, f'{year}-{month:02d}')
+    os.makedirs(output_dir, exist_ok=True)
+    period = f'{calendar.month_name[month]} {year}'
+    workers = workers or os.cpu_count() or 1
+    counts = {'statements': 0, 'bookings': 0, 'transactions': 0, 'bytes_written': 0, 'worker_peak_rss': None}
+    start = time.perf_counter()
+
+    def jobs():
+        for user_id, username, bookings, transactions in statement_batches(year, month, chunk_size):
+            counts['bookings'] += len(bookings)
+            counts['transactions'] += len(transactions)
+            path = os.path.join(output_dir, f'statement_{year}-{month:02d}_{user_id}.pdf')
+            yield path, username, period, bookings, transactions
+
+    def finished(size, worker_rss=None):
+        counts['statements'] += 1
+        counts['bytes_written'] += size
+        if worker_rss is not None:
+            counts['worker_peak_rss'] = max(counts['worker_peak_rss'] or 0, worker_rss)
+        if progress:
+            progress(counts['statements'])
+
+    if workers == 1:
+        for job in jobs():
+            finished(render_statement(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for job in jobs():
+                # Bound the queue so memory does not grow with the number of riders
+                if len(pending) >= workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(*future.result())
+                pending.add(pool.submit(render_in_worker, *job))
+            for future in wait(pending).done:
+                finished(*future.result())
+    return StatementRun(elapsed=time.perf_counter() - start, peak_rss=peak_rss(), **counts)
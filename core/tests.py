@@ -1,10 +1,1302 @@
-from django.test import TestCase, override_settings
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from decimal import Decimal
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+import json
+import math
+import os
+import random
 from django.conf import settings
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.utils import timezone
+import gzip
+import importlib
+import shutil
+import tempfile
+import threading
+import time
 
-from core.models import Booking, Wallet
+from core.models import ACTIVE_BOOKING_STATUSES, Booking, Driver, ExportJob, GazetteerPlace, GeocodeCacheEntry, PricingRuleSet, Wallet, WalletSnapshot, WalletTransaction
+from core import batch_pricing, doc_images, documentation, documentation_cache, documentation_export, export_jobs, geo, ledger, pricing, receipts, statements
+from core.cache_utils import LRUCache
+from core.dispatch import DispatchIndex, Dispatcher
+from core.gazetteer import GazetteerIndex
+from core.geocoding import GeocodeCache, get_coords_many
+from core.location_ingest import LocationBuffer
+from core.spatial import KM_PER_DEGREE, SpatialIndex
+from core.pricing_rules import PricingRuleStore, rule_store
+from core.quotes import quote_cache, quote_route
+from core.routing import Route, RouteService
+from core.management.commands.benchmark_pricing import legacy_fare, rules_with_vehicle_count
+from core.views import booking_history_page
 
 
+# Prices at a 10% discount for every built-in vehicle type, in
+# pricing.VEHICLE_TYPES order, captured from the original home_view code
+GOLDEN_FARES = {
+	12: {
+		0.5: [20, 15, 27, 34, 71, 170, 41],
+		2: [23, 17, 29, 37, 71, 170, 43],
+		3.7: [30, 23, 38, 49, 89, 183, 57],
+		5: [36, 27, 45, 59, 104, 208, 68],
+		9.99: [56, 43, 69, 91, 155, 293, 104],
+		15: [78, 59, 95, 125, 209, 383, 142],
+		27.3: [125, 95, 151, 200, 327, 580, 227],
+		50: [212, 161, 256, 339, 546, 945, 383],
+		100: [380, 289, 458, 609, 971, 1654, 687],
+		250: [887, 674, 1066, 1419, 2247, 3780, 1598],
+	},
+	8: {
+		0.5: [23, 18, 31, 39, 82, 196, 47],
+		5: [41, 31, 52, 67, 120, 239, 78],
+		27.3: [143, 109, 174, 230, 377, 667, 261],
+		250: [1019, 775, 1225, 1632, 2584, 4347, 1838],
+	},
+	23: {
+		0.5: [22, 17, 30, 37, 78, 187, 45],
+		5: [40, 30, 50, 64, 114, 229, 74],
+		27.3: [137, 104, 167, 220, 360, 638, 250],
+		250: [975, 741, 1172, 1561, 2472, 4158, 1758],
+	},
+}
 
+
+class FareGoldenTests(SimpleTestCase):
+	"""Pricing must stay identical to the original fare code while the engine is optimized"""
+
+	rules = pricing.DEFAULT_RULES
+
+	def prices(self, distance, hour, discount=10):
+		when = datetime(2024, 1, 1, hour)
+		return [v['price'] for v in pricing.quote(distance, when, self.rules.vehicle_type_names, discount, self.rules)]
+
+	def test_golden_fares(self):
+		for hour, fares in GOLDEN_FARES.items():
+			for distance, expected in fares.items():
+				with self.subTest(hour=hour, distance=distance):
+					self.assertEqual(self.prices(distance, hour), expected)
+
+	def test_matches_legacy_fare(self):
+		with patch('core.management.commands.benchmark_pricing.datetime') as legacy_datetime:
+			for hour in (3, 8, 12, 19, 22):
+				legacy_datetime.now.return_value = datetime(2024, 1, 1, hour)
+				for i in range(300):
+					distance = round(0.1 + i * 0.83, 2)
+					for discount in (0, 10, 35, 100):
+						expected = [legacy_fare(v, distance, discount) for v in pricing.VEHICLE_TYPES]
+						self.assertEqual(self.prices(distance, hour, discount), expected, (hour, distance, discount))
+
+	def test_vehicle_filtering(self):
+		names = lambda distance: list(pricing.eligible_vehicle_types(distance, self.rules))
+		self.assertEqual(names(4.99), ['Scooter', 'Saver Scooter', 'Bike', 'Rickshaw', 'Mini', 'SUV', 'Auto'])
+		self.assertEqual(names(5), ['Scooter', 'Saver Scooter', 'Bike', 'Rickshaw', 'Mini', 'Auto'])
+		self.assertEqual(names(15), ['Scooter', 'Saver Scooter', 'Bike', 'Rickshaw', 'Mini', 'SUV', 'Auto'])
+		self.assertEqual(names(100), ['Bike', 'Rickshaw', 'Mini', 'SUV', 'Auto'])
+
+	def test_haversine(self):
+		self.assertEqual(geo.trip_distance_km(28.6139, 77.2090, 19.0760, 72.8777), 1148.09)
+		self.assertEqual(geo.trip_distance_km(12.9716, 77.5946, 13.0827, 80.2707), 290.17)
+		self.assertEqual(geo.trip_distance_km(12.9716, 77.5946, 12.9716, 77.5946), 0.5)
+
+	def test_promocodes(self):
+		redeem = lambda price, code: pricing.redeem_promocode(Decimal(price), code, self.rules)
+		self.assertEqual(redeem(199, 'SAVE50'), (True, 100, 50))
+		self.assertEqual(redeem(75, 'ride10'), (True, 68, 10))
+		self.assertEqual(redeem(200, 'freeride'), (True, 150, 50))
+		self.assertEqual(redeem(40, 'freeride'), (True, 0, 40))
+		self.assertEqual(redeem(199, 'nope'), (False, 199, 0))
+
+	def test_padded_rules_keep_prices(self):
+		rules = rules_with_vehicle_count(15)
+		self.assertEqual(len(rules.vehicle_type_names), 15)
+		when = datetime(2024, 1, 1, 12)
+		prices = [v['price'] for v in pricing.quote(27.3, when, rules.vehicle_type_names, 10, rules)]
+		self.assertEqual(prices[:7], GOLDEN_FARES[12][27.3])
+		self.assertEqual(prices[7:14], GOLDEN_FARES[12][27.3])
+
+
+class BenchmarkPricingCommandTests(TestCase):
+	def test_json_report(self):
+		out = StringIO()
+		call_command('benchmark_pricing', iterations=50, vehicle_counts='1,7,20', json=True, stdout=out)
+		report = json.loads(out.getvalue())
+		quotes = [r['vehicle_types'] for r in report['results'] if r['name'] == 'quote']
+		self.assertEqual(quotes, [1, 7, 20])
+		self.assertEqual(
+			{r['name'] for r in report['results']},
+			{'legacy_quote', 'engine_quote', 'quote', 'haversine', 'vehicle_filter', 'promocode'},
+		)
+		self.assertTrue(all(r['ops_per_second'] > 0 for r in report['results']))
+
+
+class BatchPricingTests(TestCase):
+	def scalar(self, distance, when, discount):
+		return {v['type']: v['price'] for v in pricing.quote(distance, when, discount=discount)}
+
+	def test_matches_scalar_quote(self):
+		rng = random.Random(5)
+		distances = [2.004, 14.995, 0.1, 2, 5, 15, 50, 2000] + [
+			round(rng.uniform(0, 300), rng.choice((1, 2, 3, 6))) for _ in range(400)
+		]
+		for hour in (3, 8, 12, 19, 23):
+			when = datetime(2024, 1, 1, hour)
+			for discount in (0, 10, 35, 100, 12.5):
+				batch = batch_pricing.quote_batch(distances, when, discount)
+				for distance, row in zip(distances, batch):
+					self.assertEqual(row['prices'], self.scalar(distance, when, discount), (hour, discount, distance))
+
+	def test_distances_clamped_like_trip_distance_km(self):
+		rng = random.Random(7)
+		# Raw distances of 0.0996 km and 2000.004 km round past the clamp thresholds
+		routes = [(12.0, 77.0, 12.0 + math.degrees(km / geo.EARTH_RADIUS_KM), 77.0) for km in (0.0996, 2000.004, 0.3)]
+		routes += [(rng.uniform(-60, 60), rng.uniform(-180, 180), rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(200)]
+		routes += [(12.9, 77.5, 12.9 + rng.uniform(-0.2, 0.2), 77.5 + rng.uniform(-0.2, 0.2)) for _ in range(200)]
+		batch = list(batch_pricing.trip_distances_km(*zip(*routes)))
+		self.assertEqual(batch[:3], [0.5, 50.0, 0.3])
+		for route, distance in zip(routes, batch):
+			self.assertAlmostEqual(distance, geo.trip_distance_km(*route), delta=0.01, msg=route)
+
+
+class PricingRuleTests(TestCase):
+	def vehicles(self, **overrides):
+		return [dict(pricing.VEHICLE_TYPES[0], **overrides)]
+
+	def test_compile_rules_rejects_inexact_values(self):
+		for overrides in ({'base': 15.5}, {'per_km': '4.25'}, {'multiplier': '1.125'}, {'multiplier': 'NaN'}, {'base': 'Infinity'}):
+			with self.subTest(overrides=overrides), self.assertRaises(ValueError):
+				pricing.compile_rules(self.vehicles(**overrides), {})
+		rules = pricing.compile_rules(self.vehicles(base=15.0, multiplier=1.1), {' Ride5 ': '5'}, version=3)
+		rate = rules.rates['Scooter']
+		self.assertEqual((rules.version, rate.base, rate.per_km, rate.multiplier), (3, 15, 5, Decimal('1.1')))
+		self.assertEqual(dict(rules.promocodes), {'ride5': 5})
+		with self.assertRaises(ValidationError):
+			PricingRuleSet(version=1, vehicle_types=self.vehicles(multiplier='1.125'), promocodes={}).full_clean()
+
+	def test_store_serves_latest_valid_active_version(self):
+		store = PricingRuleStore(poll_interval=3600)
+		self.assertIs(store.current(), pricing.DEFAULT_RULES)
+
+		PricingRuleSet.objects.create(version=1, vehicle_types=self.vehicles(), promocodes={'one': 1})
+		# Still cached until the poll interval passes or the store is invalidated
+		self.assertIs(store.current(), pricing.DEFAULT_RULES)
+		store.invalidate()
+		first = store.current()
+		self.assertEqual((first.version, first.vehicle_type_names), (1, ('Scooter',)))
+
+		PricingRuleSet.objects.create(version=2, vehicle_types=self.vehicles(), promocodes={}, is_active=False)
+		store.invalidate()
+		self.assertIs(store.current(), first)
+
+		PricingRuleSet.objects.create(version=3, vehicle_types=self.vehicles(multiplier='1.125'), promocodes={})
+		store.invalidate()
+		with self.assertLogs('core.pricing_rules', 'ERROR'):
+			self.assertIs(store.current(), first)
+
+		PricingRuleSet.objects.create(version=4, vehicle_types=self.vehicles(base=30), promocodes={})
+		store.invalidate()
+		self.assertEqual(store.current().rates['Scooter'].base, 30)
+		PricingRuleSet.objects.filter(version=4).update(is_active=False)
+		PricingRuleSet.objects.filter(version=3).delete()
+		store.invalidate()
+		self.assertEqual(store.current().version, 1)
+
+
+GEONAMES_ROWS = [
+	# id, name, ascii name, alternate names, lat, lon, ..., country code (8), ..., population (14)
+	['1', 'Bengaluru', 'Bengaluru', 'Bangalore,Bengalooru,BENGALURU', '12.97194', '77.59369', 'P', 'PPLA', 'IN', '', '', '', '', '', '8443675'],
+	['2', 'Andheri', 'Andheri', '', '19.11916', '72.84731', 'P', 'PPL', 'IN', '', '', '', '', '', '1500000'],
+	['3', 'Tiny Village', 'Tiny Village', '', '20.0', '75.0', 'P', 'PPL', 'IN', '', '', '', '', '', '12'],
+]
+
+
+class GazetteerTests(TestCase):
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.tmp)
+		self.index = GazetteerIndex()
+		patcher = patch('core.management.commands.load_gazetteer.gazetteer', self.index)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def load(self, name, content, *args):
+		path = os.path.join(self.tmp, name)
+		with (gzip.open(path, 'wt', encoding='utf-8') if name.endswith('.gz') else open(path, 'w', encoding='utf-8')) as f:
+			f.write(content)
+		out = StringIO()
+		call_command('load_gazetteer', path, *args, stdout=out)
+		return out.getvalue()
+
+	def test_load_geonames_dump(self):
+		dump = ''.join('\t'.join(row) + '\n' for row in GEONAMES_ROWS)
+		self.assertIn('Loaded 4 gazetteer entries', self.load('IN.txt.gz', dump, '--alternate-names', '--min-population', '1000'))
+		self.assertEqual(
+			sorted(GazetteerPlace.objects.values_list('normalized_name', 'latitude')),
+			[('andheri', 19.1192), ('bangalore', 12.9719), ('bengalooru', 12.9719), ('bengaluru', 12.9719)],
+		)
+		self.assertEqual(self.index.lookup('Andheri'), (19.1192, 72.8473))
+
+	def test_load_csv_skips_duplicates(self):
+		csv_text = 'Name,Lat,Lng,Population\nPowai,19.11760,72.90600,50000\nPOWAI!,19.11761,72.90602,50000\nbad,north,72.9,1\n'
+		self.assertIn('Loaded 1 gazetteer entries', self.load('places.csv', csv_text))
+		# Loading the same file again adds nothing; --replace starts over
+		self.assertIn('Loaded 0 gazetteer entries', self.load('places.csv', csv_text))
+		self.assertIn('Loaded 1 gazetteer entries', self.load('places.csv', csv_text, '--replace'))
+		self.assertEqual(GazetteerPlace.objects.get().normalized_name, 'powai')
+
+	def test_index_lookups(self):
+		GazetteerPlace.objects.bulk_create([
+			GazetteerPlace(name='Andheri West', normalized_name='andheri west', population=700000, latitude=19.13, longitude=72.82),
+			GazetteerPlace(name='Andheri East', normalized_name='andheri east', population=800000, latitude=19.11, longitude=72.86),
+			GazetteerPlace(name='Koramangala', normalized_name='koramangala', population=100000, latitude=12.93, longitude=77.62),
+		])
+		self.assertEqual(self.index.lookup('ANDHERI  west'), (19.13, 72.82))
+		self.assertEqual(self.index.lookup('Mumbai'), (19.0760, 72.8777))
+		self.assertEqual([name for name, _, _ in self.index.search('andheri')], ['andheri east', 'andheri west'])
+		# The longest matching phrase wins over a more populous single word
+		self.assertEqual(self.index.contains('Flat 4, Andheri West, Mumbai'), (19.13, 72.82))
+		self.assertEqual(self.index.contains('Near Koramangala bus stop'), (12.93, 77.62))
+		self.assertEqual(self.index.fuzzy('Koramangla'), (12.93, 77.62))
+		self.assertIsNone(self.index.fuzzy('Zanzibar'))
+		# The trigram index is part of the snapshot, built with it
+		self.assertIn('kor', self.index._snapshot[2])
+
+
+class GazetteerRefreshTests(TransactionTestCase):
+	def test_changes_are_picked_up_by_a_background_rebuild(self):
+		index = GazetteerIndex()
+		self.assertIsNone(index.lookup('Powai'))
+		snapshot = index._snapshot
+		GazetteerPlace.objects.create(name='Powai', normalized_name='powai', latitude=19.1176, longitude=72.906)
+		index._checked_at = 0.0
+		index.refresh()
+		rebuild = index._rebuilding
+		self.assertIsNotNone(rebuild)
+		rebuild.join(10)
+		self.assertIsNot(index._snapshot, snapshot)
+		self.assertEqual(index.lookup('Powai'), (19.1176, 72.906))
+		self.assertEqual(index.fuzzy('Powaii'), (19.1176, 72.906))
+
+
+class LRUCacheTests(SimpleTestCase):
+	def test_evicts_least_recently_used_and_expires_entries(self):
+		cache = LRUCache(max_entries=2, default_ttl=60)
+		with patch('core.cache_utils.time.monotonic', return_value=1000.0) as monotonic:
+			cache.set('a', 1)
+			cache.set('b', None)
+			self.assertEqual(cache.get('a'), 1)
+			cache.set('c', 3)
+			# 'b' was least recently used; a cached None is not a miss
+			self.assertIs(cache.get('b'), LRUCache.MISSING)
+			cache.set('b', None, ttl=5)
+			self.assertIsNone(cache.get('b'))
+			monotonic.return_value = 1005.0
+			self.assertIs(cache.get('b'), LRUCache.MISSING)
+			self.assertEqual(cache.get('c'), 3)
+		self.assertEqual(cache.stats(), {'entries': 1, 'max_entries': 2, 'hits': 3, 'misses': 2, 'evictions': 2, 'hit_rate': 0.6})
+		cache.clear()
+		self.assertEqual((len(cache), cache.stats()['hits']), (0, 0))
+
+
+class GeocodeCacheTests(TestCase):
+	def test_database_backs_the_memory_cache(self):
+		cache = GeocodeCache(max_entries=10)
+		cache.set('andheri', (19.1, 72.8))
+		cache.set('nowhere', None)
+		self.assertEqual(GeocodeCacheEntry.objects.get(query='nowhere').found, False)
+
+		# Another process: only the database is shared
+		other = GeocodeCache(max_entries=10)
+		self.assertEqual(other.get('andheri'), (19.1, 72.8))
+		self.assertIsNone(other.get('nowhere'))
+		self.assertIs(other.get('powai'), LRUCache.MISSING)
+		self.assertEqual(other.get('andheri'), (19.1, 72.8))
+		stats = other.stats()
+		self.assertEqual((stats['db_hits'], stats['db_misses'], stats['hits']), (2, 1, 1))
+
+		GeocodeCacheEntry.objects.filter(query='andheri').update(expires_at=timezone.now() - timedelta(seconds=1))
+		self.assertIs(GeocodeCache().get('andheri'), LRUCache.MISSING)
+		# The stale row is deleted by the read that found it expired
+		self.assertFalse(GeocodeCacheEntry.objects.filter(query='andheri').exists())
+
+	def test_expired_rows_are_purged_periodically(self):
+		cache = GeocodeCache(max_entries=10, purge_every=3)
+		cache.set('andheri', (19.1, 72.8))
+		cache.set('nowhere', None)
+		GeocodeCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+		self.assertEqual(GeocodeCacheEntry.objects.count(), 2)
+
+		# The third write purges the expired rows, which are never read again
+		cache.set('powai', (19.12, 72.91))
+		self.assertEqual(list(GeocodeCacheEntry.objects.values_list('query', flat=True)), ['powai'])
+		self.assertEqual(cache.purge_expired(), 0)
+
+
+class GetCoordsManyTests(TransactionTestCase):
+	def setUp(self):
+		patcher = patch('core.geocoding.geocode_cache', GeocodeCache(max_entries=10))
+		self.cache = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_spellings_of_one_place_share_a_lookup(self):
+		with patch('core.geocoding._nominatim_lookup', return_value=(19.12, 72.91)) as lookup:
+			coords = get_coords_many(['Powai Lake', '  powai   LAKE', '', 'Mumbai'])
+		self.assertEqual(coords, [(19.12, 72.91), (19.12, 72.91), (None, None), (19.076, 72.8777)])
+		self.assertEqual(lookup.call_count, 1)
+		self.assertEqual(self.cache.get('powai lake'), (19.12, 72.91))
+
+	def test_lookups_past_the_deadline_are_cached_when_they_finish(self):
+		release = threading.Event()
+
+		def slow_lookup(place, timeout):
+			release.wait(10)
+			return (19.12, 72.91)
+
+		with patch('core.geocoding._nominatim_lookup', side_effect=slow_lookup):
+			self.assertEqual(get_coords_many(['Powai Lake'], deadline=0.05), [(None, None)])
+			self.assertIs(self.cache.memory.get('powai lake'), LRUCache.MISSING)
+			release.set()
+			# The worker fills the memory cache before writing the database row
+			stored = GeocodeCacheEntry.objects.filter(query='powai lake', found=True)
+			for _ in range(100):
+				if stored.exists():
+					break
+				time.sleep(0.05)
+		self.assertTrue(stored.exists())
+		self.assertEqual(self.cache.get('powai lake'), (19.12, 72.91))
+
+
+class QuoteCacheTests(TestCase):
+	def setUp(self):
+		quote_cache.clear()
+		self.addCleanup(quote_cache.clear)
+		self.addCleanup(rule_store.invalidate)
+		self.clock = 1000.0
+		self.now = datetime(2024, 1, 1, 12, 0)
+		clock = patch('core.quotes.datetime')
+		clock.start().now.side_effect = lambda: self.now
+		self.addCleanup(clock.stop)
+		for patcher in (
+			patch('core.cache_utils.time.monotonic', side_effect=lambda: self.clock),
+			patch('core.quotes.get_coords_many', return_value=[(19.1176, 72.906), (19.1197, 72.8464)]),
+			patch('core.quotes.route_service.route', return_value=Route(7.5, None, 'haversine')),
+		):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def advance(self, minutes):
+		self.now += timedelta(minutes=minutes)
+		self.clock += minutes * 60
+
+	def test_cached_within_the_pricing_slot(self):
+		first = quote_route('Powai', 'Andheri')
+		self.advance(30)
+		self.assertIs(quote_route('Powai', 'Andheri'), first)
+		self.assertIsNot(quote_route('Powai', 'Andheri', discount=10), first)
+		self.assertEqual(quote_cache.stats()['hits'], 1)
+		self.assertEqual(first.distance, 7.5)
+
+	def test_expires_at_the_slot_boundary(self):
+		self.now = datetime(2024, 1, 1, 16, 50)
+		standard = quote_route('', '')
+		self.advance(5)
+		self.assertIs(quote_route('', ''), standard)
+		# 17:00 starts the evening peak; the standard price must not be served
+		self.advance(10)
+		peak = quote_route('', '')
+		self.assertIsNot(peak, standard)
+		self.assertGreater(peak.vehicles[0]['price'], standard.vehicles[0]['price'])
+		self.assertIs(quote_cache.get(('default', 'standard', 0, pricing.current_rules().version)), LRUCache.MISSING)
+
+	def test_new_rule_version_reprices(self):
+		first = quote_route('Powai', 'Andheri')
+		vehicles = [dict(vehicle, base=vehicle['base'] * 2) for vehicle in pricing.VEHICLE_TYPES]
+		PricingRuleSet.objects.create(version=7, vehicle_types=vehicles, promocodes={})
+		second = quote_route('Powai', 'Andheri')
+		self.assertIsNot(second, first)
+		self.assertGreater(second.vehicles[0]['price'], first.vehicles[0]['price'])
+		self.assertIs(quote_route('Powai', 'Andheri'), second)
+
+	def test_straight_line_fallback_is_cached_briefly(self):
+		backend = Mock(side_effect=[RuntimeError('routing down'), Route(9.0, None, 'test')])
+		service = RouteService(Mock(route=backend))
+		with patch('core.quotes.route_service', service):
+			fallback = quote_route('Powai', 'Andheri')
+			self.assertTrue(fallback.route.fallback)
+			self.advance(0.5)
+			self.assertIs(quote_route('Powai', 'Andheri'), fallback)
+			# Once the fallback quote expires the recovered backend prices the trip
+			self.advance(1)
+			recovered = quote_route('Powai', 'Andheri')
+		self.assertEqual((recovered.distance, recovered.route.fallback), (9.0, False))
+		self.assertEqual((backend.call_count, service.backend_errors), (2, 1))
+
+	def test_stats_endpoint_is_admin_only(self):
+		quote_route('', '')
+		quote_route('', '')
+		client = Client()
+		client.force_login(User.objects.create(username='rider'))
+		self.assertEqual(client.get(reverse('quote_stats')).status_code, 403)
+		client.force_login(User.objects.create(username='ops', is_staff=True))
+		caches = client.get(reverse('quote_stats')).json()['caches']
+		self.assertEqual(set(caches), {'quotes', 'geocode', 'routes'})
+		self.assertEqual((caches['quotes']['hits'], caches['quotes']['misses']), (1, 1))
+
+
+class DispatchTests(TestCase):
+	def setUp(self):
+		self.dispatcher = Dispatcher(DispatchIndex(max_radius_km=25), resync_interval=3600)
+
+	def driver(self, name, lat=None, lon=None, vehicle_type='Mini', **fields):
+		return Driver.objects.create(
+			name=name, phone='+91-9000000000', vehicle_type=vehicle_type, vehicle_number=name,
+			latitude=lat, longitude=lon, **fields,
+		)
+
+	def test_index_prefers_nearest_then_longest_waiting_unlocated(self):
+		index = DispatchIndex(max_radius_km=25)
+		index.add(1, 'Mini', 12.97, 77.59)
+		index.add(2, 'Mini', 12.99, 77.60)
+		index.add(3, 'Mini')
+		index.add(4, 'Mini')
+		index.add(5, 'SUV', 12.97, 77.59)
+		self.assertEqual(index.nearest('Mini', 12.991, 77.601), 2)
+		index.move(2, 13.5, 77.6)
+		self.assertEqual(index.nearest('Mini', 12.991, 77.601), 1)
+		# Nothing located within 25 km of Mumbai
+		self.assertEqual(index.nearest('Mini', 19.07, 72.87), 3)
+		index.add(1, 'SUV', 12.97, 77.59)
+		index.remove(3)
+		self.assertEqual([index.nearest('Mini', 12.97, 77.59), index.nearest('Mini')], [4, 4])
+		self.assertEqual(len(index), 4)
+		self.assertFalse(index.move(99, 12.0, 77.0))
+		self.assertIsNone(index.nearest('Auto', 12.97, 77.59))
+
+	def test_assign_claims_nearest_driver_once(self):
+		near = self.driver('near', 12.97, 77.59)
+		far = self.driver('far', 13.05, 77.65)
+		self.driver('busy', 12.97, 77.59, is_available=False)
+		self.dispatcher.sync(force=True)
+		first = self.dispatcher.assign('Mini', 12.971, 77.591)
+		second = self.dispatcher.assign('Mini', 12.971, 77.591)
+		self.assertEqual((first.pk, second.pk), (near.pk, far.pk))
+		self.assertFalse(first.is_available)
+		self.assertIsNone(self.dispatcher.assign('Mini', 12.971, 77.591))
+		self.assertEqual(Driver.objects.filter(is_available=False).count(), 3)
+
+	def test_stale_index_entry_loses_the_claim(self):
+		taken = self.driver('taken', 12.97, 77.59)
+		free = self.driver('free', 12.98, 77.60)
+		self.dispatcher.sync(force=True)
+		# Claimed by another process without a signal reaching this index
+		Driver.objects.filter(pk=taken.pk).update(is_available=False)
+		self.assertEqual(self.dispatcher.assign('Mini', 12.97, 77.59).pk, free.pk)
+		self.assertIsNone(self.dispatcher.assign('Mini', 12.97, 77.59))
+
+	def test_release_and_sync(self):
+		driver = self.driver('driver', 12.97, 77.59)
+		self.dispatcher.sync(force=True)
+		self.assertEqual(self.dispatcher.assign('Mini', 12.97, 77.59), driver)
+		self.dispatcher.release(driver, 19.07, 72.87)
+		driver.refresh_from_db()
+		self.assertEqual((driver.is_available, driver.latitude, driver.longitude), (True, 19.07, 72.87))
+		self.assertEqual(self.dispatcher.nearby('Mini', 19.07, 72.87), [(driver.pk, 0.0)])
+
+		Driver.objects.bulk_create([Driver(name='bulk', phone='1', vehicle_type='Auto', vehicle_number='AU-1')])
+		self.assertIsNone(self.dispatcher.index.nearest('Auto'))
+		self.dispatcher.sync(force=True)
+		self.assertEqual(self.dispatcher.assign('Auto').name, 'bulk')
+
+	def test_migration_marks_drivers_on_trips_unavailable(self):
+		user = User.objects.create(username='rider')
+		on_trip, finished, idle = self.driver('on trip'), self.driver('finished'), self.driver('idle')
+		Booking.objects.create(user=user, vehicle_type='Mini', price=100, pickup='A', destination='B', status='In Progress', driver=on_trip)
+		Booking.objects.create(user=user, vehicle_type='Mini', price=100, pickup='A', destination='B', status='Paid', driver=finished)
+		migration = importlib.import_module('core.migrations.0014_mark_busy_drivers_unavailable')
+		migration.mark_busy_drivers_unavailable(apps, None)
+		self.assertEqual(set(Driver.objects.filter(is_available=True)), {finished, idle})
+
+
+class SpatialIndexTests(SimpleTestCase):
+	def distance(self, point, lat, lon):
+		lon_scale = KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)
+		return math.hypot((point[0] - lat) * KM_PER_DEGREE, (point[1] - lon) * lon_scale)
+
+	def assertMatchesBruteForce(self, index, points, lat, lon, k, max_radius_km=None):
+		found = index.nearest(lat, lon, k, max_radius_km)
+		expected = sorted(self.distance(point, lat, lon) for point in points.values())
+		expected = [km for km in expected if max_radius_km is None or km <= max_radius_km][:k]
+		self.assertEqual(len(found), len(expected))
+		for (key, km), expected_km in zip(found, expected):
+			# Equally distant points may come back in either order
+			self.assertAlmostEqual(km, expected_km, places=9)
+			self.assertAlmostEqual(km, self.distance(points[key], lat, lon), places=9)
+
+	def test_nearest_matches_brute_force(self):
+		rng = random.Random(12)
+		for center_lat, span in ((12.97, 0.5), (78.2, 1.0), (-89.5, 0.8), (0.0, 0.05)):
+			index = SpatialIndex(cell_size=0.01)
+			points = {}
+			for key in range(rng.choice((5, 300))):
+				points[key] = (center_lat + rng.uniform(-span, span) / 4, 77.6 + rng.uniform(-span, span))
+				index.update(key, *points[key])
+			for _ in range(15):
+				lat, lon = center_lat + rng.uniform(-span, span) / 4, 77.6 + rng.uniform(-span, span)
+				for k, radius in ((1, None), (7, None), (len(points) + 5, None), (10, 5), (len(points) + 5, 20)):
+					with self.subTest(lat=lat, lon=lon, k=k, radius=radius):
+						self.assertMatchesBruteForce(index, points, lat, lon, k, radius)
+
+	def test_moves_between_cells_and_removals(self):
+		rng = random.Random(3)
+		index = SpatialIndex(cell_size=0.01)
+		points = {}
+		for step in range(2000):
+			key = rng.randrange(50)
+			if rng.random() < 0.2:
+				index.remove(key)
+				points.pop(key, None)
+			else:
+				points[key] = (12.9 + rng.uniform(0, 0.2), 77.5 + rng.uniform(0, 0.2))
+				index.update(key, *points[key])
+			if step % 100 == 0:
+				lat, lon = 12.9 + rng.uniform(0, 0.2), 77.5 + rng.uniform(0, 0.2)
+				self.assertMatchesBruteForce(index, points, lat, lon, 5)
+		self.assertEqual(len(index), len(points))
+		self.assertEqual({key: index.position(key) for key in points}, points)
+		occupied = sum(len(bucket) for bucket in index._cells.values())
+		self.assertEqual(occupied, len(points))
+		self.assertEqual(index.nearest(12.9, 77.5, 0), [])
+
+
+class LocationIngestTests(TestCase):
+	def setUp(self):
+		self.buffer = LocationBuffer(flush_interval=3600, background=False)
+		self.driver = Driver.objects.create(name='pinger', phone='1', vehicle_type='Mini', vehicle_number='MI-1', latitude=12.9, longitude=77.5)
+
+	def test_pings_are_coalesced_and_future_timestamps_clamped(self):
+		now = timezone.now()
+		self.assertEqual(self.buffer.add_many([
+			(self.driver.pk, 12.91, 77.51, now - timedelta(seconds=30)),
+			(self.driver.pk, 12.92, 77.52, now + timedelta(hours=1)),
+		]), 2)
+		# The future ping counts as now, so a ping from a moment later still wins
+		self.assertEqual(self.buffer.add(self.driver.pk, 12.93, 77.53, timezone.now()), 1)
+		self.assertEqual(self.buffer.add(self.driver.pk, 12.94, 77.54, now - timedelta(seconds=10)), 0)
+		self.assertEqual(self.buffer.flush(), 1)
+		self.driver.refresh_from_db()
+		self.assertEqual((self.driver.latitude, self.driver.longitude), (12.93, 77.53))
+		self.assertLessEqual(self.driver.location_updated_at, timezone.now())
+		self.assertEqual(self.buffer.stats(), {'pending': 0, 'received': 4, 'stale': 1, 'rows_written': 1, 'flushes': 1})
+
+	def test_background_thread_flushes_without_further_pings(self):
+		buffer = LocationBuffer(flush_interval=0.01)
+		flushed = threading.Event()
+		with patch.object(buffer, 'flush', side_effect=lambda: flushed.set() or 0):
+			buffer.add(self.driver.pk, 12.91, 77.51)
+			self.assertTrue(flushed.wait(5))
+			buffer.stop()
+		self.assertIsNone(buffer._flusher)
+
+	def test_sync_keeps_buffered_positions_newer_than_the_database(self):
+		moved = Driver.objects.create(
+			name='moved elsewhere', phone='1', vehicle_type='Mini', vehicle_number='MI-2',
+			latitude=13.1, longitude=77.7, location_updated_at=timezone.now(),
+		)
+		self.buffer.add_many([
+			(self.driver.pk, 12.95, 77.55, None),
+			(moved.pk, 12.0, 77.0, timezone.now() - timedelta(minutes=5)),
+		])
+		dispatcher = Dispatcher(DispatchIndex(), resync_interval=3600)
+		dispatcher.set_latest_positions(self.buffer.latest_positions)
+		dispatcher.sync(force=True)
+		self.assertEqual(dispatcher.index.position(self.driver.pk), (12.95, 77.55))
+		self.assertEqual(dispatcher.index.position(moved.pk), (13.1, 77.7))
+
+
+class DriverLocationApiTests(TestCase):
+	def setUp(self):
+		self.buffer = LocationBuffer(flush_interval=3600, background=False)
+		self.dispatcher = Dispatcher(DispatchIndex(max_radius_km=25), resync_interval=3600)
+		for target, replacement in (('location_buffer', self.buffer), ('dispatcher', self.dispatcher)):
+			patcher = patch(f'core.views_api.{target}', replacement)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		self.driver_user = User.objects.create(username='driver')
+		self.driver = Driver.objects.create(
+			name='Driver', phone='1', vehicle_type='Mini', vehicle_number='MI-1', user=self.driver_user, latitude=12.97, longitude=77.59,
+		)
+		self.client = Client()
+
+	def post_location(self, body):
+		return self.client.post(reverse('driver_location'), json.dumps(body), content_type='application/json')
+
+	def test_driver_location(self):
+		self.client.force_login(self.driver_user)
+		self.assertEqual(self.post_location({'latitude': 12.98, 'longitude': 77.6}).json(), {'success': True})
+		self.assertEqual(self.buffer.flush(), 1)
+		self.driver.refresh_from_db()
+		self.assertEqual((self.driver.latitude, self.driver.longitude), (12.98, 77.6))
+		self.assertEqual(self.post_location({'latitude': 91, 'longitude': 77.6}).status_code, 400)
+		self.assertEqual(self.post_location({'latitude': 'x'}).status_code, 400)
+		self.assertEqual(self.client.get(reverse('driver_location')).status_code, 405)
+
+		self.client.force_login(User.objects.create(username='rider'))
+		self.assertEqual(self.post_location({'latitude': 12.98, 'longitude': 77.6}).status_code, 403)
+
+	@override_settings(LOCATION_INGEST={'TOKEN': 'secret'})
+	def test_batched_driver_locations_need_the_ingest_token(self):
+		body = json.dumps({'pings': [
+			{'driver': self.driver.pk, 'latitude': 12.99, 'longitude': 77.61, 'timestamp': '2026-01-01T10:00:00Z'},
+			{'driver': self.driver.pk, 'latitude': 12.5, 'longitude': 77.0, 'timestamp': '2026-01-01T09:00:00Z'},
+		]})
+		url = reverse('driver_locations')
+		self.assertEqual(self.client.post(url, body, content_type='application/json', headers={'X-Ingest-Token': 'wrong'}).status_code, 403)
+		response = self.client.post(url, body, content_type='application/json', headers={'X-Ingest-Token': 'secret'})
+		self.assertEqual(response.json(), {'success': True, 'received': 2, 'accepted': 1})
+		self.assertEqual(self.buffer.stats()['pending'], 1)
+
+	def test_nearby_drivers(self):
+		far = Driver.objects.create(name='Far', phone='1', vehicle_type='Mini', vehicle_number='MI-2', latitude=13.05, longitude=77.65)
+		Driver.objects.create(name='Away', phone='1', vehicle_type='Mini', vehicle_number='MI-3', latitude=19.07, longitude=72.87)
+		Driver.objects.create(name='Busy', phone='1', vehicle_type='Mini', vehicle_number='MI-4', latitude=12.97, longitude=77.59, is_available=False)
+		self.client.force_login(User.objects.create(username='rider'))
+		url = reverse('nearby_drivers')
+		drivers = self.client.get(url, {'lat': 12.97, 'lon': 77.59, 'vehicle_type': 'Mini'}).json()['drivers']
+		self.assertEqual([d['id'] for d in drivers], [self.driver.pk, far.pk])
+		self.assertEqual(drivers[0], {'id': self.driver.pk, 'latitude': 12.97, 'longitude': 77.59, 'distance': 0.0})
+		self.assertEqual(len(self.client.get(url, {'lat': 12.97, 'lon': 77.59, 'vehicle_type': 'Mini', 'k': 1}).json()['drivers']), 1)
+		self.assertEqual(self.client.get(url, {'lat': 12.97, 'lon': 77.59, 'vehicle_type': 'SUV'}).json()['drivers'], [])
+		self.assertEqual(self.client.get(url, {'lat': 'north', 'lon': 77.59}).status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConcurrentBookingTests(TransactionTestCase):
+	"""Parallel booking submissions must never leave a user with two active trips"""
+
+	threads = 8
+
+	def setUp(self):
+		for i in range(self.threads * 2):
+			Driver.objects.create(name=f'Driver {i}', phone='+91-9000000000', vehicle_type='Mini', vehicle_number=f'MI-{i:04d}')
+
+	def make_user(self, name):
+		user = User.objects.create_user(name, f'{name}@example.com', 'password')
+		Wallet.objects.create(user=user)
+		return user
+
+	def submit_in_parallel(self, users):
+		barrier = threading.Barrier(len(users))
+		statuses = []
+
+		def book(client):
+			try:
+				barrier.wait(timeout=30)
+				response = client.post(reverse('book_vehicle'), {
+					'vehicle_type': 'Mini', 'price': '100', 'pickup': '', 'destination': '', 'payment_method': 'wallet',
+				})
+				statuses.append(response.status_code)
+			finally:
+				connection.close()
+
+		clients = []
+		for user in users:
+			client = Client()
+			client.force_login(user)
+			clients.append(client)
+		workers = [threading.Thread(target=book, args=(client,)) for client in clients]
+		start = time.perf_counter()
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+		return statuses, time.perf_counter() - start
+
+	def test_one_active_trip_per_user(self):
+		user = self.make_user('racer')
+		statuses, _ = self.submit_in_parallel([user] * self.threads)
+		self.assertEqual(sorted(statuses), [200] + [302] * (self.threads - 1))
+		self.assertEqual(Booking.objects.filter(user=user, status__in=ACTIVE_BOOKING_STATUSES).count(), 1)
+		# Drivers claimed by the losing submissions are handed back
+		self.assertEqual(Driver.objects.filter(is_available=False).count(), 1)
+
+	def test_different_users_book_in_parallel(self):
+		users = [self.make_user(f'rider{i}') for i in range(self.threads)]
+		statuses, elapsed = self.submit_in_parallel(users)
+		self.assertEqual(statuses, [200] * self.threads)
+		self.assertEqual(Booking.objects.filter(status__in=ACTIVE_BOOKING_STATUSES).count(), self.threads)
+		self.assertLess(elapsed, 30)
+
+
+class ActiveBookingMigrationTests(TransactionTestCase):
+	before = [('core', '0009_driver_user')]
+
+	def migrate(self, targets):
+		executor = MigrationExecutor(connection)
+		executor.loader.build_graph()
+		executor.migrate(targets)
+		return executor.loader.project_state(targets).apps
+
+	def create_bookings(self, old_apps, bookings):
+		OldBooking = old_apps.get_model('core', 'Booking')
+		OldUser = old_apps.get_model('auth', 'User')
+		for username, statuses in bookings.items():
+			user = OldUser.objects.create(username=username)
+			for status in statuses:
+				OldBooking.objects.create(user=user, vehicle_type='Mini', price=100, pickup='A', destination='B', status=status)
+
+	def statuses(self, username):
+		return list(Booking.objects.filter(user__username=username).order_by('pk').values_list('status', flat=True))
+
+	def test_only_unstarted_duplicates_are_cancelled(self):
+		latest = MigrationExecutor(connection).loader.graph.leaf_nodes('core')
+		old_apps = self.migrate(self.before)
+		try:
+			self.create_bookings(old_apps, {
+				'riding': ['Pending', 'In Progress', 'Paid', 'Confirmed'],
+				'owes': ['Completed', 'Pending'],
+				'waiting': ['Confirmed', 'Pending'],
+				'single': ['Pending'],
+			})
+		finally:
+			self.migrate(latest)
+		# The most advanced booking is kept even when a newer one exists
+		self.assertEqual(self.statuses('riding'), ['Cancelled', 'In Progress', 'Paid', 'Cancelled'])
+		self.assertEqual(self.statuses('owes'), ['Completed', 'Cancelled'])
+		self.assertEqual(self.statuses('waiting'), ['Confirmed', 'Cancelled'])
+		self.assertEqual(self.statuses('single'), ['Pending'])
+
+	def test_started_duplicates_stop_the_migration(self):
+		latest = MigrationExecutor(connection).loader.graph.leaf_nodes('core')
+		old_apps = self.migrate(self.before)
+		try:
+			self.create_bookings(old_apps, {'twice': ['Completed', 'In Progress', 'Pending']})
+			with self.assertRaisesRegex(RuntimeError, r'booking \d+ \(In Progress\) and booking \d+ \(Completed\)'):
+				self.migrate(latest)
+			# Nothing was cancelled; resolving by hand lets the migration through
+			self.assertEqual(
+				sorted(old_apps.get_model('core', 'Booking').objects.values_list('status', flat=True)),
+				['Completed', 'In Progress', 'Pending'],
+			)
+			old_apps.get_model('core', 'Booking').objects.filter(status='In Progress').update(status='Paid')
+		finally:
+			self.migrate(latest)
+		self.assertEqual(self.statuses('twice'), ['Completed', 'Paid', 'Cancelled'])
+
+
+class WalletLedgerConcurrencyTests(TransactionTestCase):
+	"""Concurrent top-ups and payments must neither lose updates nor overdraw"""
+
+	threads = 8
+	operations = 40
+
+	def setUp(self):
+		self.user = User.objects.create(username='ledger')
+		self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('0.00'))
+
+	def run_in_parallel(self, work):
+		barrier = threading.Barrier(self.threads)
+		errors = []
+
+		def worker(n):
+			try:
+				barrier.wait(timeout=30)
+				work(n)
+			except Exception as e:
+				errors.append(e)
+			finally:
+				connection.close()
+
+		workers = [threading.Thread(target=worker, args=(n,)) for n in range(self.threads)]
+		for thread in workers:
+			thread.start()
+		for thread in workers:
+			thread.join()
+		self.assertEqual(errors, [])
+
+	def ledger_total(self):
+		return WalletTransaction.objects.filter(wallet=self.wallet).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+
+	def test_mixed_credits_and_debits(self):
+		debited = []
+
+		def work(n):
+			wallet = Wallet.objects.get(pk=self.wallet.pk)
+			for i in range(self.operations):
+				if (n + i) % 2:
+					ledger.credit(wallet, 10, 'top-up')
+				else:
+					try:
+						ledger.debit(wallet, 7, 'trip')
+						debited.append(7)
+					except ledger.InsufficientFunds:
+						pass
+
+		self.run_in_parallel(work)
+		self.wallet.refresh_from_db()
+		credits = self.threads * self.operations // 2 * 10
+		self.assertEqual(self.wallet.balance, Decimal(credits - sum(debited)))
+		self.assertEqual(self.wallet.balance, self.ledger_total())
+		self.assertGreaterEqual(self.wallet.balance, 0)
+
+	def test_debits_never_overdraw(self):
+		ledger.credit(self.wallet, 100, 'opening balance')
+
+		def work(n):
+			wallet = Wallet.objects.get(pk=self.wallet.pk)
+			for _ in range(5):
+				try:
+					ledger.debit(wallet, 10, 'trip')
+				except ledger.InsufficientFunds:
+					pass
+
+		self.run_in_parallel(work)
+		self.wallet.refresh_from_db()
+		self.assertEqual(self.wallet.balance, Decimal('0.00'))
+		self.assertEqual(WalletTransaction.objects.filter(wallet=self.wallet, transaction_type='debit').count(), 10)
+		self.assertEqual(self.ledger_total(), Decimal('0.00'))
+
+	def test_booking_is_paid_once(self):
+		ledger.credit(self.wallet, 500, 'opening balance')
+		booking = Booking.objects.create(
+			user=self.user, vehicle_type='Mini', price=Decimal('120.00'), pickup='A', destination='B', status='Completed',
+		)
+		ledger.pay_for_booking(self.wallet, booking)
+		with self.assertRaises(ledger.AlreadyPaid):
+			ledger.pay_for_booking(self.wallet, booking)
+		self.wallet.refresh_from_db()
+		self.assertEqual(self.wallet.balance, Decimal('380.00'))
+		self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'Paid')
+
+	def test_bulk_credit(self):
+		for i in range(4):
+			Wallet.objects.create(user=User.objects.create(username=f'promo{i}'))
+		progress = []
+		credited = ledger.bulk_credit(Wallet.objects.all(), 1000, 'promo', chunk_size=2, progress=lambda *p: progress.append(p))
+		self.assertEqual(credited, 5)
+		self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+		self.assertEqual(list(Wallet.objects.values_list('balance', flat=True)), [Decimal('1000.00')] * 5)
+		self.assertEqual(WalletTransaction.objects.filter(amount=Decimal('1000.00'), description='promo').count(), 5)
+
+	def test_credit_wallets_command(self):
+		User.objects.create(username='suspended', is_active=False)
+		Wallet.objects.create(user=User.objects.get(username='suspended'))
+		out = StringIO()
+		call_command('credit_wallets', '50', '--all', '--active-only', '--chunk-size', '1', stdout=out)
+		self.wallet.refresh_from_db()
+		self.assertEqual(self.wallet.balance, Decimal('50.00'))
+		self.assertEqual(Wallet.objects.get(user__username='suspended').balance, Decimal('0.00'))
+		self.assertIn('Credited ₹50.00 to 1 wallets', out.getvalue())
+
+
+class WalletReconciliationTests(TestCase):
+	def setUp(self):
+		self.wallets = [Wallet.objects.create(user=User.objects.create(username=f'audit{i}')) for i in range(3)]
+		for i, wallet in enumerate(self.wallets):
+			ledger.credit(wallet, 100 * (i + 1), 'top-up')
+		ledger.debit(self.wallets[0], 40, 'trip')
+
+	def test_balances_match_and_snapshots_are_incremental(self):
+		first = ledger.reconcile(wallet_chunk_size=2)
+		self.assertEqual((first.transactions, first.wallets, first.mismatches, first.snapshots), (4, 3, [], 3))
+		self.assertEqual(WalletSnapshot.objects.get(wallet=self.wallets[0]).balance, Decimal('60.00'))
+
+		ledger.credit(self.wallets[1], 5, 'top-up')
+		second = ledger.reconcile()
+		self.assertEqual((second.start_transaction_id, second.transactions, second.mismatches, second.snapshots), (first.end_transaction_id, 1, [], 1))
+		self.assertEqual(WalletSnapshot.objects.filter(wallet=self.wallets[1]).latest('last_transaction_id').balance, Decimal('205.00'))
+
+	def test_interrupted_run_leaves_consistent_snapshots(self):
+		ledger.reconcile()
+		for wallet in self.wallets:
+			ledger.credit(wallet, 5, 'top-up')
+
+		def crash(stage, done, total):
+			raise RuntimeError('killed')
+
+		# Dies after snapshotting only the first wallet
+		with self.assertRaises(RuntimeError):
+			ledger.reconcile(wallet_chunk_size=1, progress=crash)
+		self.assertEqual(WalletSnapshot.objects.filter(wallet=self.wallets[0]).count(), 2)
+		self.assertEqual(WalletSnapshot.objects.filter(wallet=self.wallets[1]).count(), 1)
+
+		ledger.credit(self.wallets[2], 1, 'top-up')
+		result = ledger.reconcile()
+		self.assertEqual((result.transactions, result.mismatches, result.snapshots), (3, [], 2))
+		for wallet in self.wallets:
+			wallet.refresh_from_db()
+			self.assertEqual(wallet.snapshots.latest('last_transaction_id').balance, wallet.balance)
+		self.assertEqual(ledger.reconcile(full=True, write_snapshots=False).mismatches, [])
+
+	def test_reports_balance_drift(self):
+		Wallet.objects.filter(pk=self.wallets[2].pk).update(balance=Decimal('999.00'))
+		result = ledger.reconcile(write_snapshots=False)
+		self.assertEqual(result.mismatches, [ledger.Mismatch(self.wallets[2].pk, Decimal('999.00'), Decimal('300.00'))])
+		self.assertFalse(WalletSnapshot.objects.exists())
+		with self.assertRaises(CommandError):
+			call_command('reconcile_wallets', '--fail-on-mismatch', stdout=StringIO())
+
+
+class BookingHistoryPaginationTests(TestCase):
+	def setUp(self):
+		self.user = User.objects.create(username='rider')
+		created_at = timezone.now()
+		# Several bookings share a timestamp so the id tiebreak is exercised
+		for i in range(7):
+			booking = Booking.objects.create(
+				user=self.user, vehicle_type='Mini', price=Decimal('100.00'),
+				pickup=f'A{i}', destination='B', status='Paid',
+			)
+			Booking.objects.filter(pk=booking.pk).update(created_at=created_at - timedelta(minutes=i // 3))
+		Booking.objects.create(user=self.user, vehicle_type='Mini', price=Decimal('100.00'), pickup='A7', destination='B', status='Confirmed')
+		self.client = Client()
+		self.client.force_login(self.user)
+
+	def test_pages_cover_every_booking_once_newest_first(self):
+		expected = list(Booking.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('pk', flat=True))
+		seen = []
+		cursor = None
+		while True:
+			bookings, cursor, has_active_trip = booking_history_page(self.user, cursor, limit=3)
+			seen.extend(booking.pk for booking in bookings)
+			self.assertTrue(has_active_trip)
+			if cursor is None:
+				break
+		self.assertEqual(seen, expected)
+
+	def test_load_more_endpoint(self):
+		response = self.client.get(reverse('booking_history'))
+		self.assertEqual(len(response.context['bookings']), 8)
+		self.assertIsNone(response.context['next_cursor'])
+
+		_, cursor, _ = booking_history_page(self.user, limit=5)
+		data = self.client.get(reverse('booking_history_page'), {'cursor': cursor}).json()
+		self.assertEqual(len(data['bookings']), 3)
+		self.assertIsNone(data['next_cursor'])
+		self.assertTrue(data['has_active_trip'])
+		self.assertEqual(data['html'].count('<tr>'), 3)
+
+		response = self.client.get(reverse('booking_history_page'), {'cursor': 'not-a-cursor'})
+		self.assertEqual(response.status_code, 400)
+
+
+class BookingCsvExportTests(TestCase):
+	def setUp(self):
+		self.admin = User.objects.create(username='ops', is_staff=True)
+		self.rider = User.objects.create(username='rider')
+		for i, day in enumerate(['2026-01-01', '2026-01-15', '2026-02-01']):
+			booking = Booking.objects.create(
+				user=self.rider if i else self.admin, vehicle_type='Mini', price=Decimal('120.50'),
+				pickup='A, B', destination='C', status='Paid',
+			)
+			Booking.objects.filter(pk=booking.pk).update(created_at=timezone.make_aware(datetime.fromisoformat(day + ' 23:30')))
+		self.client = Client()
+
+	def read_csv(self, url, params=None):
+		response = self.client.get(url, params)
+		self.assertTrue(response.streaming)
+		return b''.join(response.streaming_content).decode().splitlines()
+
+	def test_user_export_is_limited_to_own_bookings(self):
+		self.client.force_login(self.rider)
+		lines = self.read_csv(reverse('download_bookings_csv'))
+		self.assertEqual(lines[0], 'Booking ID,Vehicle,Price,Pickup,Destination,Status,Created At')
+		self.assertEqual(len(lines), 3)
+		self.assertIn('"A, B"', lines[1])
+
+	def test_admin_export_filters_by_date(self):
+		self.client.force_login(self.admin)
+		lines = self.read_csv(reverse('admin_bookings_csv'), {'start': '2026-01-01', 'end': '2026-01-15'})
+		self.assertEqual([line.split(',')[1] for line in lines[1:]], ['rider', 'ops'])
+		self.assertEqual(len(self.read_csv(reverse('admin_bookings_csv'))), 4)
+		response = self.client.get(reverse('admin_bookings_csv'), {'start': 'yesterday'})
+		self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+
+		self.client.force_login(self.rider)
+		self.assertRedirects(self.client.get(reverse('admin_bookings_csv')), reverse('home'), fetch_redirect_response=False)
+
+
+class ExportJobTests(TestCase):
+	def setUp(self):
+		self.export_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.export_root)
+		patcher = patch('core.export_jobs.EXPORT_ROOT', self.export_root)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.admin = User.objects.create(username='finance', is_staff=True)
+		for i in range(5):
+			booking = Booking.objects.create(
+				user=self.admin, vehicle_type='Mini', price=Decimal('100.00') + i,
+				pickup='A', destination='B', status='Paid',
+			)
+			Booking.objects.filter(pk=booking.pk).update(created_at=timezone.make_aware(datetime(2026, 3, 1, 12) + timedelta(days=i * 10)))
+
+	def make_job(self, **kwargs):
+		fields = {'dataset': 'bookings', 'start_date': datetime(2026, 3, 1).date(), 'end_date': datetime(2026, 3, 31).date()}
+		fields.update(kwargs)
+		return ExportJob.objects.create(**fields)
+
+	def read_lines(self, job):
+		with gzip.open(export_jobs.job_path(job), 'rt') as f:
+			return f.read().splitlines()
+
+	def test_worker_exports_month_as_gzip_csv(self):
+		job = self.make_job()
+		call_command('run_export_jobs', '--once', '--chunk-size', '2', stdout=StringIO())
+		job.refresh_from_db()
+		self.assertEqual((job.status, job.rows_written), ('Completed', 4))
+		lines = self.read_lines(job)
+		self.assertEqual(lines[0].split(',')[:2], ['Booking ID', 'User'])
+		self.assertEqual([line.split(',')[3] for line in lines[1:]], ['100.00', '101.00', '102.00', '103.00'])
+
+		self.client.force_login(self.admin)
+		response = self.client.get(reverse('download_export', args=[job.pk]))
+		self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines(), lines)
+
+	def test_crashed_job_resumes_after_last_recorded_chunk(self):
+		job = self.make_job(format='jsonl')
+
+		def crash(job):
+			raise RuntimeError('worker killed')
+
+		with self.assertRaises(RuntimeError):
+			export_jobs.run_job(job, chunk_size=3, progress=crash)
+		# A chunk that was half written when the worker died
+		with open(export_jobs.job_path(job), 'ab') as f:
+			f.write(b'\x1f\x8b partial')
+		ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+		resumed = export_jobs.claim_next_job()
+		self.assertEqual((resumed.pk, resumed.last_pk, resumed.rows_written), (job.pk, job.last_pk, 3))
+		export_jobs.run_job(resumed, chunk_size=3)
+		rows = [json.loads(line) for line in self.read_lines(resumed)]
+		self.assertEqual([row['price'] for row in rows], ['100.00', '101.00', '102.00', '103.00'])
+		self.assertEqual(len({row['booking_id'] for row in rows}), 4)
+
+	def test_unfinished_export_cannot_be_downloaded(self):
+		job = self.make_job()
+		self.client.force_login(self.admin)
+		self.assertEqual(self.client.get(reverse('download_export', args=[job.pk])).status_code, 404)
+
+
+class ReceiptCacheTests(TestCase):
+	def setUp(self):
+		receipt_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, receipt_root)
+		patcher = patch('core.receipts.RECEIPT_ROOT', receipt_root)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.user = User.objects.create(username='payer')
+		self.booking = Booking.objects.create(
+			user=self.user, vehicle_type='Sedan', price=Decimal('250.00'), pickup='A', destination='B', status='Paid',
+		)
+		self.client.force_login(self.user)
+
+	def test_receipt_is_rendered_once_and_revalidated_with_etag(self):
+		url = reverse('download_receipt', args=[self.booking.pk])
+		with patch('core.receipts.render_receipt', wraps=receipts.render_receipt) as render:
+			first = self.client.get(url)
+			pdf = b''.join(first.streaming_content)
+			second = self.client.get(url)
+			self.assertEqual(b''.join(second.streaming_content), pdf)
+			not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+		self.assertEqual(render.call_count, 1)
+		self.assertTrue(pdf.startswith(b'%PDF'))
+		self.assertEqual(first['ETag'], f'"{receipts.receipt_digest(self.booking)}"')
+		self.assertEqual(not_modified.status_code, 304)
+
+	def test_render_is_deterministic(self):
+		self.assertEqual(receipts.render_receipt(self.booking), receipts.render_receipt(self.booking))
+
+
+class MonthlyStatementTests(TestCase):
+	def setUp(self):
+		self.output_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.output_dir)
+		march = timezone.make_aware(datetime(2026, 3, 15, 12))
+		self.busy = User.objects.create(username='busy')
+		self.saver = User.objects.create(username='saver')
+		for i in range(60):
+			Booking.objects.create(user=self.busy, vehicle_type='Mini', price=Decimal('10.00'), pickup='A', destination='B', status='Paid')
+		Booking.objects.create(user=self.saver, vehicle_type='Mini', price=Decimal('99.00'), pickup='A', destination='B', status='Cancelled')
+		ledger.credit(Wallet.objects.create(user=self.saver), 500, 'top-up')
+		Booking.objects.update(created_at=march)
+		WalletTransaction.objects.update(created_at=march)
+
+	def test_statements_cover_riders_with_activity(self):
+		batches = {username: (len(bookings), len(transactions)) for _, username, bookings, transactions in statements.statement_batches(2026, 3)}
+		self.assertEqual(batches, {'busy': (60, 0), 'saver': (0, 1)})
+		self.assertEqual(list(statements.statement_batches(2026, 4)), [])
+
+	def test_command_renders_multi_page_pdfs_in_a_process_pool(self):
+		out = StringIO()
+		call_command('generate_statements', '2026-03', '--output-dir', self.output_dir, '--workers', '2', stdout=out)
+		self.assertIn('2 statements for 2026-03 (60 trips, 1 transactions', out.getvalue())
+		self.assertIn('statements/sec', out.getvalue())
+		with open(os.path.join(self.output_dir, '2026-03', f'statement_2026-03_{self.busy.pk}.pdf'), 'rb') as f:
+			self.assertEqual(f.read().count(b'/Type /Page\n'), 2)
+
+
+class DocumentationCacheTests(TestCase):
+	def setUp(self):
+		cache_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, cache_dir)
+		patcher = patch('core.documentation_cache.CACHE_DIR', cache_dir)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.builds = 0
+
+		def generate():
+			self.builds += 1
+			return BytesIO(f'docx build {self.builds}'.encode()), None
+
+		patcher = patch('core.documentation.generate_documentation_file', side_effect=generate)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.client.force_login(User.objects.create(username='reader'))
+
+	def download(self, **headers):
+		return self.client.get(reverse('download_documentation'), **headers)
+
+	def test_document_is_built_once_per_content_version(self):
+		first = self.download()
+		self.assertEqual(b''.join(first.streaming_content), b'docx build 1')
+		self.assertEqual(first['Content-Length'], str(len(b'docx build 1')))
+		self.assertEqual(first['ETag'], f'"{documentation_cache.content_version()}"')
+		self.assertEqual(b''.join(self.download().streaming_content), b'docx build 1')
+		self.assertEqual(self.download(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+		self.assertEqual(self.builds, 1)
+
+	def test_changed_inputs_rebuild_in_background(self):
+		self.download()
+		threads = []
+		start_build = documentation_cache.build_in_background
+		with patch('core.documentation_cache.content_version', return_value='v2'), \
+				patch('core.documentation_cache.build_in_background', side_effect=lambda version: threads.append(start_build(version))):
+			stale = self.download()
+			self.assertEqual(b''.join(stale.streaming_content), b'docx build 1')
+			threads[0].join()
+			fresh = self.download()
+		self.assertEqual(b''.join(fresh.streaming_content), b'docx build 2')
+		self.assertEqual(fresh['ETag'], '"v2"')
+		self.assertEqual(self.builds, 2)
+
+	def test_previous_build_is_kept_until_superseded(self):
+		for version in ('v1', 'v2'):
+			documentation_cache.build(version)
+			os.utime(documentation_cache.document_path(version), (self.builds, self.builds))
+		self.assertTrue(os.path.exists(documentation_cache.document_path('v1')))
+		documentation_cache.build('v3')
+		kept = sorted(os.listdir(documentation_cache.CACHE_DIR))
+		self.assertEqual(kept, ['documentation_v2.docx', 'documentation_v3.docx'])
+
+	def test_removed_stale_build_falls_back_to_current_version(self):
+		stale = documentation_cache.build('old')
+		os.remove(stale)
+		document, version = documentation_cache.open_document(stale, 'old')
+		with document:
+			self.assertEqual(document.read(), b'docx build 2')
+		self.assertEqual(version, documentation_cache.content_version())
+
+	def test_latest_document_skips_files_removed_while_listing(self):
+		path = documentation_cache.build('v1')
+		missing = documentation_cache.document_path('gone')
+		with patch('core.documentation_cache.glob.glob', return_value=[missing, path]):
+			self.assertEqual(documentation_cache.latest_document(), (path, 'v1'))
+
+	def test_version_tracks_screenshot_changes(self):
+		version = documentation_cache.content_version()
+		with patch('core.documentation.SCREENSHOT_DIR', tempfile.gettempdir()):
+			self.assertNotEqual(documentation_cache.content_version(), version)
+
+
+@skipUnless(doc_images.Image, 'Pillow is not installed')
+class ScreenshotDerivativeTests(SimpleTestCase):
+	def setUp(self):
+		self.source_dir = tempfile.mkdtemp()
+		cache_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.source_dir)
+		self.addCleanup(shutil.rmtree, cache_dir)
+		patcher = patch('core.doc_images.IMAGE_CACHE_DIR', cache_dir)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		for i, size in enumerate([(1920, 1080), (640, 480)]):
+			doc_images.Image.new('RGBA', size, (i * 80, 120, 200, 255)).save(os.path.join(self.source_dir, f'shot{i}.png'))
+
+	def test_derivatives_are_width_capped_and_cached_by_source_digest(self):
+		prepared = doc_images.prepare_screenshots(self.source_dir, ['shot0.png', 'shot1.png', 'missing.png'], workers=2)
+		self.assertEqual(set(prepared), {'shot0.png', 'shot1.png'})
+		sizes = {}
+		for name, path in prepared.items():
+			self.assertIn(doc_images.source_digest(os.path.join(self.source_dir, name)), path)
+			with doc_images.Image.open(path) as image:
+				sizes[name] = image.size
+		self.assertEqual(sizes, {'shot0.png': (900, 506), 'shot1.png': (640, 480)})
+
+		with patch.object(doc_images.Image, 'open') as reopen:
+			self.assertEqual(doc_images.prepare_screenshots(self.source_dir, ['shot0.png', 'shot1.png']), prepared)
+		reopen.assert_not_called()
+
+	def test_originals_are_used_without_pillow(self):
+		with patch('core.doc_images.Image', None):
+			prepared = doc_images.prepare_screenshots(self.source_dir, ['shot0.png'])
+		self.assertEqual(prepared, {'shot0.png': os.path.join(self.source_dir, 'shot0.png')})
+
+
+class DocumentationExportTests(TestCase):
+	def setUp(self):
+		documentation_export._cache.clear()
+		self.addCleanup(documentation_export._cache.clear)
+		self.client.force_login(User.objects.create(username='reader'))
+
+	def test_paragraphs_split_on_blank_lines(self):
+		content = """
+## 1.1 Heading
+
+Intro line:
+• first
+• second
+   
+Last paragraph
+"""
+		self.assertEqual(list(documentation.iter_paragraphs(content)), [
+			'## 1.1 Heading', 'Intro line:\n• first\n• second', 'Last paragraph',
+		])
+
+	def test_sections_are_built_lazily(self):
+		generator = documentation.RideONDocumentationGenerator()
+		with patch.object(generator, '_get_references', side_effect=AssertionError('built too early')):
+			sections = generator.iter_sections()
+			self.assertEqual(next(sections)[0], 'table_of_contents')
+
+	def test_documentation_page_renders_cached_sections_without_building_the_docx(self):
+		with patch('core.documentation.generate_documentation_file', side_effect=AssertionError('DOCX built')), \
+				patch.object(documentation.RideONDocumentationGenerator, 'get_section', autospec=True,
+							 side_effect=documentation.RideONDocumentationGenerator.get_section) as get_section:
+			first = self.client.get(reverse('documentation'))
+			second = self.client.get(reverse('documentation'))
+		sections = len(documentation.RideONDocumentationGenerator.SECTIONS)
+		self.assertEqual(get_section.call_count, sections)
+		self.assertEqual(len(second.context['sections']), sections)
+		self.assertContains(first, '<h3>2.1 Home Page</h3>', html=False)
+		self.assertContains(first, '<li>Clean, modern interface with purple gradient theme</li>', html=False)
+
+	def test_streaming_exports(self):
+		response = self.client.get(reverse('export_documentation', args=['html']))
+		self.assertTrue(response.streaming)
+		page = b''.join(response.streaming_content).decode()
+		self.assertTrue(page.startswith('<!DOCTYPE html>'))
+		self.assertEqual(page.count('<section class="doc-section"'), len(documentation.RideONDocumentationGenerator.SECTIONS))
+
+		response = self.client.get(reverse('export_documentation', args=['md']))
+		markdown = b''.join(response.streaming_content).decode()
+		self.assertIn('## References', markdown)
+		self.assertIn('- Clean, modern interface with purple gradient theme', markdown)
+		self.assertEqual(self.client.get(reverse('export_documentation', args=['pdf'])).status_code, 404)
@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
 from . import views_payment
+from . import views_api
 
 urlpatterns = [
     path('', views.home_view, name='home'),
@@ -15,6 +16,8 @@ urlpatterns = [
     path('trip_details/<int:booking_id>/', views.trip_details_view, name='trip_details'),
     path('complete_trip/<int:booking_id>/', views.complete_trip_view, name='complete_trip'),
     path('download_bookings_csv/', views.download_bookings_csv_view, name='download_bookings_csv'),
+    path('admin_dashboard/bookings_csv/', views.admin_bookings_csv_view, name='admin_bookings_csv'),
+    path('exports/<int:job_id>/download/', views.download_export_view, name='download_export'),
     path('preferences/', views.user_preferences_view, name='user_preferences'),
     path('clear_preferences/', views.clear_preferences_view, name='clear_preferences'),
     path('cancel_booking/', views.cancel_booking_view, name='cancel_booking'),
@@ -24,5 +27,13 @@ urlpatterns = [
     path('apply_promocode/', views.apply_promocode, name='apply_promocode'),
     path('documentation/', views.documentation_view, name='documentation'),
     path('download_documentation/', views.download_documentation, name='download_documentation'),
+    path('documentation/export/<str:fmt>/', views.export_documentation, name='export_documentation'),
     path('download_receipt/<int:booking_id>/', views.download_receipt, name='download_receipt'),
+    path('api/quote/', views_api.quote, name='quote'),
+    path('api/quote/batch/', views_api.batch_quote, name='batch_quote'),
+    path('api/quote/stats/', views_api.quote_stats, name='quote_stats'),
+    path('api/driver/location/', views_api.driver_location, name='driver_location'),
+    path('api/driver/locations/', views_api.driver_locations, name='driver_locations'),
+    path('api/drivers/nearby/', views_api.nearby_drivers, name='nearby_drivers'),
+    path('api/bookings/', views_api.booking_history, name='booking_history_page'),
 ]
@@ -1,17 +1,21 @@
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from core.documentation import generate_documentation_file
-from core.models import Driver, Wallet, WalletTransaction, Booking
+from django.utils.http import parse_etags
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, Q
+from core.models import ACTIVE_BOOKING_STATUSES, ExportJob, Wallet, Booking
 from core.cookie_utils import CookieManager
+from core.quotes import quote_route
+from core.dispatch import dispatcher
+from core.geocoding import get_coords_many
+from core import documentation_cache, documentation_export, export_jobs, exports, ledger, pricing, receipts
+import base64
 import json
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
-import csv
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP, InvalidOperation
 import os
 
 # --- Download Receipt View ---
@@ -22,21 +26,15 @@ def download_receipt(request, booking_id):
     except Booking.DoesNotExist:
         messages.error(request, 'Booking not found or not paid')
         return redirect('booking_history')
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    p.setFont("Helvetica", 16)
-    p.drawString(100, 800, "RideON Receipt")
-    p.setFont("Helvetica", 12)
-    p.drawString(100, 750, f"Booking ID: {booking.pk}")
-    p.drawString(100, 730, f"Vehicle: {booking.vehicle_type}")
-    p.drawString(100, 710, f"Price: ₹{booking.price}")
-    p.drawString(100, 690, f"From: {booking.pickup}")
-    p.drawString(100, 670, f"To: {booking.destination}")
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receipt_{booking.pk}.pdf"'
+    etag = f'"{receipts.receipt_digest(booking)}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        path, _ = receipts.ensure_receipt(booking)
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=f'receipt_{booking.pk}.pdf',
+                                content_type='application/pdf')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
     return response
 
 # AJAX endpoint for promocode application
@@ -53,12 +51,6 @@ def apply_promocode(request):
             already_discounted = data.get('already_discounted', False)
         except Exception:
             return JsonResponse({'valid': False, 'error': 'Invalid request'}, status=400)
-        promocodes = {
-            'freefirst': 100,
-            'save50': 50,
-            'ride10': 10,
-            'car20': 20,
-        }
         try:
             price_decimal = Decimal(str(price))
         except Exception:
@@ -66,29 +58,33 @@ def apply_promocode(request):
         if already_discounted:
             price_int = int(price_decimal.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
             return JsonResponse({'valid': False, 'price': price_int, 'discount': 0})
-        if promocode == 'freeride':
-            max_discount = Decimal('50')
-            discount_amount = min(price_decimal, max_discount)
-            discounted_price = (price_decimal - discount_amount).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-            return JsonResponse({'valid': True, 'price': int(discounted_price), 'discount': int(discount_amount)})
-        discount_percent = promocodes.get(promocode, 0)
-        if discount_percent > 0:
-            discounted_price = price_decimal * (Decimal('1') - Decimal(discount_percent) / Decimal('100'))
-            discounted_price = discounted_price.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-            return JsonResponse({'valid': True, 'price': int(discounted_price), 'discount': int(discount_percent)})
-        price_int = int(price_decimal.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
-        return JsonResponse({'valid': False, 'price': price_int, 'discount': 0})
+        valid, discounted_price, discount = pricing.redeem_promocode(price_decimal, promocode)
+        return JsonResponse({'valid': valid, 'price': discounted_price, 'discount': discount})
+
+def user_is_admin(user):
+    from accounts.models import UserProfile
+    if user.is_staff or user.is_superuser:
+        return True
+    profile = UserProfile.objects.filter(user=user).first()
+    return bool(profile and profile.is_admin)
+
+# Statuses in which the booking's driver is busy with the trip
+TRIP_STATUSES = ['Driver Assigned', 'In Progress']
+
+def release_driver(booking, at_destination=True):
+    """
+    Return the booking's driver to the dispatch pool, at the drop-off point
+    when the trip was completed
+    """
+    if not booking.driver_id:
+        return
+    # Bounded by the geocoding deadline; an unknown drop-off keeps the last position
+    lat, lon = get_coords_many([booking.destination])[0] if at_destination and booking.destination else (None, None)
+    dispatcher.release(booking.driver, lat, lon)
 
 @login_required
 def admin_dashboard_view(request):
-    from accounts.models import UserProfile
-    is_admin = False
-    profile = UserProfile.objects.filter(user=request.user).first()
-    if profile and profile.is_admin:
-        is_admin = True
-    elif request.user.is_staff or request.user.is_superuser:
-        is_admin = True
-    if not is_admin:
+    if not user_is_admin(request.user):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('home')
     ongoing_bookings = Booking.objects.filter(
@@ -104,8 +100,11 @@ def admin_dashboard_view(request):
                 booking.save()
                 messages.success(request, f'Trip started for {booking.user.username}')
             elif action == 'end_trip':
+                was_active = booking.status in TRIP_STATUSES
                 booking.status = 'Completed'
                 booking.save()
+                if was_active:
+                    release_driver(booking)
                 messages.success(request, f'Trip completed for {booking.user.username}')
         except Booking.DoesNotExist:
             messages.error(request, 'Booking not found')
@@ -142,29 +141,24 @@ def trip_payment_view(request, booking_id):
                 messages.error(request, f'Insufficient wallet balance. You need ₹{booking.price} but have ₹{wallet.balance}')
             else:
                 try:
-                    wallet.refresh_from_db()
-                    if wallet.balance < booking.price:
-                        messages.error(request, 'Insufficient wallet balance after verification')
-                    else:
-                        wallet.balance -= booking.price
-                        wallet.save()
-                        WalletTransaction.objects.create(
-                            wallet=wallet,
-                            amount=-booking.price,
-                            transaction_type='debit',
-                            description=f'Trip payment for booking #{booking.pk}'
-                        )
-                        booking.status = 'Paid'
-                        booking.save()
-                        messages.success(request, f'Payment of ₹{booking.price} successful! You can now book another ride.')
-                        return redirect('booking_history')
+                    ledger.pay_for_booking(wallet, booking)
+                    receipts.prerender_receipt(booking)
+                    messages.success(request, f'Payment of ₹{booking.price} successful! You can now book another ride.')
+                    return redirect('booking_history')
+                except ledger.InsufficientFunds:
+                    messages.error(request, 'Insufficient wallet balance after verification')
+                except ledger.AlreadyPaid:
+                    messages.info(request, 'This booking has already been paid')
+                    return redirect('booking_history')
                 except Exception:
                     messages.error(request, 'Payment processing failed. Please try again.')
         elif payment_method == 'cash':
             try:
-                booking.status = 'Paid'
-                booking.save()
-                messages.success(request, 'Cash payment confirmed! You can now book another ride.')
+                if Booking.objects.filter(pk=booking.pk, status='Completed').update(status='Paid'):
+                    receipts.prerender_receipt(booking)
+                    messages.success(request, 'Cash payment confirmed! You can now book another ride.')
+                else:
+                    messages.info(request, 'This booking has already been paid')
                 return redirect('booking_history')
             except Exception:
                 messages.error(request, 'Error confirming cash payment. Please try again.')
@@ -177,29 +171,99 @@ def trip_payment_view(request, booking_id):
     }
     return render(request, 'core/trip_payment.html', context)
 
+BOOKING_HISTORY_PAGE_SIZE = 20
+
+
+def encode_history_cursor(booking):
+    value = f'{booking.created_at.isoformat()}|{booking.pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_history_cursor(cursor):
+    """
+    (created_at, id) of the last booking on the previous page; raises ValueError
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.rsplit('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        return created_at, int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def booking_history_page(user, cursor=None, limit=BOOKING_HISTORY_PAGE_SIZE):
+    """
+    One page of a user's bookings, newest first, after the cursor.
+    Returns (bookings, next_cursor, has_active_trip) from a single query:
+    the active-trip check rides along as an EXISTS on every row.
+    """
+    bookings = Booking.objects.filter(user=user).annotate(
+        has_active_trip=Exists(Booking.objects.filter(user=user, status__in=ACTIVE_BOOKING_STATUSES))
+    )
+    if cursor:
+        created_at, pk = decode_history_cursor(cursor)
+        # Keyset pagination: every page is a range scan on booking_user_history_idx
+        bookings = bookings.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    rows = list(bookings.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    if rows:
+        has_active_trip = rows[0].has_active_trip
+    elif cursor:
+        has_active_trip = Booking.objects.filter(user=user, status__in=ACTIVE_BOOKING_STATUSES).exists()
+    else:
+        has_active_trip = False
+    return rows, next_cursor, has_active_trip
+
+
 @login_required
 def booking_history_view(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
-    active_statuses = ['Pending', 'Confirmed', 'Driver Assigned', 'In Progress', 'Completed']
-    has_active_trip = Booking.objects.filter(
-        user=request.user, 
-        status__in=active_statuses
-    ).exclude(status='Paid').exists()
+    bookings, next_cursor, has_active_trip = booking_history_page(request.user)
     return render(request, 'core/booking_history.html', {
         'bookings': bookings,
+        'next_cursor': next_cursor,
         'has_active_trip': has_active_trip,
     })
 
+def bookings_csv_response(queryset, columns, filename):
+    response = StreamingHttpResponse(exports.stream_csv(queryset, columns), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 def download_bookings_csv_view(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=\"bookings.csv\"'
-    writer = csv.writer(response)
-    writer.writerow(['Booking ID', 'Vehicle', 'Price', 'Pickup', 'Destination', 'Status', 'Created At'])
-    for b in bookings:
-        writer.writerow([b.pk, b.vehicle_type, str(b.price), b.pickup, b.destination, b.status, b.created_at])
-    return response
+    bookings = Booking.objects.filter(user=request.user).order_by('-created_at', '-id')
+    try:
+        bookings = exports.filter_created_between(bookings, request.GET.get('start'), request.GET.get('end'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('booking_history')
+    return bookings_csv_response(bookings, exports.BOOKING_COLUMNS, 'bookings.csv')
+
+@login_required
+def admin_bookings_csv_view(request):
+    if not user_is_admin(request.user):
+        messages.error(request, 'Access denied. Admin privileges required.')
+        return redirect('home')
+    start, end = request.GET.get('start'), request.GET.get('end')
+    try:
+        bookings = exports.filter_created_between(Booking.objects.order_by('-created_at', '-id'), start, end)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_dashboard')
+    filename = '_'.join(['bookings', *(day for day in (start, end) if day)]) + '.csv'
+    return bookings_csv_response(bookings, exports.ADMIN_BOOKING_COLUMNS, filename)
+
+@login_required
+def download_export_view(request, job_id):
+    if not user_is_admin(request.user):
+        messages.error(request, 'Access denied. Admin privileges required.')
+        return redirect('home')
+    job = ExportJob.objects.filter(pk=job_id, status='Completed').first()
+    if job is None or not os.path.exists(export_jobs.job_path(job)):
+        raise Http404('Export not found or not finished')
+    return FileResponse(open(export_jobs.job_path(job), 'rb'), as_attachment=True, filename=job.file_name)
 
 @login_required
 def cancel_booking_view(request):
@@ -210,6 +274,7 @@ def cancel_booking_view(request):
             booking.status = 'Cancelled'
             booking.can_cancel = False
             booking.save()
+            release_driver(booking, at_destination=False)
     return redirect('booking_history')
 
 @login_required
@@ -229,14 +294,7 @@ def add_wallet_balance_view(request):
         if amount:
             amount_decimal = Decimal(str(amount))
             if amount_decimal > 0:
-                wallet.balance += amount_decimal
-                wallet.save()
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    amount=amount_decimal,
-                    transaction_type='credit',
-                    description=f'Wallet top-up of ₹{amount_decimal}'
-                )
+                ledger.credit(wallet, amount_decimal, f'Wallet top-up of ₹{amount_decimal}')
                 messages.success(request, f'₹{amount_decimal} added to your wallet successfully!')
             else:
                 messages.error(request, 'Amount must be greater than 0')
@@ -283,187 +341,8 @@ def home_view(request):
         pickup = request.POST.get('pickup')
         destination = request.POST.get('destination')
         promocode = request.POST.get('promocode', '').strip().lower()
-    promocodes = {
-        'freefirst': 100,
-        'save50': 50,
-        'ride10': 10,
-        'car20': 20,
-    }
-    discount = 0
-    if promocode in promocodes:
-        discount = promocodes[promocode]
-    if pickup and destination:
-        import requests
-        import time
-        def get_coords_advanced(place):
-            try:
-                url = f'https://nominatim.openstreetmap.org/search?format=json&q={place}&limit=1'
-                resp = requests.get(url, timeout=10, headers={'User-Agent': 'RideON-App/1.0'})
-                data = resp.json()
-                if data:
-                    return float(data[0]['lat']), float(data[0]['lon'])
-            except Exception:
-                pass
-            city_coords = {
-                'mumbai': (19.0760, 72.8777),
-                'delhi': (28.7041, 77.1025),
-                'bangalore': (12.9716, 77.5946),
-                'chennai': (13.0827, 80.2707),
-                'kolkata': (22.5726, 88.3639),
-                'hyderabad': (17.3850, 78.4867),
-                'pune': (18.5204, 73.8567),
-                'airport': (19.0896, 72.8656),
-                'station': (19.0330, 72.8347),
-            }
-            place_lower = place.lower()
-            for city, coords in city_coords.items():
-                if city in place_lower:
-                    return coords
-            return None, None
-        def haversine_advanced(lat1, lon1, lat2, lon2):
-            from math import radians, sin, cos, sqrt, atan2, asin
-            try:
-                lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-                R = 6371.0
-                dlat = lat2 - lat1
-                dlon = lon2 - lon1
-                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                c = 2 * asin(sqrt(a))
-                distance = R * c
-                if distance < 0.1:
-                    return 0.5
-                elif distance > 2000:
-                    return 50.0
-                elif not (distance == distance):
-                    return 10.0
-                return round(distance, 2)
-            except Exception:
-                return 10.0
-        lat1, lon1 = get_coords_advanced(pickup)
-        lat2, lon2 = get_coords_advanced(destination)
-        if lat1 is None or lat2 is None:
-            dist = 15.0
-        else:
-            dist = haversine_advanced(lat1, lon1, lat2, lon2)
-        vehicle_types = [
-            {'type': 'Scooter', 'base': 15, 'per_km': 5},
-            {'type': 'Saver Scooter', 'base': 12, 'per_km': 4},
-            {'type': 'Bike', 'base': 20, 'per_km': 6},
-            {'type': 'Rickshaw', 'base': 25, 'per_km': 8},
-            {'type': 'Mini', 'base': 50, 'per_km': 12},
-            {'type': 'SUV', 'base': 120, 'per_km': 20},
-            {'type': 'Auto', 'base': 30, 'per_km': 9},
-        ]
-        filtered = []
-        for v in vehicle_types:
-            if dist < 5:
-                filtered.append(v)
-            elif 5 <= dist < 25:
-                if v['type'] != 'SUV' or dist >= 15:
-                    filtered.append(v)
-            elif 25 <= dist < 100:
-                filtered.append(v)
-            elif dist >= 100:
-                if v['type'] not in ['Scooter', 'Saver Scooter']:
-                    filtered.append(v)
-            else:
-                filtered.append(v)
-        vehicles = []
-        def calculate_advanced_fare(vehicle_data, distance, discount=0):
-            base_fare = Decimal(str(vehicle_data['base']))
-            per_km_rate = Decimal(str(vehicle_data['per_km']))
-            distance_decimal = Decimal(str(distance))
-            distance_charge = per_km_rate * distance_decimal
-            if distance <= 2:
-                fare = max(base_fare * Decimal('1.5'), base_fare + distance_charge)
-            elif distance <= 5:
-                fare = base_fare + distance_charge
-            elif distance <= 15:
-                fare = base_fare + (distance_charge * Decimal('0.95'))
-            elif distance <= 50:
-                base_distance = Decimal('15')
-                excess_distance = distance_decimal - base_distance
-                fare = base_fare + (per_km_rate * base_distance * Decimal('0.95')) + (per_km_rate * excess_distance * Decimal('0.85'))
-            else:
-                base_distance = Decimal('15')
-                medium_distance = Decimal('35')
-                excess_distance = distance_decimal - Decimal('50')
-                fare = (base_fare +
-                        (per_km_rate * base_distance * Decimal('0.95')) +
-                        (per_km_rate * medium_distance * Decimal('0.85')) +
-                        (per_km_rate * excess_distance * Decimal('0.75')))
-            from datetime import datetime
-            current_hour = datetime.now().hour
-            if 7 <= current_hour <= 10 or 17 <= current_hour <= 20:
-                fare = fare * Decimal('1.15')
-            elif 22 <= current_hour or current_hour <= 5:
-                fare = fare * Decimal('1.10')
-            if vehicle_data['type'] in ['SUV', 'Mini']:
-                fare = fare * Decimal('1.05')
-            elif vehicle_data['type'] in ['Saver Scooter']:
-                fare = fare * Decimal('0.95')
-            if discount:
-                fare = fare * (Decimal('1') - Decimal(discount)/Decimal('100'))
-            fare = fare.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-            return max(1, min(int(fare), 99999))
-        for v in filtered:
-            price = calculate_advanced_fare(v, dist, discount)
-            vehicles.append({
-                'type': v['type'],
-                'price': price,
-                'base_fare': v['base'],
-                'per_km_rate': v['per_km'],
-                'distance': round(dist, 1),
-                'fare_breakdown': {
-                    'base': v['base'],
-                    'distance_charge': round((price - v['base']) * 0.8, 1),
-                    'surcharges': round((price - v['base']) * 0.2, 1)
-                }
-            })
-    else:
-        vehicle_types = [
-            {'type': 'Scooter', 'base': 15, 'per_km': 5},
-            {'type': 'Saver Scooter', 'base': 12, 'per_km': 4},
-            {'type': 'Bike', 'base': 20, 'per_km': 6},
-            {'type': 'Rickshaw', 'base': 25, 'per_km': 8},
-            {'type': 'Mini', 'base': 50, 'per_km': 12},
-            {'type': 'SUV', 'base': 120, 'per_km': 20},
-            {'type': 'Auto', 'base': 30, 'per_km': 9},
-        ]
-        def calculate_default_fare(vehicle_data, discount=0):
-            default_distance = 10.0
-            base_fare = Decimal(str(vehicle_data['base']))
-            per_km_rate = Decimal(str(vehicle_data['per_km']))
-            fare = base_fare + (per_km_rate * Decimal(str(default_distance)) * Decimal('0.95'))
-            from datetime import datetime
-            current_hour = datetime.now().hour
-            if 7 <= current_hour <= 10 or 17 <= current_hour <= 20:
-                fare = fare * Decimal('1.15')
-            elif 22 <= current_hour or current_hour <= 5:
-                fare = fare * Decimal('1.10')
-            if vehicle_data['type'] in ['SUV', 'Mini']:
-                fare = fare * Decimal('1.05')
-            elif vehicle_data['type'] in ['Saver Scooter']:
-                fare = fare * Decimal('0.95')
-            if discount:
-                fare = fare * (Decimal('1') - Decimal(discount)/Decimal('100'))
-            fare = fare.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-            return max(1, min(int(fare), 99999))
-        vehicles = []
-        for v in vehicle_types:
-            price = calculate_default_fare(v, discount)
-            vehicles.append({
-                'type': v['type'],
-                'price': price,
-                'base_fare': v['base'],
-                'per_km_rate': v['per_km'],
-                'distance': 10.0,
-                'fare_breakdown': {
-                    'base': v['base'],
-                    'distance_charge': round((price - v['base']) * 0.8, 1),
-                    'surcharges': round((price - v['base']) * 0.2, 1)
-                }
-            })
+    discount = pricing.discount_for(promocode)
+    vehicles = quote_route(pickup, destination, discount).vehicles
     return render(request, 'core/home.html', {
         'vehicles': vehicles,
         'pickup': pickup,
@@ -472,18 +351,19 @@ def home_view(request):
         'discount': discount,
     })
 
+ACTIVE_TRIP_MESSAGE = 'You already have an active trip. Please complete your current trip before booking another one.'
+
 @login_required
 def book_vehicle_view(request):
     user = request.user
     wallet = Wallet.objects.filter(user=user).first()
-    active_statuses = ['Pending', 'Confirmed', 'Driver Assigned', 'In Progress', 'Completed']
     active_booking = Booking.objects.filter(
         user=user, 
-        status__in=active_statuses
-    ).exclude(status='Paid').first()
+        status__in=ACTIVE_BOOKING_STATUSES
+    ).first()
     if active_booking:
         if request.method == 'POST':
-            messages.error(request, 'You already have an active trip. Please complete your current trip before booking another one.')
+            messages.error(request, ACTIVE_TRIP_MESSAGE)
             return redirect('booking_history')
         return render(request, 'core/booking.html', {
             'active_booking': active_booking,
@@ -497,41 +377,36 @@ def book_vehicle_view(request):
         destination = request.POST.get('destination')
         payment_method = request.POST.get('payment_method')
         promocode = request.POST.get('promocode', '').strip().lower()
-        promocodes = {
-            'freefirst': 100,
-            'save50': 50,
-            'ride10': 10,
-            'car20': 20,
-        }
-        discount = 0
-        if promocode in promocodes:
-            discount = promocodes[promocode]
+        discount = pricing.discount_for(promocode)
         try:
             price_decimal = Decimal(price)
         except (InvalidOperation, TypeError):
             price_decimal = Decimal('0')
         if discount > 0 and price_decimal > 0:
-            price_decimal = price_decimal * (Decimal('1') - Decimal(discount)/Decimal('100'))
-            price_decimal = price_decimal.quantize(Decimal('1'))
-        available_driver = Driver.objects.filter(vehicle_type__icontains=vehicle_type).first()
+            price_decimal = pricing.apply_discount(price_decimal, discount, rounding=ROUND_HALF_EVEN)
+        pickup_lat, pickup_lon = get_coords_many([pickup])[0] if pickup else (None, None)
+        available_driver = dispatcher.assign(vehicle_type, pickup_lat, pickup_lon)
         if not available_driver:
-            available_driver = Driver.objects.create(
-                name=f"Driver {vehicle_type}",
-                phone="+91-9876543210",
-                vehicle_type=vehicle_type,
-                vehicle_number=f"{vehicle_type.upper()[:2]}-{user.id:04d}",
-                rating=4.5
-            )
-        booking = Booking.objects.create(
-            user=user,
-            vehicle_type=vehicle_type,
-            price=price_decimal,
-            pickup=pickup,
-            destination=destination,
-            status='Driver Assigned',
-            driver=available_driver,
-            vehicle_number=available_driver.vehicle_number if available_driver else None,
-        )
+            messages.error(request, f'No {vehicle_type} drivers are available near your pickup right now. Please try again shortly.')
+            return redirect('home')
+        # The check above is only a fast path; one_active_booking_per_user
+        # rejects a parallel submission that got past it
+        try:
+            with transaction.atomic():
+                booking = Booking.objects.create(
+                    user=user,
+                    vehicle_type=vehicle_type,
+                    price=price_decimal,
+                    pickup=pickup,
+                    destination=destination,
+                    status='Driver Assigned',
+                    driver=available_driver,
+                    vehicle_number=available_driver.vehicle_number if available_driver else None,
+                )
+        except IntegrityError:
+            dispatcher.release(available_driver)
+            messages.error(request, ACTIVE_TRIP_MESSAGE)
+            return redirect('booking_history')
         response = render(request, 'core/booking_success.html', {
             'booking': booking,
             'vehicle_type': vehicle_type,
@@ -594,8 +469,11 @@ def complete_trip_view(request, booking_id):
     if request.method == 'POST':
         try:
             booking = Booking.objects.get(id=booking_id, user=request.user)
+            was_active = booking.status in TRIP_STATUSES
             booking.status = 'Completed'
             booking.save()
+            if was_active:
+                release_driver(booking)
             return JsonResponse({'success': True, 'message': 'Trip completed successfully'})
         except Booking.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
@@ -652,22 +530,41 @@ def documentation_view(request):
     context = {
         'page_title': 'Project Documentation',
         'documentation_available': True,
+        'sections': list(documentation_export.iter_rendered('html')),
     }
     return render(request, 'core/documentation.html', context)
 
+DOCUMENTATION_EXPORTS = {
+    'html': (documentation_export.stream_html, 'text/html; charset=utf-8', None),
+    'md': (documentation_export.stream_markdown, 'text/markdown; charset=utf-8', 'RideON_Documentation.md'),
+}
+
+@login_required
+def export_documentation(request, fmt):
+    if fmt not in DOCUMENTATION_EXPORTS:
+        raise Http404('Unknown documentation format')
+    stream, content_type, filename = DOCUMENTATION_EXPORTS[fmt]
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required 
 def download_documentation(request):
     try:
-        buffer, error = generate_documentation_file()
-        if error or buffer is None:
-            messages.error(request, f"Error generating documentation: {error or 'Unknown error'}")
-            return redirect('documentation')
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
-        response['Content-Disposition'] = 'attachment; filename=\"RideON_Complete_Documentation.docx\"'
-        response['Content-Length'] = len(buffer.getvalue())
+        path, version = documentation_cache.get_document()
+        if f'"{version}"' in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            document, version = documentation_cache.open_document(path, version)
+            # FileResponse sets Content-Length from the file
+            response = FileResponse(
+                document,
+                as_attachment=True,
+                filename='RideON_Complete_Documentation.docx',
+                content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            )
+        response['ETag'] = f'"{version}"'
         return response
     except Exception as e:
         messages.error(request, f"Error generating documentation: {str(e)}")
@@ -0,0 +1,219 @@
+import hmac
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+
+from core import pricing
+from core.batch_pricing import quote_routes
+from core.dispatch import dispatcher
+from core.geocoding import get_coords_many
+from core.location_ingest import location_buffer
+from core.quotes import cache_stats, quote_route
+from core.views import booking_history_page, user_is_admin
+
+MAX_BATCH_ROUTES = 10000
+MAX_NEARBY_DRIVERS = 20
+MAX_PINGS_PER_REQUEST = 5000
+
+
+def _parse_position(latitude, longitude):
+    lat, lon = float(latitude), float(longitude)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('Coordinates out of range')
+    return lat, lon
+
+
+def _parse_endpoint(value):
+    """
+    A route endpoint is either a place name or a [lat, lon] pair
+    """
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return float(value[0]), float(value[1])
+    raise ValueError('Endpoint must be a place name or [lat, lon]')
+
+
+# JSON endpoint used by home.html to refresh the vehicle list when the route changes
+def quote(request):
+    pickup = request.GET.get('pickup', '').strip()
+    destination = request.GET.get('destination', '').strip()
+    promocode = request.GET.get('promocode', '').strip().lower()
+    discount = pricing.discount_for(promocode)
+    result = quote_route(pickup, destination, discount)
+    route = None
+    if result.route:
+        route = {'geometry': result.route.geometry, 'source': result.route.source}
+    return JsonResponse({
+        'success': True,
+        'pickup': pickup,
+        'destination': destination,
+        'distance': round(result.distance, 1),
+        'promocode': promocode,
+        'discount': discount,
+        'vehicles': result.vehicles,
+        'route': route,
+    })
+
+
+# JSON endpoint for repricing many routes at once (ops dashboards, analytics)
+@csrf_exempt
+@login_required
+def batch_quote(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    if not user_is_admin(request.user):
+        return JsonResponse({'success': False, 'error': 'Admin privileges required'}, status=403)
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        routes = [
+            (_parse_endpoint(route['pickup']), _parse_endpoint(route['destination']))
+            for route in data['routes']
+        ]
+        discount = pricing.discount_for(data.get('promocode'))
+        when = None
+        if data.get('when'):
+            when = parse_datetime(data['when'])
+            if when is None:
+                raise ValueError('Invalid when')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    if len(routes) > MAX_BATCH_ROUTES:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_BATCH_ROUTES} routes per request'}, status=400)
+
+    places = sorted({end for route in routes for end in route if isinstance(end, str)})
+    resolved = dict(zip(places, get_coords_many(places))) if places else {}
+    coords = [
+        tuple(resolved[end] if isinstance(end, str) else (end or (None, None)) for end in route)
+        for route in routes
+    ]
+    return JsonResponse({
+        'success': True,
+        'discount': discount,
+        'quotes': quote_routes(coords, when, discount),
+    })
+
+
+@login_required
+def quote_stats(request):
+    if not user_is_admin(request.user):
+        return JsonResponse({'success': False, 'error': 'Admin privileges required'}, status=403)
+    return JsonResponse({'success': True, 'caches': cache_stats()})
+
+
+# Drivers linked to a user account report their position from the driver app
+@csrf_exempt
+@login_required
+def driver_location(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    driver = getattr(request.user, 'driver_profile', None)
+    if driver is None:
+        return JsonResponse({'success': False, 'error': 'Not a driver account'}, status=403)
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        lat, lon = _parse_position(data['latitude'], data['longitude'])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    location_buffer.add(driver.pk, lat, lon)
+    return JsonResponse({'success': True})
+
+
+def _parse_timestamp(value):
+    """
+    Ping time as an ISO 8601 string or Unix seconds; None means now
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('Invalid timestamp')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _has_ingest_access(request):
+    token = getattr(settings, 'LOCATION_INGEST', {}).get('TOKEN')
+    supplied = request.headers.get('X-Ingest-Token')
+    if token and supplied and hmac.compare_digest(token, supplied):
+        return True
+    return request.user.is_authenticated and user_is_admin(request.user)
+
+
+# Batched pings from the fleet gateway: {"pings": [{"driver", "latitude", "longitude", "timestamp"}]}
+@csrf_exempt
+def driver_locations(request):
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    if not _has_ingest_access(request):
+        return JsonResponse({'success': False, 'error': 'Ingest token or admin privileges required'}, status=403)
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        if len(data['pings']) > MAX_PINGS_PER_REQUEST:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_PINGS_PER_REQUEST} pings per request'}, status=400)
+        pings = [
+            (int(ping['driver']), *_parse_position(ping['latitude'], ping['longitude']), _parse_timestamp(ping.get('timestamp')))
+            for ping in data['pings']
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError, OSError):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    accepted = location_buffer.add_many(pings)
+    return JsonResponse({'success': True, 'received': len(pings), 'accepted': accepted})
+
+
+# Nearest available drivers to a pickup point, for showing cars on the map
+@login_required
+def nearby_drivers(request):
+    try:
+        lat, lon = _parse_position(request.GET['lat'], request.GET['lon'])
+        k = min(int(request.GET.get('k', 5)), MAX_NEARBY_DRIVERS)
+    except (ValueError, KeyError):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    vehicle_type = request.GET.get('vehicle_type', '')
+    drivers = []
+    for driver_id, distance in dispatcher.nearby(vehicle_type, lat, lon, k):
+        position = dispatcher.index.position(driver_id)
+        if position:
+            drivers.append({'id': driver_id, 'latitude': position[0], 'longitude': position[1], 'distance': round(distance, 2)})
+    return JsonResponse({'success': True, 'vehicle_type': vehicle_type, 'drivers': drivers})
+
+
+# "Load more" on the booking history page; the cursor comes from the previous page
+@login_required
+def booking_history(request):
+    try:
+        bookings, next_cursor, has_active_trip = booking_history_page(request.user, request.GET.get('cursor'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    html = render_to_string('core/booking_history_rows.html', {
+        'bookings': bookings,
+        'has_active_trip': has_active_trip,
+    }, request=request)
+    return JsonResponse({
+        'success': True,
+        'bookings': [
+            {
+                'id': booking.pk,
+                'vehicle_type': booking.vehicle_type,
+                'price': str(booking.price),
+                'pickup': booking.pickup,
+                'destination': booking.destination,
+                'status': booking.status,
+                'created_at': booking.created_at.isoformat(),
+            }
+            for booking in bookings
+        ],
+        'html': html,
+        'next_cursor': next_cursor,
+        'has_active_trip': has_active_trip,
+    })
@@ -89,6 +89,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts and wait for it,
+        # instead of failing concurrent bookings and payments with "database is locked"
+        # (transaction_mode needs Django 5.1+)
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # The in-memory test database cannot wait on locks; concurrency tests need a file
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -138,4 +149,90 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Geocoding cache used by core.geocoding
+# TTLs are in seconds; misses are cached for NEGATIVE_TTL
+GEOCODE_CACHE = {
+    'MAX_ENTRIES': 4096,
+    'TTL': 30 * 24 * 60 * 60,
+    'NEGATIVE_TTL': 24 * 60 * 60,
+    'REQUEST_TIMEOUT': 10,
+    # Delete expired database rows once every PURGE_EVERY cache writes
+    'PURGE_EVERY': 1000,
+}
+# Pickup and destination are geocoded in parallel under one overall deadline
+GEOCODE_DEADLINE = 10
+GEOCODE_WORKERS = 8
+
+# Seconds between checks for newly loaded gazetteer rows (see load_gazetteer)
+GAZETTEER_REFRESH_INTERVAL = 300
+
+# Road-distance routing used for fares (see core/routing.py).
+# Without an openrouteservice key, fares use straight-line distances.
+OPENROUTESERVICE_API_KEY = os.environ.get('OPENROUTESERVICE_API_KEY', '')
+ROUTING = {
+    'BACKEND': 'core.routing.OpenRouteServiceBackend' if OPENROUTESERVICE_API_KEY else 'core.routing.StraightLineBackend',
+    'OPENROUTESERVICE_API_KEY': OPENROUTESERVICE_API_KEY,
+    'CACHE_PRECISION': 3,
+    'CACHE_TTL': 7 * 24 * 60 * 60,
+    'MAX_ENTRIES': 4096,
+    'REQUEST_TIMEOUT': 10,
+}
+
+# Quote cache keyed by (pickup geohash, destination geohash, pricing slot, discount).
+# Entries expire at the end of their pricing slot or after MAX_TTL seconds.
+# Quotes priced from the straight-line fallback expire after FALLBACK_TTL seconds.
+QUOTE_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'GEOHASH_PRECISION': 7,
+    'MAX_TTL': 60 * 60,
+    'FALLBACK_TTL': 60,
+}
+
+# Seconds between checks for a newer active PricingRuleSet
+PRICING_RULES_POLL_INTERVAL = 30
+
+# Driver dispatch (see core/dispatch.py). Available drivers are indexed in
+# CELL_SIZE-degree grid cells and resynced from the database every RESYNC_INTERVAL seconds.
+DISPATCH = {
+    'CELL_SIZE': 0.01,
+    'MAX_RADIUS_KM': 25,
+    'RESYNC_INTERVAL': 60,
+    'MAX_CLAIM_ATTEMPTS': 5,
+}
 
+# Driver location pings (see core/location_ingest.py) are coalesced per driver and
+# written with one bulk_update every FLUSH_INTERVAL seconds. Gateways posting to
+# api/driver/locations/ authenticate with the X-Ingest-Token header.
+LOCATION_INGEST = {
+    'TOKEN': os.environ.get('LOCATION_INGEST_TOKEN', ''),
+    'FLUSH_INTERVAL': 5,
+    'MAX_PENDING': 50000,
+    'BATCH_SIZE': 500,
+}
+
+# Booking and ledger exports (see core/exports.py and core/export_jobs.py).
+# Export jobs are written to ROOT by the run_export_jobs worker, JOB_CHUNK_SIZE
+# rows per compressed member; a running job untouched for STALE_AFTER seconds
+# is picked up again by the next worker.
+EXPORTS = {
+    'CHUNK_SIZE': 2000,
+    'ROOT': BASE_DIR / 'exports',
+    'JOB_CHUNK_SIZE': 10000,
+    'STALE_AFTER': 300,
+}
+
+# Rendered PDF receipts (see core/receipts.py), stored by content digest
+RECEIPTS = {
+    'ROOT': BASE_DIR / 'receipts',
+}
+
+# Monthly statements written by generate_statements (see core/statements.py)
+STATEMENTS = {
+    'ROOT': BASE_DIR / 'statements',
+    'CHUNK_SIZE': 5000,
+}
+
+# Built documentation DOCX files, one per content version (see core/documentation_cache.py)
+DOCUMENTATION = {
+    'CACHE_DIR': BASE_DIR / 'documentation_cache',
+}